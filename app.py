@@ -1,22 +1,67 @@
 import sys
 import os
-import json
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLineEdit, QTextEdit, QDateEdit, QComboBox, QPushButton,
-                             QFileDialog, QListWidget, QLabel, QTabWidget, QMessageBox,
-                             QDialog, QDialogButtonBox, QTreeWidget, QTreeWidgetItem, QTreeView,
-                             QAbstractItemView)
-from PyQt5.QtCore import QDate, Qt
+                             QFileDialog, QListView, QLabel, QTabWidget, QMessageBox,
+                             QDialog, QDialogButtonBox, QTreeView,
+                             QAbstractItemView, QProgressBar, QProgressDialog, QCheckBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QTreeWidget,
+                             QTreeWidgetItem, QListWidget, QListWidgetItem)
+from PyQt5.QtCore import QDate, Qt, QTimer, QModelIndex, pyqtSignal
 from PyQt5.QtGui import QFont
+from workers import FolderWatcher, RefreshScheduler
+from instrumentation import recorder
 
-CONFIG_FILE = os.path.expanduser("~/.experiment_tracker_config.json")
+# Only what the window needs to show is imported here. The project folders,
+# the backup queue and the modules of the Experiment tab and the dialogs are
+# imported where they are first used, after the window is up.
 
 class ExperimentTracker(QMainWindow):
+    backup_failed = pyqtSignal(str)
+    root_refreshed = pyqtSignal(str)
+    disk_refreshed = pyqtSignal(str, object)
+
     def __init__(self):
         super().__init__()
         self.base_folder = None
-        self.tracking_dir = self.load_tracking_dir()
+        self.project_folder = None
+        self.scan_thread = None
+        self.retired_threads = set()
+        self.fingerprint_cache = None
+        # Backups are journaled locally and replicated in the background;
+        # failures come back through the backup_failed signal. The queue is
+        # opened by open_services.
+        self.backup_queue = None
+        self.backup_failed.connect(self.show_warning)
+        # Every refresh of the project list, experiment history and version
+        # field goes through the scheduler, which runs each at most once per
+        # event loop turn; "disk" picks up changes in the project folder
+        self.refresh_scheduler = RefreshScheduler(self)
+        self.refresh_scheduler.register("disk", self.apply_disk_changes)
+        self.refresh_scheduler.register("projects", self.load_existing_projects)
+        self.refresh_scheduler.register("experiments", self.load_experiment_templates)
+        self.refresh_scheduler.register("version", self.update_version)
+        self.folder_watcher = FolderWatcher(parent=self)
+        self.folder_watcher.changed.connect(lambda: self.refresh_scheduler.schedule("disk"))
+        self.tracking_dir = None
+        self.experiment_tab = None
+        # All project folders in use; base_folder is the one being edited.
+        # Roots are scanned on the workspace's pool and report back through
+        # root_refreshed; opening_root is waiting for its scan to finish.
+        # Created by open_services.
+        self.workspace = None
+        self.opening_root = None
+        self.root_refreshed.connect(self.on_root_refreshed)
+        # Background refresh of the open folder, see apply_disk_changes
+        self.disk_future = None
+        self.disk_refresh_again = False
+        self.disk_refreshed.connect(self.on_disk_refreshed)
+        self.session_restored = False
         self.initUI()
+        # Nothing touches the disk before the window shows: the config and
+        # folders may be on a slow network drive
+        QTimer.singleShot(0, self.restore_session)
 
     def initUI(self):
         self.setWindowTitle("Experiment Tracking Suite")
@@ -38,17 +83,150 @@ class ExperimentTracker(QMainWindow):
         # Tab Widget
         self.tabs = QTabWidget()
         self.tabs.addTab(self.create_project_tab(), "Project")
-        self.tabs.addTab(self.create_experiment_tab(), "Experiment")
+        # Built on first activation, see ensure_experiment_tab
+        self.experiment_container = QWidget()
+        self.experiment_container.setLayout(QVBoxLayout())
+        self.experiment_container.layout().setContentsMargins(0, 0, 0, 0)
+        self.tabs.addTab(self.experiment_container, "Experiment")
+        self.tabs.addTab(self.create_search_tab(), "Search")
+        self.tabs.addTab(self.create_diagnostics_tab(), "Diagnostics")
         main_layout.addWidget(self.tabs)
 
         main_widget.setLayout(main_layout)
         self.setCentralWidget(main_widget)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+
+    def restore_session(self):
+        # Restores the tracking directory, the workspace and the last project
+        # folder from the config once the window is up; the folders are
+        # opened and their metadata indexes brought up to date in the
+        # background
+        if self.session_restored:
+            return
+        self.session_restored = True
+        with recorder.span("restore_session"):
+            from tracker_core import load_config
+            from workspace import load_workspace_roots
+            self.open_services()
+            config = load_config()
+            tracking_dir = config.get('tracking_dir')
+            if tracking_dir and os.path.isdir(tracking_dir):
+                self.tracking_dir = tracking_dir
+                self.update_tracking_display()
+            else:
+                self.change_tracking_dir(initial_setup=True)
+            self.workspace.set_tracking_dir(self.tracking_dir)
+            # Replicates backups left in the journal by an earlier session
+            self.backup_queue.start()
+            base_folder = config.get('base_folder')
+            roots = load_workspace_roots()
+            for root in roots + ([base_folder] if base_folder else []):
+                self.workspace.add_root(root)
+            if base_folder and self.base_folder is None:
+                self.opening_root = os.path.abspath(base_folder)
+                self.folder_label.setText(f"Opening {base_folder}...")
+            self.rescan_workspace()
+
+    def open_services(self):
+        # The workspace and the backup queue are opened once the window is
+        # up, so importing them does not delay it
+        if self.workspace is not None:
+            return
+        from workspace import Workspace
+        from backup_queue import BackupQueue
+        self.backup_queue = BackupQueue(on_error=self.backup_failed.emit)
+        self.workspace = Workspace(tracking_dir=self.tracking_dir, backup=self.submit_backup)
+
+    def rescan_workspace(self):
+        # The open folder is refreshed on the GUI thread, the others on the
+        # workspace's pool
+        for root in self.workspace.roots:
+            if root != self.base_folder:
+                self.workspace.refresh_async(root).add_done_callback(
+                    lambda future, root=root: self.root_refreshed.emit(root))
+        if self.base_folder:
+            self.refresh_scheduler.schedule("disk")
+        self.update_workspace_list()
 
-        if self.tracking_dir:
-            self.update_tracking_display()
-            
-        if not self.tracking_dir:
-            self.change_tracking_dir(initial_setup=True)
+    def on_root_refreshed(self, root):
+        self.update_workspace_list()
+        if root != self.opening_root or self.workspace.busy(root):
+            return
+        self.opening_root = None
+        folder = self.workspace.folder(root)
+        if folder is None:
+            self.folder_label.setText(f"Could not open {root}: {self.workspace.errors.get(root)}")
+        else:
+            self.set_project_folder(folder)
+
+    def open_workspace_root(self, root):
+        # Makes a workspace folder the one being edited; returns False if it
+        # is still being scanned and will be opened when the scan finishes
+        if root == self.base_folder:
+            return True
+        folder = self.workspace.folder(root)
+        if folder is not None and not self.workspace.busy(root):
+            self.opening_root = None
+            self.set_project_folder(folder)
+            return True
+        self.opening_root = root
+        self.folder_label.setText(f"Opening {root}...")
+        self.workspace.refresh_async(root).add_done_callback(lambda future: self.root_refreshed.emit(root))
+        return False
+
+    def update_workspace_list(self):
+        self.workspace_list.clear()
+        for root, (state, detail) in self.workspace.status().items():
+            if state == "ready":
+                text = f"{root}  ({detail} projects)"
+            elif state == "failed":
+                text = f"{root}  (failed: {detail})"
+            else:
+                text = f"{root}  ({state})"
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, root)
+            if root == self.base_folder:
+                font = QFont(item.font())
+                font.setBold(True)
+                item.setFont(font)
+            self.workspace_list.addItem(item)
+
+    def remove_workspace_root(self):
+        item = self.workspace_list.currentItem()
+        if item is None:
+            return
+        root = item.data(Qt.UserRole)
+        if root == self.base_folder:
+            self.show_warning("The open project folder cannot be removed from the workspace!")
+            return
+        self.workspace.remove_root(root)
+        if self.opening_root == root:
+            self.opening_root = None
+        self.save_workspace()
+        self.update_workspace_list()
+
+    def save_workspace(self):
+        from workspace import save_workspace_roots
+        try:
+            save_workspace_roots(self.workspace.roots)
+        except Exception as e:
+            self.show_warning(f"Failed to save config: {str(e)}")
+
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.experiment_container:
+            self.ensure_experiment_tab()
+        self.update_diagnostics_timer()
+
+    def ensure_experiment_tab(self):
+        if self.experiment_tab is not None:
+            return
+        with recorder.span("build_experiment_tab"):
+            self.experiment_tab = self.create_experiment_tab()
+            self.experiment_container.layout().addWidget(self.experiment_tab)
+            if self.project_folder:
+                self.history_model.set_index(self.project_folder.index)
+                self.refresh_scheduler.schedule("projects", "experiments", "version")
+                self.refresh_scheduler.flush()
 
     def create_project_tab(self):
         tab = QWidget()
@@ -60,6 +238,16 @@ class ExperimentTracker(QMainWindow):
         self.folder_label = QLabel("No project folder selected")
         self.folder_label.setWordWrap(True)
 
+        # Workspace folders; double-click one to open it
+        self.workspace_list = QListWidget()
+        self.workspace_list.setMaximumHeight(100)
+        self.workspace_list.itemDoubleClicked.connect(
+            lambda item: self.open_workspace_root(item.data(Qt.UserRole)))
+        rescan_btn = QPushButton("Rescan All")
+        rescan_btn.clicked.connect(self.rescan_workspace)
+        remove_root_btn = QPushButton("Remove From Workspace")
+        remove_root_btn.clicked.connect(self.remove_workspace_root)
+
         # Project fields
         self.project_title = QLineEdit()
         self.project_description = QTextEdit()
@@ -79,6 +267,12 @@ class ExperimentTracker(QMainWindow):
         # Layout
         layout.addWidget(folder_btn)
         layout.addWidget(self.folder_label)
+        layout.addWidget(QLabel("Workspace Folders:"))
+        layout.addWidget(self.workspace_list)
+        workspace_btn_layout = QHBoxLayout()
+        workspace_btn_layout.addWidget(rescan_btn)
+        workspace_btn_layout.addWidget(remove_root_btn)
+        layout.addLayout(workspace_btn_layout)
         layout.addWidget(QLabel("Project Title:"))
         layout.addWidget(self.project_title)
         layout.addWidget(QLabel("Description:"))
@@ -97,20 +291,42 @@ class ExperimentTracker(QMainWindow):
         return tab
 
     def create_experiment_tab(self):
+        from models import PathListModel, ExperimentHistoryModel
+        from file_scan import DEFAULT_EXCLUDE
+        from storage import FORMAT_INDENTED, FORMAT_COMPACT, FORMAT_GZIP, FORMAT_TABLE, FORMAT_TABLE_GZIP
         tab = QWidget()
         layout = QVBoxLayout()
 
-        # Previous experiments
-        self.previous_experiments_combo = QComboBox()
+        # Previous experiments, grouped by title; rows are read from the
+        # metadata index in pages and a file is only parsed when loaded
+        self.history_model = ExperimentHistoryModel(None, self)
+        self.history_view = QTreeView()
+        self.history_view.setModel(self.history_model)
+        self.history_view.setUniformRowHeights(True)
+        self.history_view.setSortingEnabled(True)
+        self.history_view.sortByColumn(0, Qt.AscendingOrder)
+        self.history_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.history_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.history_view.setMinimumHeight(120)
+        self.history_view.doubleClicked.connect(self.load_selected_experiment)
         load_template_btn = QPushButton("Load Selected Experiment")
         load_template_btn.clicked.connect(self.load_selected_experiment)
+        compare_btn = QPushButton("Compare Versions...")
+        compare_btn.clicked.connect(self.open_diff_dialog)
 
         # Project selection
         self.projects_combo = QComboBox()
+        self.projects_combo.currentIndexChanged.connect(
+            lambda: self.refresh_scheduler.schedule("experiments", "version"))
 
         # Experiment fields
         self.experiment_title = QLineEdit()
-        self.experiment_title.textChanged.connect(self.update_version)
+        # Debounce so only the last keystroke of a burst recomputes the version
+        self.version_timer = QTimer(self)
+        self.version_timer.setSingleShot(True)
+        self.version_timer.setInterval(150)
+        self.version_timer.timeout.connect(lambda: self.refresh_scheduler.schedule("version"))
+        self.experiment_title.textChanged.connect(self.version_timer.start)
         self.experiment_description = QTextEdit()
 
         # Version controls
@@ -119,7 +335,7 @@ class ExperimentTracker(QMainWindow):
         self.version.setReadOnly(True)
         self.version_type_combo = QComboBox()
         self.version_type_combo.addItems(["Patch", "Minor", "Major"])
-        self.version_type_combo.currentIndexChanged.connect(self.update_version)
+        self.version_type_combo.currentIndexChanged.connect(lambda: self.refresh_scheduler.schedule("version"))
         self.version_lock = QPushButton("Lock Version")
         self.version_lock.setCheckable(True)
         self.version_lock.clicked.connect(self.toggle_version_lock)
@@ -128,7 +344,11 @@ class ExperimentTracker(QMainWindow):
         version_layout.addWidget(self.version_lock)
 
         # File selection
-        self.file_list = QListWidget()
+        self.file_model = PathListModel(self)
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setUniformItemSizes(True)
+        self.file_list.setLayoutMode(QListView.Batched)
         file_btn = QPushButton("Add Files")
         file_btn.clicked.connect(self.select_files)
         folder_btn = QPushButton("Add Folder")
@@ -136,12 +356,40 @@ class ExperimentTracker(QMainWindow):
         remove_btn = QPushButton("Remove Files/Folders")
         remove_btn.clicked.connect(self.open_remove_dialog)
 
+        # Folder scan filters and progress
+        self.include_patterns = QLineEdit()
+        self.include_patterns.setPlaceholderText("All files (e.g. *.py, *.csv)")
+        self.exclude_patterns = QLineEdit(DEFAULT_EXCLUDE)
+        self.scan_panel = QWidget()
+        scan_layout = QHBoxLayout()
+        scan_layout.setContentsMargins(0, 0, 0, 0)
+        self.scan_progress = QProgressBar()
+        self.scan_progress.setRange(0, 0)
+        self.scan_status = QLabel()
+        self.scan_cancel_btn = QPushButton("Cancel")
+        self.scan_cancel_btn.clicked.connect(self.cancel_directory_scan)
+        scan_layout.addWidget(self.scan_progress)
+        scan_layout.addWidget(self.scan_status)
+        scan_layout.addWidget(self.scan_cancel_btn)
+        self.scan_panel.setLayout(scan_layout)
+        self.scan_panel.hide()
+
+        self.fingerprint_check = QCheckBox("Record file fingerprints (size, modification time, content hash)")
+
         # Date fields
         self.experiment_start_date = QDateEdit(calendarPopup=True)
         self.experiment_start_date.setDate(QDate.currentDate())
         self.experiment_end_date = QDateEdit(calendarPopup=True)
         self.experiment_end_date.setDate(QDate.currentDate())
 
+        # On-disk format
+        self.file_format_combo = QComboBox()
+        self.file_format_combo.addItem("Indented JSON", FORMAT_INDENTED)
+        self.file_format_combo.addItem("Compact JSON", FORMAT_COMPACT)
+        self.file_format_combo.addItem("Compressed JSON (gzip)", FORMAT_GZIP)
+        self.file_format_combo.addItem("Compact file table", FORMAT_TABLE)
+        self.file_format_combo.addItem("Compact file table (gzip)", FORMAT_TABLE_GZIP)
+
         # Save button
         create_btn = QPushButton("Save Experiment")
         create_btn.clicked.connect(self.save_experiment)
@@ -150,8 +398,11 @@ class ExperimentTracker(QMainWindow):
         layout.addWidget(QLabel("Associated Project:"))
         layout.addWidget(self.projects_combo)
         layout.addWidget(QLabel("Load Previous Experiment:"))
-        layout.addWidget(self.previous_experiments_combo)
-        layout.addWidget(load_template_btn)
+        layout.addWidget(self.history_view)
+        template_btn_layout = QHBoxLayout()
+        template_btn_layout.addWidget(load_template_btn)
+        template_btn_layout.addWidget(compare_btn)
+        layout.addLayout(template_btn_layout)
         layout.addWidget(QLabel("Experiment Title:"))
         layout.addWidget(self.experiment_title)
         layout.addWidget(QLabel("Description:"))
@@ -167,17 +418,249 @@ class ExperimentTracker(QMainWindow):
         file_btn_layout.addWidget(remove_btn)
         layout.addLayout(file_btn_layout)
 
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Include:"))
+        filter_layout.addWidget(self.include_patterns)
+        filter_layout.addWidget(QLabel("Exclude:"))
+        filter_layout.addWidget(self.exclude_patterns)
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.scan_panel)
+        layout.addWidget(self.fingerprint_check)
+
         date_layout = QHBoxLayout()
         date_layout.addWidget(QLabel("Start Date:"))
         date_layout.addWidget(self.experiment_start_date)
         date_layout.addWidget(QLabel("End Date:"))
         date_layout.addWidget(self.experiment_end_date)
         layout.addLayout(date_layout)
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("File Format:"))
+        format_layout.addWidget(self.file_format_combo)
+        layout.addLayout(format_layout)
         layout.addWidget(create_btn)
 
         tab.setLayout(layout)
         return tab
 
+    def create_search_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout()
+
+        # Query
+        self.search_text = QLineEdit()
+        self.search_text.setPlaceholderText("Words in titles, descriptions, team members, associations, file paths")
+        self.search_text.returnPressed.connect(lambda: self.run_search(refresh=True))
+        # Debounce so typing runs one query per pause
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_text.textChanged.connect(self.search_timer.start)
+        self.search_field = QComboBox()
+        self.search_field.addItem("All fields", None)
+        for text, field in [("Title", "title"), ("Description", "description"),
+                            ("Team Members", "usernames"), ("Association", "association"),
+                            ("File Paths", "paths")]:
+            self.search_field.addItem(text, field)
+        self.search_kind = QComboBox()
+        self.search_kind.addItem("Projects and Experiments", None)
+        self.search_kind.addItem("Projects", "project")
+        self.search_kind.addItem("Experiments", "experiment")
+        self.search_field.currentIndexChanged.connect(self.search_timer.start)
+        self.search_kind.currentIndexChanged.connect(self.search_timer.start)
+        self.search_all_roots = QCheckBox("All workspace folders")
+        self.search_all_roots.toggled.connect(self.search_timer.start)
+
+        # Date range
+        self.search_dates_check = QCheckBox("Only dates between")
+        self.search_date_from = QDateEdit(calendarPopup=True)
+        self.search_date_from.setDate(QDate.currentDate().addYears(-1))
+        self.search_date_to = QDateEdit(calendarPopup=True)
+        self.search_date_to.setDate(QDate.currentDate())
+        self.search_dates_check.toggled.connect(self.search_timer.start)
+        self.search_date_from.dateChanged.connect(self.search_timer.start)
+        self.search_date_to.dateChanged.connect(self.search_timer.start)
+
+        search_btn = QPushButton("Search")
+        search_btn.clicked.connect(lambda: self.run_search(refresh=True))
+
+        # Results
+        self.search_results = QTableWidget(0, 7)
+        self.search_results.setHorizontalHeaderLabels(["Title", "Version", "Project", "Start", "End", "File", "Folder"])
+        self.search_results.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.search_results.horizontalHeader().setStretchLastSection(True)
+        self.search_results.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.search_results.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.search_results.verticalHeader().hide()
+        self.search_results.cellDoubleClicked.connect(self.open_search_result)
+        self.search_status = QLabel()
+
+        # Layout
+        query_layout = QHBoxLayout()
+        query_layout.addWidget(self.search_text)
+        query_layout.addWidget(search_btn)
+        layout.addLayout(query_layout)
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("In:"))
+        filter_layout.addWidget(self.search_field)
+        filter_layout.addWidget(QLabel("Show:"))
+        filter_layout.addWidget(self.search_kind)
+        filter_layout.addWidget(self.search_all_roots)
+        layout.addLayout(filter_layout)
+        date_layout = QHBoxLayout()
+        date_layout.addWidget(self.search_dates_check)
+        date_layout.addWidget(self.search_date_from)
+        date_layout.addWidget(QLabel("and"))
+        date_layout.addWidget(self.search_date_to)
+        layout.addLayout(date_layout)
+        layout.addWidget(self.search_results)
+        layout.addWidget(self.search_status)
+
+        tab.setLayout(layout)
+        return tab
+
+    def create_diagnostics_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout()
+
+        # Recording
+        self.diagnostics_check = QCheckBox("Record timings")
+        self.diagnostics_check.setChecked(recorder.enabled)
+        self.diagnostics_check.toggled.connect(self.toggle_diagnostics)
+        log_btn = QPushButton("Log to File...")
+        log_btn.clicked.connect(self.choose_diagnostics_log)
+        clear_btn = QPushButton("Clear")
+        clear_btn.clicked.connect(self.clear_diagnostics)
+        self.profile_btn = QPushButton("Start Profile")
+        self.profile_btn.clicked.connect(self.toggle_profile)
+        self.diagnostics_log_label = QLabel()
+        self.refresh_counters_label = QLabel()
+        self.backup_queue_label = QLabel()
+
+        # Per-operation totals and the most recent events
+        self.diagnostics_summary = QTableWidget(0, 7)
+        self.diagnostics_summary.setHorizontalHeaderLabels(
+            ["Operation", "Calls", "Total ms", "Mean ms", "Max ms", "Items", "Bytes"])
+        self.diagnostics_events = QTableWidget(0, 6)
+        self.diagnostics_events.setHorizontalHeaderLabels(["Time", "Operation", "ms", "Items", "Bytes", "Thread"])
+        for table in (self.diagnostics_summary, self.diagnostics_events):
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+            table.horizontalHeader().setStretchLastSection(True)
+            table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            table.verticalHeader().hide()
+
+        # Only redraw while the tab is showing and something is recorded
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(1000)
+        self.diagnostics_timer.timeout.connect(self.update_diagnostics)
+
+        # Layout
+        controls_layout = QHBoxLayout()
+        controls_layout.addWidget(self.diagnostics_check)
+        controls_layout.addWidget(log_btn)
+        controls_layout.addWidget(clear_btn)
+        controls_layout.addWidget(self.profile_btn)
+        layout.addLayout(controls_layout)
+        layout.addWidget(self.diagnostics_log_label)
+        layout.addWidget(self.diagnostics_summary)
+        layout.addWidget(self.refresh_counters_label)
+        layout.addWidget(self.backup_queue_label)
+        layout.addWidget(QLabel("Recent operations:"))
+        layout.addWidget(self.diagnostics_events)
+
+        tab.setLayout(layout)
+        self.update_diagnostics_log_label()
+        return tab
+
+    def toggle_diagnostics(self, enabled):
+        if enabled:
+            recorder.enable(recorder.log_path)
+        else:
+            recorder.disable()
+        self.update_diagnostics_log_label()
+        self.update_diagnostics_timer()
+
+    def choose_diagnostics_log(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Timing Log", "diagnostics.jsonl", "JSON Lines (*.jsonl)")
+        if path:
+            try:
+                recorder.enable(path)
+            except OSError as e:
+                self.show_warning(f"Cannot open log file: {str(e)}")
+                return
+            self.diagnostics_check.setChecked(True)
+            self.update_diagnostics_log_label()
+
+    def update_diagnostics_log_label(self):
+        if recorder.log_path:
+            self.diagnostics_log_label.setText(f"Logging to {recorder.log_path}")
+        else:
+            self.diagnostics_log_label.setText("Not logging to a file")
+
+    def clear_diagnostics(self):
+        recorder.clear()
+        self.refresh_scheduler.reset_counters()
+        self.update_diagnostics()
+
+    def update_diagnostics_timer(self):
+        showing = self.tabs.currentIndex() == self.tabs.count() - 1
+        if showing:
+            self.update_diagnostics()
+        if showing and recorder.enabled:
+            self.diagnostics_timer.start()
+        else:
+            self.diagnostics_timer.stop()
+
+    def update_diagnostics(self):
+        counters = self.refresh_scheduler.counters()
+        self.refresh_counters_label.setText(
+            f"Refresh passes: {counters['passes']}   " +
+            "   ".join(f"{view}: {counters['runs'][view]} run / {counters['requests'][view]} requested"
+                       for view in counters['runs']))
+        try:
+            if self.backup_queue is None:
+                raise RuntimeError("not opened yet")
+            stats = self.backup_queue.stats()
+            text = (f"Backup queue: {stats['depth']} queued ({stats['bytes']} bytes), "
+                    f"oldest {stats['lag']:.1f} s, {stats['retrying']} retrying   "
+                    f"written: {stats['written']} in {stats['batches']} batches, failed attempts: {stats['failures']}")
+            if stats['last_error']:
+                text += f"\nLast error: {stats['last_error']}"
+        except Exception as e:
+            text = f"Backup queue unavailable: {str(e)}"
+        self.backup_queue_label.setText(text)
+        summary = sorted(recorder.summary().items(), key=lambda item: -item[1]["total_ms"])
+        self.diagnostics_summary.setRowCount(len(summary))
+        for row, (op, entry) in enumerate(summary):
+            values = [op, entry["calls"], f"{entry['total_ms']:.1f}", f"{entry['total_ms'] / entry['calls']:.2f}",
+                      f"{entry['max_ms']:.2f}", entry["count"], entry["bytes"]]
+            for column, value in enumerate(values):
+                self.diagnostics_summary.setItem(row, column, QTableWidgetItem(str(value)))
+        events = recorder.recent(200)[::-1]
+        self.diagnostics_events.setRowCount(len(events))
+        for row, event in enumerate(events):
+            values = [time.strftime("%H:%M:%S", time.localtime(event["time"])), event["op"],
+                      f"{event['ms']:.2f}", event.get("count", ""), event.get("bytes", ""), event["thread"]]
+            if "error" in event:
+                values[1] += f" ({event['error']})"
+            for column, value in enumerate(values):
+                self.diagnostics_events.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def toggle_profile(self):
+        # cProfile of the GUI thread plus a tracemalloc snapshot, written to
+        # <tracking dir>/profiles
+        if not recorder.profiling():
+            recorder.start_profile()
+            self.profile_btn.setText("Stop Profile")
+            return
+        self.profile_btn.setText("Start Profile")
+        try:
+            paths = recorder.stop_profile(os.path.join(self.tracking_dir, "profiles"))
+        except Exception as e:
+            self.show_warning(f"Failed to save profile: {str(e)}")
+            return
+        QMessageBox.information(self, "Profile Saved", "\n".join(paths))
+
     def toggle_version_lock(self):
         if self.version_lock.isChecked():
             self.version.setReadOnly(False)
@@ -195,25 +678,37 @@ class ExperimentTracker(QMainWindow):
             options=QFileDialog.ShowDirsOnly
         )
         if folder:
-            self.base_folder = folder
-            self.folder_label.setText(f"Selected Folder: {folder}")
-            self.load_existing_projects()
-            self.load_experiment_templates()
-
-    def load_tracking_dir(self):
+            self.open_services()
+            root = self.workspace.add_root(folder)
+            self.save_workspace()
+            # Scanned on the workspace's pool like any other root, so a slow
+            # mount does not freeze the window
+            self.open_workspace_root(root)
+            self.update_workspace_list()
+
+    def set_project_folder(self, project_folder):
+        folder = project_folder.base_folder
+        self.base_folder = folder
+        self.project_folder = project_folder
+        self.folder_watcher.watch(folder)
+        self.folder_label.setText(f"Selected Folder: {folder}")
         try:
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-                    if os.path.isdir(config['tracking_dir']):
-                        return config['tracking_dir']
-        except:
-            return None
+            # Reopened on the next start
+            from tracker_core import update_config
+            update_config(base_folder=folder)
+        except Exception:
+            pass
+        if self.experiment_tab is not None:
+            self.history_model.set_index(project_folder.index)
+            self.refresh_scheduler.schedule("disk", "projects", "experiments", "version")
+        else:
+            self.refresh_scheduler.schedule("disk")
+        self.update_workspace_list()
 
     def save_tracking_dir(self, path):
+        from tracker_core import update_config
         try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump({'tracking_dir': path}, f, indent=4)
+            update_config(tracking_dir=path)
             return True
         except Exception as e:
             self.show_warning(f"Failed to save config: {str(e)}")
@@ -234,6 +729,8 @@ class ExperimentTracker(QMainWindow):
                     return
             if self.save_tracking_dir(path):
                 self.tracking_dir = path
+                self.open_services()
+                self.workspace.set_tracking_dir(path)
                 self.update_tracking_display()
                 if not initial_setup:
                     QMessageBox.information(self, "Success", "Tracking directory updated!")
@@ -249,107 +746,331 @@ class ExperimentTracker(QMainWindow):
             self.tracking_dir_label.setStyleSheet("color: #333; border: 1px solid #ddd; padding: 5px;")
 
     def load_existing_projects(self):
-        self.projects_combo.clear()
-        if self.base_folder:
-            for f in os.listdir(self.base_folder):
-                if f.endswith('.json'):
-                    try:
-                        with open(os.path.join(self.base_folder, f), 'r') as file:
-                            data = json.load(file)
-                            if 'project' in data:
-                                self.projects_combo.addItem(data['project']['title'], f)
-                    except:
-                        continue
-        self.projects_combo.currentIndexChanged.connect(self.load_experiment_templates)
+        # Repopulates the project combo from the metadata index, keeping the
+        # current project if it still exists
+        current_project = self.projects_combo.currentData()
+        self.projects_combo.blockSignals(True)
+        try:
+            self.projects_combo.clear()
+            if self.base_folder:
+                for title, f in self.project_folder.projects():
+                    self.projects_combo.addItem(title, f)
+            index = self.projects_combo.findData(current_project)
+            if index != -1:
+                self.projects_combo.setCurrentIndex(index)
+        finally:
+            self.projects_combo.blockSignals(False)
+        if self.projects_combo.currentData() != current_project:
+            self.refresh_scheduler.schedule("experiments", "version")
 
     def load_experiment_templates(self):
-        self.previous_experiments_combo.clear()
-        if not self.base_folder or self.projects_combo.currentIndex() == -1:
+        project_file = self.projects_combo.currentData() if self.base_folder else None
+        if project_file != self.history_model.project_file:
+            self.history_model.set_project(project_file)
+        elif project_file is not None:
+            self.reload_history()
+
+    def selected_experiment(self):
+        return self.history_model.filename(self.history_view.currentIndex())
+
+    def select_experiment(self, filename):
+        entries = self.project_folder.entries([filename])
+        if not entries:
+            return False
+        index = self.history_model.find(entries[0][2], filename)
+        if not index.isValid():
+            return False
+        self.history_view.expand(index.parent())
+        self.history_view.setCurrentIndex(index)
+        self.history_view.scrollTo(index)
+        return True
+
+    def reload_history(self):
+        # Reloads the history after the index changed, keeping the expanded
+        # groups and the current row
+        model = self.history_model
+        expanded = [group.title for group in model.groups
+                    if self.history_view.isExpanded(model.createIndex(group.row, 0))]
+        current = self.history_view.currentIndex()
+        current_file = model.filename(current) if current.internalPointer() is not None else None
+        model.reload()
+        for title in expanded:
+            self.history_view.expand(model.title_index(title))
+        if current_file:
+            self.select_experiment(current_file)
+
+    def refresh_from_disk(self):
+        # Refreshes the open folder right away, for explicit requests; the
+        # folder watcher and saves go through apply_disk_changes instead
+        if not self.project_folder:
             return
-        project_file = self.projects_combo.currentData()
-        for fname in os.listdir(self.base_folder):
-            if fname.endswith('.json') and fname != project_file:
-                try:
-                    with open(os.path.join(self.base_folder, fname), 'r') as f:
-                        data = json.load(f)
-                        if 'experiment' in data and data.get('project_reference') == project_file:
-                            exp_title = data['experiment']['title']
-                            version = data['experiment']['version']
-                            self.previous_experiments_combo.addItem(
-                                f"{exp_title} (v{version})", fname
-                            )
-                except:
-                    continue
+        changed, removed = self.workspace.refresh_now(self.base_folder)
+        self.merge_disk_changes(changed, removed)
+        self.refresh_scheduler.flush()
+
+    def apply_disk_changes(self):
+        # Refreshes the open folder's index on the workspace's pool, so a
+        # large or network folder does not block the window. A request while
+        # a refresh runs starts another one once it is done, since the
+        # running scan may have missed the change.
+        if not self.project_folder:
+            return
+        if self.disk_future is not None:
+            self.disk_refresh_again = True
+            return
+        root = self.base_folder
+        self.disk_future = self.workspace.refresh_async(root)
+        self.disk_future.add_done_callback(lambda future: self.disk_refreshed.emit(root, future))
+
+    def on_disk_refreshed(self, root, future):
+        if future is self.disk_future:
+            self.disk_future = None
+        if root == self.base_folder:
+            try:
+                changed, removed = future.result()
+            except Exception as e:
+                self.folder_label.setText(f"Could not refresh {root}: {str(e)}")
+            else:
+                self.merge_disk_changes(changed, removed)
+        if self.disk_refresh_again:
+            self.disk_refresh_again = False
+            self.refresh_scheduler.schedule("disk")
+
+    def merge_disk_changes(self, changed, removed):
+        # Applies what changed in the project folder since the last refresh
+        # to the combos and the version field, without repopulating them
+        if self.experiment_tab is None or (not changed and not removed):
+            return
+        current_project = self.projects_combo.currentData()
+        projects = {}
+        experiments_changed = bool(removed)
+        for fname, kind, title, reference, version in self.project_folder.entries(changed):
+            if kind == 'project':
+                projects[fname] = title
+            elif kind == 'experiment':
+                experiments_changed = True
+
+        self.projects_combo.blockSignals(True)
+        try:
+            # Changed files that are no longer projects are dropped along with
+            # the removed ones
+            self.merge_combo_items(self.projects_combo, projects, set(removed) | set(changed))
+        finally:
+            self.projects_combo.blockSignals(False)
+        if self.projects_combo.currentData() != current_project or experiments_changed:
+            self.refresh_scheduler.schedule("experiments")
+        self.refresh_scheduler.schedule("version")
+
+    def merge_combo_items(self, combo, upserts, removals):
+        # Combos are ordered by file name, as in the metadata index
+        from bisect import bisect_left
+        keys = [combo.itemData(i) for i in range(combo.count())]
+        for data in sorted(removals - upserts.keys(), reverse=True):
+            i = bisect_left(keys, data)
+            if i < len(keys) and keys[i] == data:
+                combo.removeItem(i)
+                del keys[i]
+        for data, text in sorted(upserts.items()):
+            i = bisect_left(keys, data)
+            if i < len(keys) and keys[i] == data:
+                combo.setItemText(i, text)
+            else:
+                combo.insertItem(i, text, data)
+                keys.insert(i, data)
 
     def load_selected_experiment(self):
-        if self.previous_experiments_combo.currentIndex() == -1:
+        experiment_file = self.selected_experiment()
+        if experiment_file is None:
+            return
+        if self.scan_thread is not None:
+            # A large file may still be parsing; let it finish in the background
+            self.cancel_directory_scan()
+            self.retired_threads.add(self.scan_thread)
+        # The header comes from the metadata index right away; the file tree
+        # is parsed and streamed into the list on a worker thread
+        header = self.project_folder.experiment_header(experiment_file)
+        if header is not None:
+            self.show_experiment_header(header)
+        self.file_model.clear()
+        from workers import ExperimentLoadThread
+        self.scan_thread = ExperimentLoadThread(os.path.join(self.base_folder, experiment_file),
+                                                parent=self)
+        self.scan_thread.header_known = header is not None
+        self.scan_thread.header_ready.connect(self.show_loaded_header)
+        self.scan_thread.batch_ready.connect(self.add_scanned_batch)
+        self.scan_thread.progress.connect(self.update_load_progress)
+        self.scan_thread.scan_finished.connect(self.finish_directory_scan)
+        self.scan_thread.failed.connect(self.report_load_failure)
+        self.scan_status.setText("Loading experiment files...")
+        self.scan_cancel_btn.setEnabled(True)
+        self.scan_panel.show()
+        self.scan_thread.start()
+
+    def show_loaded_header(self, exp_data):
+        thread = self.sender()
+        if thread is self.scan_thread:
+            self.show_experiment_header(exp_data, fields=not thread.header_known)
+
+    def report_load_failure(self, message):
+        if self.sender() is self.scan_thread:
+            self.show_warning(f"Error loading experiment: {message}")
+
+    def show_experiment_header(self, exp_data, fields=True):
+        if fields:
+            self.experiment_title.setText(exp_data['title'])
+            self.experiment_description.setPlainText(exp_data['description'])
+            self.version_type_combo.setCurrentText('Patch')
+            self.refresh_scheduler.schedule("version")
+            self.version.setStyleSheet("background-color: #e0ffe0;")
+        if 'has_fingerprints' in exp_data:
+            self.fingerprint_check.setChecked(exp_data['has_fingerprints'])
+
+    def open_diff_dialog(self):
+        if not self.base_folder or self.projects_combo.currentIndex() == -1:
+            self.show_warning("Please select a project!")
+            return
+        experiments = self.project_folder.experiments(self.projects_combo.currentData())
+        if len(experiments) < 2:
+            self.show_warning("The selected project needs at least two experiments to compare!")
             return
-        experiment_file = self.previous_experiments_combo.currentData()
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Compare Experiment Versions")
+        dialog.resize(700, 500)
+        layout = QVBoxLayout()
+
+        old_combo = QComboBox()
+        new_combo = QComboBox()
+        for exp_title, version, fname in experiments:
+            old_combo.addItem(f"{exp_title} (v{version})", fname)
+            new_combo.addItem(f"{exp_title} (v{version})", fname)
+        old_combo.setCurrentIndex(max(old_combo.findData(self.selected_experiment()), 0))
+        new_combo.setCurrentIndex(new_combo.count() - 1)
+        compare_btn = QPushButton("Compare")
+        tree = QTreeWidget()
+        tree.setHeaderLabels(["Change", "Old", "New"])
+        tree.setUniformRowHeights(True)
+        compare_btn.clicked.connect(
+            lambda: self.show_experiment_diff(tree, old_combo.currentData(), new_combo.currentData()))
+
+        select_layout = QHBoxLayout()
+        select_layout.addWidget(QLabel("Old:"))
+        select_layout.addWidget(old_combo)
+        select_layout.addWidget(QLabel("New:"))
+        select_layout.addWidget(new_combo)
+        select_layout.addWidget(compare_btn)
+        btn_box = QDialogButtonBox(QDialogButtonBox.Close)
+        btn_box.rejected.connect(dialog.reject)
+        layout.addLayout(select_layout)
+        layout.addWidget(tree)
+        layout.addWidget(btn_box)
+        dialog.setLayout(layout)
+        self.show_experiment_diff(tree, old_combo.currentData(), new_combo.currentData())
+        dialog.exec_()
+
+    def show_experiment_diff(self, tree, old_file, new_file, limit=10000):
+        # Sections list at most `limit` entries each; the header keeps the full count
+        tree.clear()
         try:
-            with open(os.path.join(self.base_folder, experiment_file), 'r') as f:
-                data = json.load(f)
-                exp_data = data['experiment']
-                self.experiment_title.setText(exp_data['title'])
-                self.experiment_description.setPlainText(exp_data['description'])
-                self.file_list.clear()
-                self.populate_file_list(exp_data['file_structure'])
-                self.version_type_combo.setCurrentText('Patch')
-                self.update_version()
-                self.version.setStyleSheet("background-color: #e0ffe0;")
+            diff = self.project_folder.diff_experiments(old_file, new_file)
         except Exception as e:
-            self.show_warning(f"Error loading experiment: {str(e)}")
-
-    def populate_file_list(self, file_structure, current_path=""):
-        for name, value in file_structure.items():
-            if isinstance(value, dict):
-                self.populate_file_list(value, os.path.join(current_path, name))
-            else:
-                self.file_list.addItem(os.path.join(current_path, name))
+            self.show_warning(f"Error comparing experiments: {str(e)}")
+            return
+        sections = [
+            ("Fields", [(name, str(old), str(new)) for name, old, new in diff["fields"]]),
+            ("Added", [("", "", path) for path in diff["added"]]),
+            ("Removed", [("", path, "") for path in diff["removed"]]),
+            ("Moved", [("", old, new) for old, new in diff["moved"]]),
+            ("Possibly moved", [("", old, new) for old, new in diff["possibly_moved"]]),
+            ("Changed", [("", path, path) for path in diff["changed"]]),
+        ]
+        for title, rows in sections:
+            section = QTreeWidgetItem(tree, [f"{title} ({len(rows)})"])
+            section.addChildren([QTreeWidgetItem(list(row)) for row in rows[:limit]])
+            if len(rows) > limit:
+                QTreeWidgetItem(section, [f"... and {len(rows) - limit} more"])
+            section.setExpanded(0 < len(rows) <= 1000)
+        tree.resizeColumnToContents(0)
 
     def update_version(self):
         if not self.base_folder or self.projects_combo.currentIndex() == -1:
             return
         project_file = self.projects_combo.currentData()
-        experiment_title = self.experiment_title.text().strip()
-        version_type = self.version_type_combo.currentText().lower()
-
+        version_type = self.version_type_combo.currentText()
         try:
-            with open(os.path.join(self.base_folder, project_file), 'r') as f:
-                project_data = json.load(f)
-                project_title = project_data['project']['title']
-        except:
+            version = self.project_folder.next_version(project_file, self.experiment_title.text(),
+                                                       version_type)
+        except Exception:
             return
-
-        safe_project = self.sanitize_filename(project_title)
-        safe_experiment = self.sanitize_filename(experiment_title)
-        if not safe_experiment:
+        if version is None:
             self.version.clear()
+        else:
+            self.version.setText(version)
+
+    def run_search(self, refresh=False):
+        from metadata_index import SEARCH_LIMIT
+        self.search_timer.stop()
+        all_roots = self.search_all_roots.isChecked()
+        if not self.base_folder and not (all_roots and self.workspace.roots):
+            if refresh:
+                self.show_warning("Please select a project folder first!")
             return
-
-        existing_versions = []
-        for fname in os.listdir(self.base_folder):
-            if fname.startswith(f"{safe_project}_{safe_experiment}_v") and fname.endswith(".json"):
-                try:
-                    version_part = fname.split('_v')[1].split('.json')[0]
-                    parts = list(map(int, version_part.split('.')))
-                    if len(parts) == 3:
-                        existing_versions.append(tuple(parts))
-                except:
-                    continue
-
-        if existing_versions:
-            latest = max(existing_versions)
-            if version_type == 'major':
-                new_version = (latest[0] + 1, 0, 0)
-            elif version_type == 'minor':
-                new_version = (latest[0], latest[1] + 1, 0)
+        if refresh:
+            if all_roots:
+                self.rescan_workspace()
+            self.refresh_from_disk()
+        date_from = date_to = None
+        if self.search_dates_check.isChecked():
+            date_from = self.search_date_from.date().toString("yyyy-MM-dd")
+            date_to = self.search_date_to.date().toString("yyyy-MM-dd")
+        query = (self.search_text.text(), self.search_field.currentData(), self.search_kind.currentData(),
+                 date_from, date_to)
+        try:
+            if all_roots:
+                # Folders that are still being scanned are left out
+                rows = self.workspace.search(*query)
             else:
-                new_version = (latest[0], latest[1], latest[2] + 1)
-            new_version_str = f"{new_version[0]}.{new_version[1]}.{new_version[2]}"
-        else:
-            new_version_str = "1.0.0"
+                rows = [(self.base_folder,) + row for row in self.project_folder.search(*query)]
+        except Exception as e:
+            self.search_status.setText(f"Search failed: {str(e)}")
+            return
 
-        self.version.setText(new_version_str)
+        self.search_results.setRowCount(0)
+        self.search_results.setRowCount(len(rows))
+        for row, (root, fname, kind, title, reference, version, start, end) in enumerate(rows):
+            titles = self.workspace.folder(root).project_titles
+            project = title if kind == 'project' else titles.get(reference, reference or "")
+            for column, text in enumerate([title, version or "", project, start or "", end or "", fname, root]):
+                item = QTableWidgetItem(text)
+                if column == 0:
+                    item.setData(Qt.UserRole, (root, fname, kind, reference))
+                self.search_results.setItem(row, column, item)
+        skipped = sum(self.workspace.busy(root) for root in self.workspace.roots) if all_roots else 0
+        if len(rows) >= SEARCH_LIMIT:
+            status = f"Showing the {SEARCH_LIMIT} most recent matches"
+        else:
+            status = f"{len(rows)} matches"
+        if skipped:
+            status += f" ({skipped} folders still scanning)"
+        self.search_status.setText(status)
+
+    def open_search_result(self, row, column):
+        # Opens the project, or the experiment as a template, in the Experiment tab
+        root, fname, kind, reference = self.search_results.item(row, 0).data(Qt.UserRole)
+        if not self.open_workspace_root(root):
+            return
+        self.ensure_experiment_tab()
+        project_file = fname if kind == 'project' else reference
+        index = self.projects_combo.findData(project_file)
+        if index == -1:
+            self.show_warning(f"Project {project_file} is not in the project folder")
+            return
+        if index != self.projects_combo.currentIndex():
+            self.projects_combo.setCurrentIndex(index)
+            self.refresh_scheduler.flush()
+        self.tabs.setCurrentIndex(1)
+        if kind == 'experiment':
+            if self.select_experiment(fname):
+                self.load_selected_experiment()
 
     def select_files(self):
         if not self.base_folder:
@@ -391,41 +1112,67 @@ class ExperimentTracker(QMainWindow):
                 self.process_paths(folders)
 
     def process_paths(self, paths):
-        base_drive = os.path.splitdrive(self.base_folder)[0].upper()
-        existing_items = {self.file_list.item(i).text() for i in range(self.file_list.count())}
+        if self.scan_thread is not None:
+            self.show_warning("A folder scan is already in progress!")
+            return
         
+        folders = []
         for path in paths:
             if os.path.isfile(path):
-                self.add_single_file(path, base_drive, existing_items)
+                self.add_single_file(path)
             elif os.path.isdir(path):
-                self.add_directory_contents(path, base_drive, existing_items)
+                folders.append(path)
+        if folders:
+            self.add_directory_contents(folders)
+
+    def add_single_file(self, file_path):
+        from tracker_core import record_path
+        self.file_model.add_paths([record_path(file_path, self.base_folder)])
+
+    def add_directory_contents(self, folders):
+        # Walk the folders on a worker thread; paths arrive in batches
+        from file_scan import parse_patterns
+        from workers import DirectoryScanThread
+        self.scan_thread = DirectoryScanThread(
+            folders, self.base_folder,
+            include=parse_patterns(self.include_patterns.text()),
+            exclude=parse_patterns(self.exclude_patterns.text()),
+            parent=self
+        )
+        self.scan_thread.batch_ready.connect(self.add_scanned_batch)
+        self.scan_thread.progress.connect(self.update_scan_progress)
+        self.scan_thread.scan_finished.connect(self.finish_directory_scan)
+        self.scan_status.setText("Scanning folders...")
+        self.scan_cancel_btn.setEnabled(True)
+        self.scan_panel.show()
+        self.scan_thread.start()
+
+    def add_scanned_batch(self, paths):
+        # Batches still queued from a cancelled or replaced thread are dropped
+        if self.sender() is not self.scan_thread or self.scan_thread.is_cancelled():
+            return
+        self.file_model.add_paths(paths)
 
-    def add_single_file(self, file_path, base_drive, existing_items):
-        file_drive = os.path.splitdrive(file_path)[0].upper()
-        if file_drive == base_drive:
-            rel_path = os.path.relpath(file_path, self.base_folder)
-        else:
-            rel_path = os.path.abspath(file_path)
-        
-        if rel_path not in existing_items:
-            self.file_list.addItem(rel_path)
-            existing_items.add(rel_path)
+    def update_scan_progress(self, count):
+        self.scan_status.setText(f"{count} files found")
 
-    def add_directory_contents(self, folder_path, base_drive, existing_items):
-        folder_drive = os.path.splitdrive(folder_path)[0].upper()
-        same_drive = (folder_drive == base_drive)
-        
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                abs_path = os.path.join(root, file)
-                if same_drive:
-                    rel_path = os.path.relpath(abs_path, self.base_folder)
-                else:
-                    rel_path = os.path.abspath(abs_path)
-                
-                if rel_path not in existing_items:
-                    self.file_list.addItem(rel_path)
-                    existing_items.add(rel_path)
+    def update_load_progress(self, count):
+        self.scan_status.setText(f"{count} files loaded")
+
+    def cancel_directory_scan(self):
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
+            self.scan_cancel_btn.setEnabled(False)
+            self.scan_status.setText("Cancelling...")
+
+    def finish_directory_scan(self, count, cancelled):
+        thread = self.sender()
+        thread.wait()
+        thread.deleteLater()
+        self.retired_threads.discard(thread)
+        if thread is self.scan_thread:
+            self.scan_thread = None
+            self.scan_panel.hide()
 
     def save_project(self):
         if not self.base_folder:
@@ -436,37 +1183,16 @@ class ExperimentTracker(QMainWindow):
             self.show_warning("Project title is required!")
             return
         
-        safe_title = self.sanitize_filename(project_title)
-        filename = f"{safe_title}.json"
-        counter = 1
-        while os.path.exists(os.path.join(self.base_folder, filename)):
-            filename = f"{safe_title}_v{counter}.json"
-            counter += 1
-
-        filepath = os.path.join(self.base_folder, filename)
-        metadata = {
-            "project": {
-                "title": project_title,
-                "description": self.project_description.toPlainText(),
-                "usernames": [u.strip() for u in self.usernames.text().split(',')],
-                "association": self.project_association.currentText(),
-                "dates": {
-                    "start": self.project_start_date.date().toString("yyyy-MM-dd"),
-                    "end": self.project_end_date.date().toString("yyyy-MM-dd")
-                }
-            }
-        }
-
         try:
-            with open(filepath, 'w') as f:
-                json.dump(metadata, f, indent=4)
-            if self.tracking_dir:
-                backup_dir = os.path.join(self.tracking_dir, "backup", "Projects")
-                os.makedirs(backup_dir, exist_ok=True)
-                backup_path = os.path.join(backup_dir, filename)
-                with open(backup_path, 'w') as f:
-                    json.dump(metadata, f, indent=4)
-            self.load_existing_projects()
+            self.project_folder.create_project(
+                project_title,
+                description=self.project_description.toPlainText(),
+                usernames=[u.strip() for u in self.usernames.text().split(',')],
+                association=self.project_association.currentText(),
+                start=self.project_start_date.date().toString("yyyy-MM-dd"),
+                end=self.project_end_date.date().toString("yyyy-MM-dd")
+            )
+            self.refresh_scheduler.schedule("disk")
             QMessageBox.information(self, "Success", "Project created successfully!")
         except Exception as e:
             self.show_warning(f"Error saving project: {str(e)}")
@@ -478,90 +1204,82 @@ class ExperimentTracker(QMainWindow):
         if self.projects_combo.currentIndex() == -1:
             self.show_warning("Please select a project!")
             return
+        if self.scan_thread is not None:
+            self.show_warning("Please wait for the folder scan to finish or cancel it!")
+            return
         
         project_file = self.projects_combo.currentData()
         experiment_title = self.experiment_title.text().strip()
         version = self.version.text().strip()
+        # Automatic versions are reserved by the save itself, so another
+        # instance saving the same experiment moves on to the next version
+        manual_version = self.version_lock.isChecked()
         
         if not experiment_title:
             self.show_warning("Experiment title is required!")
             return
-        if not version:
+        if manual_version and not version:
             self.show_warning("Version number is required!")
             return
 
         try:
-            with open(os.path.join(self.base_folder, project_file), 'r') as f:
-                project_data = json.load(f)
-                project_title = project_data['project']['title']
+            self.project_folder.project_title(project_file)
         except Exception as e:
             self.show_warning(f"Error reading project file: {str(e)}")
             return
 
-        # Build hierarchical file structure
-        file_paths = [self.file_list.item(i).text() for i in range(self.file_list.count())]
-        file_hierarchy = self.build_hierarchy(file_paths)
-
-        # Create unique filename
-        safe_project = self.sanitize_filename(project_title)
-        safe_experiment = self.sanitize_filename(experiment_title)
-        base_name = f"{safe_project}_{safe_experiment}_v{version}"
-        experiment_filename = f"{base_name}.json"
-        counter = 1
-        while os.path.exists(os.path.join(self.base_folder, experiment_filename)):
-            experiment_filename = f"{base_name}({counter}).json"
-            counter += 1
-
-        experiment_path = os.path.join(self.base_folder, experiment_filename)
-        experiment_data = {
-            "project_reference": project_file,
-            "experiment": {
-                "title": experiment_title,
-                "description": self.experiment_description.toPlainText(),
-                "version": version,
-                "file_structure": file_hierarchy,
-                "dates": {
-                    "start": self.experiment_start_date.date().toString("yyyy-MM-dd"),
-                    "end": self.experiment_end_date.date().toString("yyyy-MM-dd")
-                }
-            }
-        }
+        file_paths = list(self.file_model.paths())
+        file_fingerprints = None
+        if self.fingerprint_check.isChecked():
+            file_fingerprints = self.compute_file_fingerprints(file_paths)
+            if file_fingerprints is None:
+                return
 
         try:
-            with open(experiment_path, 'w') as f:
-                json.dump(experiment_data, f, indent=4)
-            if self.tracking_dir:
-                backup_dir = os.path.join(self.tracking_dir, "backup", "Experiments")
-                os.makedirs(backup_dir, exist_ok=True)
-                backup_filename = os.path.basename(experiment_path)
-                backup_path = os.path.join(backup_dir, backup_filename)
-                with open(backup_path, 'w') as f:
-                    json.dump(experiment_data, f, indent=4)
-            self.file_list.clear()
+            filename = self.project_folder.save_experiment(
+                project_file,
+                experiment_title,
+                file_paths,
+                description=self.experiment_description.toPlainText(),
+                version=version if manual_version else None,
+                version_type=self.version_type_combo.currentText(),
+                start=self.experiment_start_date.date().toString("yyyy-MM-dd"),
+                end=self.experiment_end_date.date().toString("yyyy-MM-dd"),
+                fingerprints=file_fingerprints,
+                fmt=self.file_format_combo.currentData()
+            )
+            self.file_model.clear()
             self.version.setStyleSheet("")
-            self.previous_experiments_combo.setCurrentIndex(-1)
-            QMessageBox.information(self, "Success", "Experiment saved successfully!")
+            self.history_view.setCurrentIndex(QModelIndex())
+            # Another writer may have taken the shown version first, so report
+            # the name actually written and move the field past it
+            if not manual_version:
+                self.refresh_scheduler.schedule("version")
+            QMessageBox.information(self, "Success", f"Experiment saved as {filename}")
         except Exception as e:
             self.show_warning(f"Error saving experiment: {str(e)}")
 
-    def build_hierarchy(self, file_paths):
-        hierarchy = {}
-        for path in file_paths:
-            parts = path.split(os.sep)
-            current_level = hierarchy
-            for part in parts[:-1]:
-                if part not in current_level:
-                    current_level[part] = {}
-                current_level = current_level[part]
-            filename = parts[-1]
-            current_level[filename] = path
-        return hierarchy
-
-    def sanitize_filename(self, name):
-        return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name)
+    def compute_file_fingerprints(self, file_paths):
+        from fingerprint import FingerprintCache, compute_fingerprints
+        if self.fingerprint_cache is None:
+            self.fingerprint_cache = FingerprintCache()
+        progress = QProgressDialog("Fingerprinting attached files...", "Cancel", 0, 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+
+        def report(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+            return progress.wasCanceled()
+
+        try:
+            return compute_fingerprints(file_paths, self.base_folder, self.fingerprint_cache,
+                                        progress=report)
+        finally:
+            progress.close()
 
     def open_remove_dialog(self):
-        if self.file_list.count() == 0:
+        if self.file_model.rowCount() == 0:
             self.show_warning("No files to remove!")
             return
 
@@ -570,27 +1288,15 @@ class ExperimentTracker(QMainWindow):
         dialog.setMinimumSize(800, 600)
         
         layout = QVBoxLayout()
-        tree = QTreeWidget()
-        tree.setHeaderLabel("Select files/folders to remove")
-        tree.setStyleSheet("QTreeWidget::item { height: 25px; }")
-        
-        # Build hierarchy from existing files
-        root = tree.invisibleRootItem()
-        path_map = {}
+        tree = QTreeView()
+        tree.setUniformRowHeights(True)
+        tree.setStyleSheet("QTreeView::item { height: 25px; }")
         
-        for i in range(self.file_list.count()):
-            path = self.file_list.item(i).text()
-            parts = path.split(os.sep)
-            parent = root
-            
-            for part in parts:
-                if part not in path_map:
-                    node = QTreeWidgetItem([part])
-                    node.setFlags(node.flags() | Qt.ItemIsUserCheckable | Qt.ItemIsAutoTristate)
-                    node.setCheckState(0, Qt.Unchecked)
-                    parent.addChild(node)
-                    path_map[part] = node
-                parent = path_map[part]
+        # Tree nodes are created on demand from the file hierarchy
+        from models import RemoveTreeModel
+        from tracker_core import build_hierarchy
+        model = RemoveTreeModel(build_hierarchy(self.file_model.paths()), dialog)
+        tree.setModel(model)
 
         # Configure dialog buttons
         btn_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -602,34 +1308,41 @@ class ExperimentTracker(QMainWindow):
         dialog.setLayout(layout)
 
         if dialog.exec_() == QDialog.Accepted:
-            self.remove_selected_items(tree)
+            self.remove_selected_items(model)
 
-    def remove_selected_items(self, tree):
-        selected_paths = set()
-        
-        def collect_paths(item, current_path):
-            full_path = os.path.join(current_path, item.text(0))
-            if item.checkState(0) == Qt.Checked:
-                selected_paths.add(full_path)
-            for i in range(item.childCount()):
-                collect_paths(item.child(i), full_path)
-        
-        for i in range(tree.topLevelItemCount()):
-            collect_paths(tree.topLevelItem(i), "")
-        
-        # Remove items matching selected paths
-        for i in reversed(range(self.file_list.count())):
-            item_path = self.file_list.item(i).text()
-            for sp in selected_paths:
-                if item_path == sp or item_path.startswith(sp + os.sep):
-                    self.file_list.takeItem(i)
-                    break
+    def remove_selected_items(self, model):
+        self.file_model.remove_prefixes(model.selected_paths())
+
+    def submit_backup(self, kind, filename, data, source=None):
+        try:
+            self.backup_queue.put(self.tracking_dir, kind, filename, data, source)
+        except Exception as e:
+            self.backup_failed.emit(f"Failed to queue the backup of {kind}/{filename}: {str(e)}")
 
     def show_warning(self, message):
         QMessageBox.warning(self, "Warning", message)
 
+    def closeEvent(self, event):
+        threads = set(self.retired_threads)
+        if self.scan_thread is not None:
+            threads.add(self.scan_thread)
+        for thread in threads:
+            thread.cancel()
+            thread.wait()
+        # The folders are closed with the workspace, so nothing may refresh them later
+        self.refresh_scheduler.stop()
+        if self.workspace is not None:
+            self.workspace.close()
+        # Backups still queued are replicated by the next session
+        if self.backup_queue is not None:
+            self.backup_queue.close()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
+    start = time.perf_counter()
     app = QApplication(sys.argv)
     window = ExperimentTracker()
     window.show()
+    if recorder.enabled:
+        recorder.record("startup", time.perf_counter() - start)
     sys.exit(app.exec_())
@@ -0,0 +1,317 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from storage import read_document
+from instrumentation import recorder
+
+# Write-behind replication of backups into the tracking directory. A save
+# only adds the document to a journal on the local disk; a background
+# thread drains the journal in batches into the tracking directory's
+# BackupStore, reads every copy back and compares it with the checksum taken
+# when it was queued, and only then removes the entry. Failed entries are
+# retried with exponential backoff. Entries left behind by a crash or a
+# closed app are picked up by the next process that drains the journal.
+# Entries are handed out under a lease, and only the oldest entry of a file
+# at a time, so copies of one file land in save order even with several
+# processes (app and CLI) draining the same journal.
+
+QUEUE_FILE = os.path.expanduser("~/.experiment_tracker_backup_queue.sqlite")
+BATCH_SIZE = 64
+BATCH_BYTES = 16 << 20
+WORKERS = 4
+LEASE_SECONDS = 60
+MAX_BACKOFF = 300
+POLL_SECONDS = 5.0
+KINDS = {"project": "Projects", "experiment": "Experiments"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tracking_dir TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    document BLOB NOT NULL,
+    checksum TEXT NOT NULL,
+    source TEXT,
+    queued REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    lease REAL NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS queue_by_file ON queue(tracking_dir, kind, filename, id);
+"""
+
+
+class BackupQueue:
+    # on_error(message) is called from the worker thread when backups start
+    # failing, and again only after they have recovered and failed anew
+    def __init__(self, path=QUEUE_FILE, on_error=None, batch_size=BATCH_SIZE, workers=WORKERS):
+        self.path = path
+        self.on_error = on_error
+        self.batch_size = batch_size
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.conn = None
+        self.thread = None
+        self.pool = None
+        self.stores = {}
+        self.wake = threading.Event()
+        self.idle = threading.Event()
+        self.stopping = threading.Event()
+        self.written = 0
+        self.failures = 0
+        self.batches = 0
+        self.last_error = None
+        self.failing = False
+
+    def _connection(self):
+        if self.conn is None:
+            try:
+                self.conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+                self.conn.executescript(SCHEMA)
+            except sqlite3.Error:
+                # Unusable home directory: the queue still works, but does
+                # not survive the process
+                self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+                self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def put(self, tracking_dir, kind, filename, data, source=None):
+        self.put_many(tracking_dir, [(kind, filename, data, source)])
+
+    def put_many(self, tracking_dir, documents):
+        # Queues (kind, filename, data, source) documents in one transaction
+        from backup_store import canonical, object_hash
+        with self.lock:
+            conn = self._connection()
+            with conn:
+                for kind, filename, data, source in documents:
+                    raw = canonical(data)
+                    row = (tracking_dir, kind, filename, zlib.compress(raw, 1), object_hash(raw),
+                           json.dumps(source) if source else None, time.time())
+                    # A queued copy of the file that is not being written yet
+                    # is superseded by this one
+                    conn.execute("DELETE FROM queue WHERE tracking_dir = ? AND kind = ? AND filename = ? "
+                                 "AND lease < ?", (tracking_dir, kind, filename, row[-1]))
+                    conn.execute("INSERT INTO queue (tracking_dir, kind, filename, document, checksum, "
+                                 "source, queued) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        self.idle.clear()
+        self.start()
+        self.wake.set()
+
+    def start(self):
+        # Starts the worker, which also resumes entries left in the journal
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name="backup-queue", daemon=True)
+            self.thread.start()
+
+    def drain(self, timeout=None, retry=False):
+        # Waits until every entry was written or is waiting for a retry;
+        # `retry` retries failed entries now instead of after their backoff.
+        # Returns stats().
+        if retry:
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("UPDATE queue SET next_attempt = 0")
+        self.idle.clear()
+        self.start()
+        self.wake.set()
+        self.idle.wait(timeout)
+        return self.stats()
+
+    def close(self, timeout=2.0):
+        # Whatever is still queued stays in the journal for the next start
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                return
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wake.clear()
+            try:
+                batch = self._claim()
+                if batch:
+                    self._replicate(batch)
+                    continue
+                timeout = self._next_wait()
+            except sqlite3.Error as e:
+                self._report(f"Backup queue unavailable: {str(e)}")
+                timeout = POLL_SECONDS
+            self.idle.set()
+            self.wake.wait(timeout)
+
+    def _claim(self):
+        now = time.time()
+        with self.lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, tracking_dir, kind, filename, document, checksum, source, attempts "
+                    "FROM queue q WHERE next_attempt <= ? AND lease < ? AND NOT EXISTS ("
+                    "SELECT 1 FROM queue o WHERE o.tracking_dir = q.tracking_dir AND o.kind = q.kind "
+                    "AND o.filename = q.filename AND o.id < q.id) ORDER BY id LIMIT ?",
+                    (now, now, self.batch_size)).fetchall()
+                batch = []
+                size = 0
+                for row in rows:
+                    if batch and size + len(row[4]) > BATCH_BYTES:
+                        break
+                    batch.append(row)
+                    size += len(row[4])
+                conn.executemany("UPDATE queue SET lease = ? WHERE id = ?",
+                                 [(now + LEASE_SECONDS, row[0]) for row in batch])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return batch
+
+    def _next_wait(self):
+        with self.lock:
+            row = self._connection().execute(
+                "SELECT MIN(MAX(next_attempt, lease)) FROM queue q WHERE NOT EXISTS ("
+                "SELECT 1 FROM queue o WHERE o.tracking_dir = q.tracking_dir AND o.kind = q.kind "
+                "AND o.filename = q.filename AND o.id < q.id)").fetchone()
+        if row[0] is None:
+            return POLL_SECONDS
+        return min(POLL_SECONDS, max(0.05, row[0] - time.time()))
+
+    def _replicate(self, batch):
+        if self.pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backup")
+        with recorder.span("backup_batch") as span:
+            errors = list(self.pool.map(self._write, batch))
+            done = [(row[0],) for row, error in zip(batch, errors) if error is None]
+            now = time.time()
+            failed = [(now + min(MAX_BACKOFF, 2 ** row[7]), error, row[0])
+                      for row, error in zip(batch, errors) if error is not None]
+            with self.lock:
+                conn = self._connection()
+                with conn:
+                    conn.executemany("DELETE FROM queue WHERE id = ?", done)
+                    conn.executemany("UPDATE queue SET attempts = attempts + 1, next_attempt = ?, "
+                                     "lease = 0, error = ? WHERE id = ?", failed)
+            span.count = len(done)
+        self.batches += 1
+        self.written += len(done)
+        self.failures += len(failed)
+        if failed:
+            self.last_error = next(f"{row[2]}/{row[3]}: {error}" for row, error in zip(batch, errors) if error)
+            self._report(f"Backups are failing and will be retried: {self.last_error}")
+        elif done:
+            self.failing = False
+
+    def _write(self, row):
+        # Returns None once the copy is written and verified, else the error
+        from backup_store import BackupStore, document_checksum
+        _, tracking_dir, kind, filename, document, checksum, source, _ = row
+        try:
+            store = self.stores.get(tracking_dir)
+            if store is None:
+                store = self.stores[tracking_dir] = BackupStore(tracking_dir)
+            store.put(kind, filename, json.loads(zlib.decompress(document)),
+                      json.loads(source) if source else None, checksum)
+            if document_checksum(store.get(kind, filename)) != checksum:
+                raise ValueError("the copy read back does not match the checksum")
+        except Exception as e:
+            return str(e) or type(e).__name__
+        return None
+
+    def _report(self, message):
+        if self.failing:
+            return
+        self.failing = True
+        if self.on_error is not None:
+            self.on_error(message)
+
+    def stats(self):
+        # Depth, size and lag (age of the oldest entry, in seconds) of the
+        # whole journal, plus the counters of this process
+        with self.lock:
+            depth, retrying, size, oldest = self._connection().execute(
+                "SELECT COUNT(*), SUM(attempts > 0), SUM(LENGTH(document)), MIN(queued) FROM queue"
+            ).fetchone()
+        return {
+            "depth": depth, "retrying": retrying or 0, "bytes": size or 0,
+            "lag": round(time.time() - oldest, 3) if oldest else 0.0,
+            "written": self.written, "failures": self.failures, "batches": self.batches,
+            "last_error": self.last_error,
+        }
+
+    def errors(self):
+        # (tracking_dir, kind, filename, attempts, error) of failed entries
+        with self.lock:
+            return self._connection().execute(
+                "SELECT tracking_dir, kind, filename, attempts, error FROM queue "
+                "WHERE attempts > 0 ORDER BY id").fetchall()
+
+
+_default_queue = None
+
+
+def default_queue(create=True):
+    # Shared by the ProjectFolders of a process that were not given their
+    # own backup function; None if not created yet and create is False
+    global _default_queue
+    if _default_queue is None and create:
+        _default_queue = BackupQueue()
+    return _default_queue
+
+
+def reconcile(folder, tracking_dir, queue, dry_run=False, workers=8, chunk_size=256):
+    # Compares a ProjectFolder with its backups without copying anything.
+    # Files whose size and mtime match the stamps in their backup manifest
+    # are in sync. The others are read and their checksum compared with the
+    # manifest's: matching backups get the new stamps, and files with a
+    # missing or different backup are queued. Returns the number of files in
+    # sync and restamped, and the missing, changed and unreadable file names.
+    from concurrent.futures import ThreadPoolExecutor
+    from backup_store import BackupStore, document_checksum
+    store = BackupStore(tracking_dir)
+    result = {"in_sync": 0, "restamped": 0, "missing": [], "changed": [], "unreadable": []}
+
+    def compare(entry):
+        filename, kind, mtime_ns, size = entry
+        source = {"size": size, "mtime_ns": mtime_ns}
+        manifest = store.manifest(KINDS[kind], filename)
+        if manifest is not None and manifest.get("source") == source:
+            return "in_sync", None
+        try:
+            data = read_document(os.path.join(folder.base_folder, filename))
+        except (OSError, ValueError):
+            return "unreadable", None
+        if manifest is not None and manifest.get("checksum") == document_checksum(data):
+            if not dry_run:
+                store.set_source(KINDS[kind], filename, source)
+            return "restamped", None
+        return ("missing" if manifest is None else "changed"), (data, source)
+
+    entries = folder.stamps()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(entries), chunk_size):
+            chunk = entries[start:start + chunk_size]
+            for (filename, kind, _, _), (state, pending) in zip(chunk, pool.map(compare, chunk)):
+                if state == "unreadable":
+                    result[state].append(filename)
+                    continue
+                if pending is None:
+                    result[state] += 1
+                    continue
+                result[state].append(filename)
+                if not dry_run:
+                    queue.put(tracking_dir, KINDS[kind], filename, *pending)
+    return result
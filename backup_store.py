@@ -0,0 +1,403 @@
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import secrets
+from storage import write_atomic, read_document
+from path_store import split_path
+from file_table import ENCODING, table_groups
+from instrumentation import recorder
+
+KINDS = ["Projects", "Experiments"]
+REF = "\u0000ref"
+GROUPS = "\u0000groups"
+INLINE_LIMIT = 2048
+GC_GRACE_SECONDS = 3600
+
+
+def canonical(node):
+    return json.dumps(node, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def object_hash(raw):
+    return hashlib.blake2b(raw, digest_size=20).hexdigest()
+
+
+def document_checksum(data):
+    return object_hash(canonical(data))
+
+
+class BackupStore:
+    # Content-addressed backup store. Documents are split into per-folder
+    # blobs (folders whose encoding exceeds INLINE_LIMIT bytes get their own
+    # object, smaller ones stay inline), so versions that share most of
+    # their file_structure share most of their objects. The path-keyed
+    # file_fingerprints and the file_table encoding are split into
+    # per-directory groups the same way. Each saved file gets a small
+    # manifest pointing at its root object, with the checksum of the whole
+    # document and the size and mtime of the file it was saved from.
+    #
+    #   <tracking_dir>/backup/store/objects/ab/cdef...   loose gzip blobs
+    #   <tracking_dir>/backup/store/packs/pack-*.pack    packed blobs (+ .idx)
+    #   <tracking_dir>/backup/store/manifests/<kind>/<filename>
+    def __init__(self, tracking_dir):
+        self.tracking_dir = tracking_dir
+        self.root = os.path.join(tracking_dir, "backup", "store")
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.packs_dir = os.path.join(self.root, "packs")
+        self.manifests_dir = os.path.join(self.root, "manifests")
+        self._pack_index = None
+
+    # Objects
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _load_pack_index(self):
+        if self._pack_index is None:
+            self._pack_index = {}
+            if os.path.isdir(self.packs_dir):
+                for name in os.listdir(self.packs_dir):
+                    if name.endswith('.idx'):
+                        pack = os.path.join(self.packs_dir, name[:-4] + '.pack')
+                        with open(os.path.join(self.packs_dir, name), 'r') as f:
+                            for digest, (offset, length) in json.load(f).items():
+                                self._pack_index[digest] = (pack, offset, length)
+        return self._pack_index
+
+    def has_object(self, digest):
+        return os.path.exists(self._object_path(digest)) or digest in self._load_pack_index()
+
+    def put_object(self, node):
+        raw = canonical(node)
+        digest = object_hash(raw)
+        # Reused objects get a new mtime (their pack's, if packed), so a
+        # concurrent gc treats them like freshly written ones
+        path = self._object_path(digest)
+        try:
+            os.utime(path)
+            return digest
+        except FileNotFoundError:
+            pass
+        entry = self._load_pack_index().get(digest)
+        if entry is not None:
+            try:
+                os.utime(entry[0])
+                return digest
+            except FileNotFoundError:
+                self._pack_index = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, gzip.compress(raw, mtime=0))
+        return digest
+
+    def get_object(self, digest):
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return json.loads(gzip.decompress(f.read()))
+        pack, offset, length = self._load_pack_index()[digest]
+        with open(pack, 'rb') as f:
+            f.seek(offset)
+            return json.loads(gzip.decompress(f.read(length)))
+
+    # Documents
+
+    def _store_tree(self, tree):
+        # Iterative post-order walk replacing large folders with references
+        stored = {}
+        stack = [(tree, False)]
+        while stack:
+            folder, visited = stack.pop()
+            if not visited:
+                stack.append((folder, True))
+                stack.extend((v, False) for v in folder.values() if isinstance(v, dict))
+                continue
+            node = {k: stored.pop(id(v)) if isinstance(v, dict) else v for k, v in folder.items()}
+            if len(canonical(node)) > INLINE_LIMIT:
+                node = {REF: self.put_object(node)}
+            stored[id(folder)] = node
+        return stored[id(tree)]
+
+    def _load_tree(self, node):
+        if REF in node:
+            node = self.get_object(node[REF])
+        stack = [node]
+        while stack:
+            folder = stack.pop()
+            for key, value in folder.items():
+                if isinstance(value, dict):
+                    if REF in value:
+                        value = folder[key] = self.get_object(value[REF])
+                    stack.append(value)
+        return node
+
+    def _store_groups(self, groups):
+        # [[directory, payload], ...] with payloads above INLINE_LIMIT
+        # replaced by references
+        stored = []
+        for directory, payload in groups:
+            if len(canonical(payload)) > INLINE_LIMIT:
+                payload = {REF: self.put_object(payload)}
+            stored.append([directory, payload])
+        return stored
+
+    def _load_groups(self, groups):
+        for directory, payload in groups:
+            if isinstance(payload, dict) and REF in payload:
+                payload = self.get_object(payload[REF])
+            yield directory, payload
+
+    def _store_fingerprints(self, fingerprints):
+        # One group per run of paths in the same directory, so the map comes
+        # back in its original order
+        groups = []
+        for path, fingerprint in fingerprints.items():
+            directory, name = split_path(path)
+            if not groups or groups[-1][0] != directory:
+                groups.append((directory, {}))
+            groups[-1][1][name] = fingerprint
+        return {GROUPS: self._store_groups(groups)}
+
+    def _load_fingerprints(self, node):
+        return {directory + name: fingerprint
+                for directory, group in self._load_groups(node[GROUPS])
+                for name, fingerprint in group.items()}
+
+    def _store_table(self, table):
+        # Groups of file names per directory; dirs, counts and names are
+        # rebuilt from them on load
+        stored = {k: v for k, v in table.items() if k not in ("dirs", "counts", "names")}
+        stored[GROUPS] = self._store_groups(table_groups(table))
+        return stored
+
+    def _load_table(self, node):
+        groups = list(self._load_groups(node.pop(GROUPS)))
+        node["dirs"] = [directory for directory, _ in groups]
+        node["counts"] = [len(names) for _, names in groups]
+        node["names"] = node["separator"].join(name for _, names in groups for name in names)
+        return node
+
+    def put(self, kind, filename, data, source=None, checksum=None):
+        # source: {"size", "mtime_ns"} of the saved file, if known
+        with recorder.span("backup_write"):
+            return self._put(kind, filename, data, source, checksum)
+
+    def _put(self, kind, filename, data, source, checksum):
+        document = dict(data)
+        if isinstance(document.get('experiment'), dict):
+            experiment = document['experiment'] = dict(document['experiment'])
+            if isinstance(experiment.get('file_structure'), dict):
+                experiment['file_structure'] = self._store_tree(experiment['file_structure'])
+            table = experiment.get('file_table')
+            if isinstance(table, dict) and table.get('encoding') == ENCODING:
+                experiment['file_table'] = self._store_table(table)
+            if isinstance(experiment.get('file_fingerprints'), dict):
+                experiment['file_fingerprints'] = self._store_fingerprints(experiment['file_fingerprints'])
+        digest = self.put_object(document)
+        manifest = {
+            "root": digest,
+            "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "checksum": checksum or document_checksum(data),
+        }
+        if source:
+            manifest["source"] = source
+        self._write_manifest(kind, filename, manifest)
+        return digest
+
+    def _write_manifest(self, kind, filename, manifest):
+        manifest_path = os.path.join(self.manifests_dir, kind, filename)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+
+    def manifest(self, kind, filename):
+        # None if the file has no backup in the store
+        try:
+            with open(os.path.join(self.manifests_dir, kind, filename), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set_source(self, kind, filename, source):
+        # Records new stamps for a backup whose content is unchanged
+        manifest = self.manifest(kind, filename)
+        if manifest is not None and manifest.get("source") != source:
+            manifest["source"] = source
+            self._write_manifest(kind, filename, manifest)
+
+    def get(self, kind, filename):
+        manifest_path = os.path.join(self.manifests_dir, kind, filename)
+        if not os.path.exists(manifest_path):
+            # Plain copies written before the store existed
+            return read_document(os.path.join(self.tracking_dir, "backup", kind, filename))
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        document = self.get_object(manifest["root"])
+        experiment = document.get('experiment')
+        if isinstance(experiment, dict):
+            if isinstance(experiment.get('file_structure'), dict):
+                experiment['file_structure'] = self._load_tree(experiment['file_structure'])
+            table = experiment.get('file_table')
+            if isinstance(table, dict) and GROUPS in table:
+                experiment['file_table'] = self._load_table(table)
+            fingerprints = experiment.get('file_fingerprints')
+            if isinstance(fingerprints, dict) and GROUPS in fingerprints:
+                experiment['file_fingerprints'] = self._load_fingerprints(fingerprints)
+        return document
+
+    def restore(self, kind, filename, dest_path, indent=4):
+        data = self.get(kind, filename)
+        write_atomic(dest_path, json.dumps(data, indent=indent).encode('utf-8'))
+        return dest_path
+
+    def list(self, kind=None):
+        entries = []
+        for k in ([kind] if kind else KINDS):
+            folder = os.path.join(self.manifests_dir, k)
+            if os.path.isdir(folder):
+                entries.extend((k, name) for name in sorted(os.listdir(folder)))
+        return entries
+
+    # Maintenance
+
+    def reachable(self):
+        seen = set()
+        stack = []
+        for kind, filename in self.list():
+            with open(os.path.join(self.manifests_dir, kind, filename), 'r') as f:
+                stack.append(json.load(f)["root"])
+        while stack:
+            digest = stack.pop()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            nodes = [self.get_object(digest)]
+            while nodes:
+                node = nodes.pop()
+                # Groups keep their references in lists
+                for value in (node.values() if isinstance(node, dict) else node):
+                    if isinstance(value, dict):
+                        if REF in value:
+                            stack.append(value[REF])
+                        else:
+                            nodes.append(value)
+                    elif isinstance(value, list):
+                        nodes.append(value)
+        return seen
+
+    def _loose_objects(self):
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            folder = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(folder):
+                if not name.endswith('.tmp'):
+                    yield prefix + name, os.path.join(folder, name)
+
+    def gc(self):
+        # Removes objects no manifest refers to. Loose objects and packs
+        # written or reused in the last GC_GRACE_SECONDS are kept, since a
+        # concurrent save may not have written its manifest yet.
+        live = self.reachable()
+        removed = 0
+        freed = 0
+        cutoff = time.time() - GC_GRACE_SECONDS
+        for digest, path in list(self._loose_objects()):
+            st = os.stat(path)
+            if digest not in live and st.st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+                freed += st.st_size
+        packs = {}
+        for digest, (pack, _, length) in self._load_pack_index().items():
+            packs.setdefault(pack, []).append((digest, length))
+        for pack, entries in packs.items():
+            dead = [(d, n) for d, n in entries if d not in live]
+            if dead and os.stat(pack).st_mtime < cutoff:
+                self._write_pack([d for d, _ in entries if d in live])
+                self._remove_pack(pack)
+                removed += len(dead)
+                freed += sum(n for _, n in dead)
+        self._pack_index = None
+        return removed, freed
+
+    def pack(self):
+        # Moves all loose objects into a single pack file
+        loose = list(self._loose_objects())
+        if not loose:
+            return 0
+        self._write_pack([digest for digest, _ in loose])
+        for _, path in loose:
+            os.remove(path)
+        for prefix in os.listdir(self.objects_dir):
+            try:
+                os.rmdir(os.path.join(self.objects_dir, prefix))
+            except OSError:
+                pass
+        return len(loose)
+
+    def _read_raw(self, digest):
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        pack, offset, length = self._load_pack_index()[digest]
+        with open(pack, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def _write_pack(self, digests):
+        if not digests:
+            return
+        os.makedirs(self.packs_dir, exist_ok=True)
+        name = f"pack-{time.strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(4)}"
+        index = {}
+        chunks = []
+        offset = 0
+        for digest in digests:
+            raw = self._read_raw(digest)
+            index[digest] = [offset, len(raw)]
+            chunks.append(raw)
+            offset += len(raw)
+        # The pack must be complete before its index makes it visible
+        write_atomic(os.path.join(self.packs_dir, name + '.pack'), b''.join(chunks))
+        write_atomic(os.path.join(self.packs_dir, name + '.idx'), json.dumps(index).encode('utf-8'))
+        self._pack_index = None
+
+    def _remove_pack(self, pack):
+        os.remove(pack[:-5] + '.idx')
+        os.remove(pack)
+        self._pack_index = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the tracking-directory backup store")
+    parser.add_argument("tracking_dir")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list backed-up files")
+    sub.add_parser("pack", help="move loose objects into a pack file")
+    sub.add_parser("gc", help="delete objects no backup refers to")
+    restore = sub.add_parser("restore", help="write a backed-up file back to disk")
+    restore.add_argument("kind", choices=KINDS)
+    restore.add_argument("filename")
+    restore.add_argument("dest")
+    args = parser.parse_args(argv)
+
+    store = BackupStore(args.tracking_dir)
+    if args.command == "list":
+        for kind, filename in store.list():
+            print(f"{kind}/{filename}")
+    elif args.command == "pack":
+        print(f"Packed {store.pack()} objects")
+    elif args.command == "gc":
+        removed, freed = store.gc()
+        print(f"Removed {removed} objects ({freed} bytes)")
+    elif args.command == "restore":
+        print(store.restore(args.kind, args.filename, args.dest))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Times the tracker's hot paths on a synthetic project folder and reports
+# min/median wall time and peak traced memory per operation. Results are
+# written as sorted JSON so successive runs can be diffed, or compared with
+# --compare. Runs headless:
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/run.py --output results.json
+#   QT_QPA_PLATFORM=offscreen python benchmarks/run.py --compare results.json
+
+
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    # A separate traced run, since tracemalloc slows everything down
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_ms": round(min(times) * 1000, 2),
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "peak_kib": peak // 1024,
+        "repeat": repeat,
+    }
+
+
+# Startup in a fresh interpreter, from the first import to the window showing
+STARTUP_SCRIPT = """
+import sys, time, tracemalloc
+if sys.argv[1] == "traced":
+    tracemalloc.start()
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+qt_app = QApplication(sys.argv[:1])
+import app
+window = app.ExperimentTracker()
+# Restoring the session is startup_restore's part
+window.session_restored = True
+window.show()
+qt_app.processEvents()
+elapsed = time.perf_counter() - start
+peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+window.close()
+print(elapsed, peak)
+"""
+
+
+def measure_process(script, repeat):
+    # Like measure, but every run is a new interpreter, so imports count
+    def run(mode):
+        out = subprocess.run([sys.executable, "-c", script, mode], cwd=os.path.dirname(BENCH_DIR),
+                             capture_output=True, text=True, check=True).stdout
+        elapsed, peak = out.split()[-2:]
+        return float(elapsed), int(peak)
+
+    times = [run("timed")[0] for _ in range(repeat)]
+    peak = run("traced")[1]
+    return {
+        "min_ms": round(min(times) * 1000, 2),
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "peak_kib": peak // 1024,
+        "repeat": repeat,
+    }
+
+
+def naive_remove(paths, selected):
+    kept = []
+    for item_path in paths:
+        for sp in selected:
+            if item_path == sp or item_path.startswith(sp + os.sep):
+                break
+        else:
+            kept.append(item_path)
+    return kept
+
+
+def pick_selections(paths, count, seed=1):
+    # Mix of whole folders and individual files
+    rng = random.Random(seed)
+    selected = set()
+    while len(selected) < min(count, len(paths)):
+        path = rng.choice(paths)
+        if rng.random() < 0.05:
+            path = os.path.dirname(path)
+        selected.add(path)
+    return selected
+
+
+class Selection:
+    # Stands in for the RemoveTreeModel of the remove dialog
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def selected_paths(self):
+        return self.paths
+
+
+def wait_for_thread(app, window):
+    while window.scan_thread is not None or window.retired_threads:
+        app.processEvents()
+
+
+def run_benchmarks(args, workdir, results):
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    from PyQt5.QtCore import QModelIndex
+    from workload import synthetic_paths, generate_project_folder, generate_data_tree
+    from tracker_core import build_hierarchy, ProjectFolder
+    from path_store import PathStore
+    from metadata_index import INDEX_FILENAME
+
+    def only(name):
+        return not args.only or name in args.only
+
+    def record(name, result):
+        results[name] = result
+        print(f"{name:28} median {result['median_ms']:10.2f} ms   min {result['min_ms']:10.2f} ms"
+              f"   peak {result['peak_kib']:8d} KiB")
+
+    paths = synthetic_paths(args.files, args.fanout, args.depth)
+    if only("build_hierarchy"):
+        record("build_hierarchy", measure(lambda: build_hierarchy(paths), args.repeat))
+
+    if only("remove_prefixes"):
+        selected = pick_selections(paths, max(1, args.files // 100))
+        holder = {}
+        record("remove_prefixes", measure(lambda: holder["store"].remove_prefixes(selected), args.repeat,
+                                          setup=lambda: holder.update(store=PathStore(paths))))
+        if args.naive:
+            record("remove_prefixes_naive", measure(lambda: naive_remove(paths, selected), 1))
+
+    base = os.path.join(workdir, "projects")
+    data = os.path.join(workdir, "data")
+    start = time.perf_counter()
+    project_files = generate_project_folder(base, args.projects, args.experiments, args.versions,
+                                            args.files, args.depth, args.fanout, args.format)
+    generate_data_tree(data, args.scan_files, args.depth, args.fanout)
+    print(f"{'(workload generated)':28} {time.perf_counter() - start:10.2f} s")
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    warnings = []
+    QMessageBox.information = staticmethod(lambda *a, **k: None)
+    QMessageBox.warning = staticmethod(lambda parent, title, message, *a, **k: warnings.append(message))
+
+    import app as tracker_app
+
+    def start_window(restore=False):
+        # Until the window is showing, or also until the last project
+        # folder has been reopened in the background
+        started = tracker_app.ExperimentTracker()
+        started.show()
+        app.processEvents()
+        while restore and started.project_folder is None:
+            app.processEvents()
+        started.close()
+
+    if only("startup"):
+        record("startup", measure_process(STARTUP_SCRIPT, args.repeat))
+
+    window = tracker_app.ExperimentTracker()
+    window.restore_session()
+    window.ensure_experiment_tab()
+    tracker_app.QFileDialog.getExistingDirectory = staticmethod(lambda *a, **k: base)
+    window.choose_base_folder()
+    # The folder is scanned on the workspace's pool before it opens
+    while window.base_folder != os.path.abspath(base):
+        app.processEvents()
+    window.refresh_scheduler.flush()
+
+    if only("startup"):
+        # choose_base_folder remembered the folder in the config
+        record("startup_restore", measure(lambda: start_window(restore=True), args.repeat))
+
+    def cold_index():
+        window.project_folder.close()
+        os.remove(os.path.join(base, INDEX_FILENAME))
+        window.project_folder = ProjectFolder(base, window.tracking_dir, backup=window.submit_backup)
+        # refresh_from_disk refreshes the workspace's copy of the folder
+        window.workspace.folders[window.base_folder] = window.project_folder
+        window.history_model.set_index(window.project_folder.index)
+
+    if only("load_existing_projects"):
+        record("refresh_from_disk_cold", measure(window.refresh_from_disk, 1, setup=cold_index))
+        record("load_existing_projects", measure(window.load_existing_projects, args.repeat))
+
+    window.projects_combo.setCurrentIndex(window.projects_combo.findData(project_files[0]))
+
+    def load_history():
+        # Rows are read as the view asks for them, so time through the
+        # first screen of groups rather than just the model reset
+        window.load_experiment_templates()
+        model = window.history_model
+        view = window.history_view
+        rows = max(1, view.viewport().height() // max(1, view.fontMetrics().height()))
+        while model.canFetchMore(QModelIndex()) and model.rowCount() < rows:
+            model.fetchMore(QModelIndex())
+    if only("load_experiment_templates"):
+        record("load_experiment_templates", measure(load_history, args.repeat))
+
+    experiments = window.project_folder.experiments(project_files[0])
+    exp_title, _, exp_file = experiments[-1]
+    if only("update_version"):
+        window.experiment_title.setText(exp_title)
+        record("update_version", measure(window.update_version, args.repeat))
+
+    def scan_folder():
+        window.process_paths([data])
+        wait_for_thread(app, window)
+
+    if only("add_directory_contents"):
+        record("add_directory_contents", measure(scan_folder, args.repeat, setup=window.file_model.clear))
+
+    scanned = [os.path.join(os.path.relpath(data, base), p) for p in
+               synthetic_paths(args.scan_files, args.fanout, args.depth)]
+    if only("remove_selected_items"):
+        selection = Selection(pick_selections(scanned, max(1, len(scanned) // 100)))
+
+        def refill():
+            window.file_model.clear()
+            window.file_model.add_paths(scanned)
+
+        record("remove_selected_items", measure(lambda: window.remove_selected_items(selection),
+                                                args.repeat, setup=refill))
+
+    if only("save_experiment"):
+        window.file_format_combo.setCurrentIndex(window.file_format_combo.findData(args.format))
+
+        def prepare_save():
+            window.experiment_title.setText("benchmark save")
+            window.update_version()
+            window.file_model.clear()
+            window.file_model.add_paths(paths)
+
+        record("save_experiment", measure(window.save_experiment, args.repeat, setup=prepare_save))
+        window.backup_queue.drain()
+
+    def load_experiment():
+        window.load_selected_experiment()
+        wait_for_thread(app, window)
+
+    if only("load_selected_experiment"):
+        window.refresh_from_disk()
+        window.select_experiment(exp_file)
+        record("load_selected_experiment", measure(load_experiment, args.repeat))
+
+    if only("search"):
+        record("search", measure(lambda: window.project_folder.search("baseline"), args.repeat))
+
+    if only("diff_experiments") and len(experiments) > 1:
+        old_file = experiments[0][2]
+        record("diff_experiments",
+               measure(lambda: window.project_folder.diff_experiments(old_file, exp_file), args.repeat))
+
+    catalogue = os.path.join(workdir, "catalogue.jsonl")
+    if only("catalogue_export") or only("catalogue_import"):
+        from catalogue import export_catalogue, import_catalogue
+        record("catalogue_export",
+               measure(lambda: export_catalogue(window.project_folder, catalogue), args.repeat))
+        target = {}
+
+        def empty_folder():
+            if "folder" in target:
+                target["folder"].close()
+                shutil.rmtree(target["folder"].base_folder)
+            folder = os.path.join(workdir, "imported")
+            os.makedirs(folder)
+            target["folder"] = ProjectFolder(folder)
+
+        record("catalogue_import",
+               measure(lambda: import_catalogue(target["folder"], catalogue), args.repeat, setup=empty_folder))
+        target["folder"].close()
+
+    window.close()
+    if warnings:
+        print("warnings:", *warnings, sep="\n  ")
+
+
+def compare(baseline, results):
+    print(f"\n{'operation':28} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name in sorted(set(baseline) | set(results)):
+        old = baseline.get(name, {}).get("median_ms")
+        new = results.get(name, {}).get("median_ms")
+        if old is None or new is None:
+            print(f"{name:28} {str(old):>12} {str(new):>12}")
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{name:28} {old:12.2f} {new:12.2f} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the experiment tracker's hot paths")
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--experiments", type=int, default=10, help="experiment titles per project")
+    parser.add_argument("--versions", type=int, default=5, help="versions per experiment")
+    parser.add_argument("--files", type=int, default=10_000, help="attached files per experiment")
+    parser.add_argument("--scan-files", type=int, default=10_000, help="files on disk for folder scans")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--format", default="indented", help="file format of the generated experiments")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="operations to run (default: all)")
+    parser.add_argument("--naive", action="store_true",
+                        help="also time the O(files x selections) removal loop")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare with a previous results file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated workload")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tracker-bench-")
+    # Keep the user's config and fingerprint cache out of it
+    home = os.path.join(workdir, "home")
+    os.makedirs(os.path.join(home, "tracking"))
+    os.environ["HOME"] = home
+    with open(os.path.join(home, ".experiment_tracker_config.json"), "w") as f:
+        json.dump({"tracking_dir": os.path.join(home, "tracking")}, f)
+
+    results = {}
+    try:
+        run_benchmarks(args, workdir, results)
+    finally:
+        if args.keep:
+            print(f"workload kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if baseline["params"] != report["params"]:
+            print("\nnote: the baseline was run with different parameters")
+        compare(baseline["results"], results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker_core import sanitize_filename, project_document, experiment_document, file_tree
+from storage import FORMAT_INDENTED, encode_document, write_atomic
+
+# Synthetic project folders built with the documents the app writes, but
+# written directly (no GUI, no backups, no index) so large workloads are
+# quick to build.
+
+
+def synthetic_paths(n_files, fanout=10, depth=3, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(n_files):
+        dirs = [f"d{rng.randrange(fanout)}" for _ in range(depth)]
+        paths.append(os.path.join(*dirs, f"file_{i}.dat"))
+    return paths
+
+
+def generate_project_folder(folder, projects=10, experiments=10, versions=5, files=100,
+                            depth=3, fanout=10, fmt=FORMAT_INDENTED, seed=0):
+    # projects x experiments x versions experiment files, each with `files`
+    # attached paths; returns the project file names
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    words = ["baseline", "sweep", "ablation", "finetune", "eval", "resnet", "vit", "lstm"]
+    project_files = []
+    for p in range(projects):
+        title = f"Project {p}"
+        project_file = f"{sanitize_filename(title)}.json"
+        metadata = project_document(title, " ".join(rng.choices(words, k=8)),
+                                    [f"user{rng.randrange(20)}"], "Personal", "2024-01-01", "2024-12-31")
+        write_atomic(os.path.join(folder, project_file), encode_document(metadata))
+        project_files.append(project_file)
+        for e in range(experiments):
+            exp_title = f"{rng.choice(words)} {e}"
+            paths = synthetic_paths(files, fanout, depth, seed=rng.randrange(1 << 30))
+            for v in range(versions):
+                version = f"1.{v}.0"
+                experiment_data = experiment_document(
+                    project_file, exp_title, *file_tree(paths, fmt),
+                    description=" ".join(rng.choices(words, k=12)), version=version,
+                    start=f"2024-{v % 12 + 1:02d}-01", end=f"2024-{v % 12 + 1:02d}-28")
+                filename = f"{sanitize_filename(title)}_{sanitize_filename(exp_title)}_v{version}.json"
+                write_atomic(os.path.join(folder, filename), encode_document(experiment_data, fmt))
+    return project_files
+
+
+def generate_data_tree(folder, files=1000, depth=3, fanout=10, seed=0):
+    # Real files on disk for folder scans; returns the created paths
+    created = []
+    for path in synthetic_paths(files, fanout, depth, seed):
+        full = os.path.join(folder, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, 'wb'):
+            pass
+        created.append(full)
+    return created
@@ -0,0 +1,248 @@
+import os
+import gzip
+import json
+from collections import deque
+from storage import FORMAT_INDENTED, read_document, temp_path
+from file_table import iter_experiment_paths
+from tracker_core import project_document, experiment_document, file_tree
+from instrumentation import recorder
+
+# Bulk export and import of the projects and experiments of a project
+# folder, one record per document. Experiment file trees are flattened into
+# a list of paths, and fingerprints into a list of {path, size, mtime, hash}:
+#
+#   {"file": "Proj.json", "kind": "project", "title": ..., "description": ...,
+#    "usernames": [...], "association": ..., "start": ..., "end": ...}
+#   {"file": "Proj_Exp_v1.0.0.json", "kind": "experiment", "project": "Proj.json",
+#    "title": ..., "description": ..., "version": "1.0.0", "start": ..., "end": ...,
+#    "paths": [...], "fingerprints": [...]}
+#
+# Catalogues are JSON Lines (gzipped if the name ends in .gz) or, with
+# pyarrow installed, Parquet. Export parses the documents in chunks on a
+# process pool and writes every chunk before more are read, so memory stays
+# flat however many documents the folder holds.
+
+FORMAT_JSONL = "jsonl"
+FORMAT_PARQUET = "parquet"
+CATALOGUE_FORMATS = [FORMAT_JSONL, FORMAT_PARQUET]
+CHUNK_SIZE = 500
+
+
+def catalogue_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if path.endswith(('.parquet', '.pq')):
+        return FORMAT_PARQUET
+    return FORMAT_JSONL
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet catalogues need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _parquet_schema(pa):
+    fingerprint = pa.struct([("path", pa.string()), ("size", pa.int64()),
+                             ("mtime", pa.float64()), ("hash", pa.string())])
+    return pa.schema([
+        ("file", pa.string()), ("kind", pa.string()), ("project", pa.string()),
+        ("title", pa.string()), ("description", pa.string()), ("version", pa.string()),
+        ("usernames", pa.list_(pa.string())), ("association", pa.string()),
+        ("start", pa.string()), ("end", pa.string()),
+        ("paths", pa.list_(pa.string())), ("fingerprints", pa.list_(fingerprint)),
+    ])
+
+
+def document_record(filename, data):
+    # None for JSON files that are neither a project nor an experiment
+    if 'project' in data:
+        project = data['project']
+        dates = project.get('dates') or {}
+        return {
+            "file": filename, "kind": "project", "title": project['title'],
+            "description": project.get('description') or "",
+            "usernames": list(project.get('usernames') or []),
+            "association": project.get('association') or "",
+            "start": dates.get('start'), "end": dates.get('end'),
+        }
+    if 'experiment' in data:
+        exp_data = data['experiment']
+        dates = exp_data.get('dates') or {}
+        record = {
+            "file": filename, "kind": "experiment", "project": data.get('project_reference'),
+            "title": exp_data['title'], "description": exp_data.get('description') or "",
+            "version": exp_data.get('version'), "start": dates.get('start'), "end": dates.get('end'),
+            "paths": list(iter_experiment_paths(exp_data)),
+        }
+        fingerprints = exp_data.get('file_fingerprints')
+        if fingerprints:
+            record["fingerprints"] = [
+                {"path": path, "size": fp.get("size"), "mtime": fp.get("mtime"), "hash": fp.get("hash")}
+                for path, fp in fingerprints.items()]
+        return record
+    return None
+
+
+def record_document(record, fmt=FORMAT_INDENTED):
+    # (filename, document) of a record, in the layout save_experiment uses
+    # for `fmt`
+    filename = record.get("file")
+    if not isinstance(filename, str) or not filename:
+        raise ValueError(f"Record without a file name: {record!r:.200}")
+    title = record.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError(f"{filename}: title is required")
+    kind = record.get("kind")
+    if kind == "project":
+        return filename, project_document(
+            title.strip(), record.get("description") or "", record.get("usernames") or (),
+            record.get("association") or "", record.get("start"), record.get("end"))
+    if kind == "experiment":
+        if not record.get("project") or not record.get("version"):
+            raise ValueError(f"{filename}: experiments need a project and a version")
+        fingerprints = {fp["path"]: {"size": fp.get("size"), "mtime": fp.get("mtime"), "hash": fp.get("hash")}
+                        for fp in record.get("fingerprints") or ()}
+        return filename, experiment_document(
+            record["project"], title.strip(), *file_tree(record.get("paths") or (), fmt),
+            description=record.get("description") or "", version=record["version"],
+            start=record.get("start"), end=record.get("end"), fingerprints=fingerprints or None)
+    raise ValueError(f"{filename}: unknown kind {kind!r}")
+
+
+def _read_chunk(base_folder, filenames):
+    # Runs in a worker process; returns the records and the files that could
+    # not be read
+    records = []
+    failed = []
+    for filename in filenames:
+        try:
+            record = document_record(filename, read_document(os.path.join(base_folder, filename)))
+        except Exception:
+            record = None
+        if record is None:
+            failed.append(filename)
+        else:
+            records.append(record)
+    return records, failed
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def read_records(base_folder, filenames, jobs=None, chunk_size=CHUNK_SIZE):
+    # Yields (records, failed) per chunk of filenames, in order. At most two
+    # chunks per worker are parsed ahead of the consumer.
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(filenames) <= chunk_size:
+        for chunk in _chunks(filenames, chunk_size):
+            yield _read_chunk(base_folder, chunk)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for chunk in _chunks(filenames, chunk_size):
+            pending.append(pool.submit(_read_chunk, base_folder, chunk))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class JsonlWriter:
+    def __init__(self, path, compress=False):
+        if compress:
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, records):
+        self.file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # One row group per chunk of records
+    def __init__(self, path):
+        self.pa = _pyarrow()
+        self.schema = _parquet_schema(self.pa)
+        self.writer = self.pa.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, records):
+        if records:
+            self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path, fmt=None, target=None):
+    # `target` is the final name when writing to a temporary file
+    if catalogue_format(target or path, fmt) == FORMAT_PARQUET:
+        return ParquetWriter(path)
+    return JsonlWriter(path, compress=(target or path).endswith('.gz'))
+
+
+def iter_records(path, fmt=None, batch_size=CHUNK_SIZE):
+    if catalogue_format(path, fmt) == FORMAT_PARQUET:
+        pa = _pyarrow()
+        with pa.parquet.ParquetFile(path) as f:
+            for batch in f.iter_batches(batch_size=batch_size):
+                for record in batch.to_pylist():
+                    yield {key: value for key, value in record.items() if value is not None}
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f"{path}:{line_number}: not a JSON record")
+
+
+def export_catalogue(folder, path, fmt=None, jobs=None, chunk_size=CHUNK_SIZE):
+    # Writes every project and experiment of a ProjectFolder to path; the
+    # file only appears once complete. Returns the number of records and the
+    # files that could not be read.
+    tmp_path = temp_path(os.path.abspath(path))
+    writer = open_writer(tmp_path, fmt, target=path)
+    count = 0
+    failed = []
+    try:
+        with recorder.span("catalogue_export") as span:
+            for records, unreadable in read_records(folder.base_folder, folder.documents(), jobs, chunk_size):
+                writer.write(records)
+                count += len(records)
+                failed.extend(unreadable)
+            writer.close()
+            span.count = count
+        os.replace(tmp_path, path)
+    except BaseException:
+        writer.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return count, failed
+
+
+def import_catalogue(folder, path, fmt=None, document_format=FORMAT_INDENTED, durable=True, workers=8):
+    # Registers the records of a catalogue in a ProjectFolder as one batch,
+    # see ProjectFolder.import_documents. Records keep their file names, so
+    # experiments still point at their projects. Returns the imported and
+    # the skipped file names.
+    documents = (record_document(record, document_format) for record in iter_records(path, fmt))
+    with recorder.span("catalogue_import") as span:
+        imported, skipped = folder.import_documents(documents, document_format, durable, workers)
+        span.count = len(imported)
+    return imported, skipped
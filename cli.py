@@ -0,0 +1,427 @@
+import os
+import sys
+import json
+import time
+import argparse
+from tracker_core import ProjectFolder, load_tracking_dir, record_path
+from storage import FORMATS, FORMAT_INDENTED
+from metadata_index import SEARCH_FIELDS, SEARCH_LIMIT
+
+BACKUP_TIMEOUT = 60
+
+
+def collect_files(paths, base_folder, exclude):
+    from file_scan import walk_files, parse_patterns
+    patterns = parse_patterns(exclude)
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(record_path(p, base_folder) for p in walk_files(path, exclude=patterns))
+        else:
+            files.append(record_path(path, base_folder))
+    return files
+
+
+def open_folder(args):
+    # Each command refreshes only what it reads: the whole index, the
+    # version table, or nothing
+    tracking_dir = None if args.no_backup else (args.tracking_dir or load_tracking_dir())
+    folder = ProjectFolder(args.folder, tracking_dir)
+    if args.refresh == "index":
+        folder.refresh()
+    elif args.refresh == "versions":
+        folder.refresh_versions()
+    return folder
+
+
+def find_project(folder, name):
+    # A project file is read directly; only titles need the index
+    if os.path.basename(name) == name:
+        try:
+            folder.project_title(name)
+            return name
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    folder.refresh()
+    return folder.find_project(name)
+
+
+def cmd_create_project(folder, args):
+    filename = folder.create_project(
+        args.title,
+        description=args.description,
+        usernames=[u.strip() for u in args.users.split(',') if u.strip()],
+        association=args.association,
+        start=args.start,
+        end=args.end
+    )
+    print(filename)
+
+
+def cmd_save_experiment(folder, args):
+    from file_scan import DEFAULT_EXCLUDE
+    paths = list(args.files)
+    if args.files_from:
+        with open(args.files_from, 'r') as f:
+            paths.extend(line.rstrip('\n') for line in f if line.strip())
+    files = collect_files(paths, folder.base_folder,
+                          DEFAULT_EXCLUDE if args.exclude is None else args.exclude)
+    filename = folder.save_experiment(
+        find_project(folder, args.project),
+        args.title,
+        files,
+        description=args.description,
+        version=args.version,
+        version_type=args.bump,
+        start=args.start,
+        end=args.end,
+        fingerprints=args.fingerprints or None,
+        fmt=args.format
+    )
+    print(filename)
+
+
+def cmd_next_version(folder, args):
+    print(folder.next_version(find_project(folder, args.project), args.title, args.bump))
+
+
+def cmd_list(folder, args):
+    if args.project:
+        project_file = folder.find_project(args.project)
+        rows = [{"title": t, "version": v, "file": f} for t, v, f in folder.experiments(project_file)]
+    else:
+        rows = [{"title": t, "file": f} for t, f in folder.projects()]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            version = f" (v{row['version']})" if 'version' in row else ""
+            print(f"{row['file']}\t{row['title']}{version}")
+
+
+def cmd_search(folder, args):
+    rows = [{"file": f, "kind": kind, "title": title, "project": reference, "version": version,
+             "start": start, "end": end}
+            for f, kind, title, reference, version, start, end in
+            folder.search(args.text, args.field, args.kind, args.date_from, args.date_to, args.limit)]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            version = f" (v{row['version']})" if row['version'] else ""
+            print(f"{row['file']}\t{row['kind']}\t{row['title']}{version}\t{row['start']}..{row['end']}")
+
+
+def cmd_diff(folder, args):
+    diff = folder.diff_experiments(args.old, args.new)
+    if args.json:
+        print(json.dumps(diff, indent=2))
+        return
+    for name, old, new in diff["fields"]:
+        print(f"~ {name}: {old!r} -> {new!r}")
+    for path in diff["added"]:
+        print(f"+ {path}")
+    for path in diff["removed"]:
+        print(f"- {path}")
+    for old, new in diff["moved"]:
+        print(f"> {old} -> {new}")
+    for old, new in diff["possibly_moved"]:
+        print(f"? {old} -> {new}")
+    for path in diff["changed"]:
+        print(f"M {path}")
+
+
+def cmd_log_metrics(folder, args):
+    with folder.metrics_writer(args.experiment) as writer:
+        if args.csv:
+            # step,name,value[,timestamp] rows, with an optional header
+            import csv
+            with open(args.csv, 'r', newline='') as f:
+                for row in csv.reader(f):
+                    if not row or row[0] == "step":
+                        continue
+                    writer.log(row[1], float(row[2]), int(row[0]), float(row[3]) if len(row) > 3 else None)
+        metrics = {}
+        for item in args.metrics:
+            name, sep, value = item.rpartition("=")
+            if not sep or not name:
+                raise ValueError(f"Expected name=value, got {item!r}")
+            metrics[name] = float(value)
+        if metrics:
+            writer.log_many(metrics, args.step)
+
+
+def cmd_metrics(folder, args):
+    results = {}
+    for experiment_file in args.experiments:
+        log = folder.metrics(experiment_file)
+        if args.name is None:
+            results[experiment_file] = {name: log.count(name) for name in log.names()}
+        else:
+            series = log.downsample(args.name, args.buckets, args.step_from, args.step_to)
+            results[experiment_file] = {column: values.tolist() if hasattr(values, 'tolist') else values
+                                        for column, values in series.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for experiment_file, result in results.items():
+        print(experiment_file)
+        if args.name is None:
+            for name, count in result.items():
+                print(f"  {name}\t{count} points")
+            continue
+        for step, mean, low, high in zip(result["step"], result["mean"], result["min"], result["max"]):
+            print(f"  {step}\t{mean:.6g}\t{low:.6g}\t{high:.6g}")
+
+
+def cmd_export(folder, args):
+    from catalogue import export_catalogue
+    start = time.perf_counter()
+    count, failed = export_catalogue(folder, args.output, args.format, args.jobs)
+    for filename in failed:
+        print(f"warning: could not read {filename}", file=sys.stderr)
+    print(f"{count} records written to {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_import(folder, args):
+    from catalogue import import_catalogue
+    start = time.perf_counter()
+    imported, skipped = import_catalogue(folder, args.input, args.format, args.document_format,
+                                         durable=not args.no_fsync, workers=args.jobs)
+    print(f"{len(imported)} imported, {len(skipped)} skipped (already present) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_reconcile(folder, args):
+    from backup_queue import default_queue, reconcile
+    if not folder.tracking_dir:
+        raise ValueError("No tracking directory: configure one in the app or pass --tracking-dir")
+    start = time.perf_counter()
+    result = reconcile(folder, folder.tracking_dir, default_queue(), args.dry_run, args.jobs)
+    for state in ("missing", "changed", "unreadable"):
+        for filename in result[state]:
+            print(f"{state}\t{filename}")
+    action = "to queue" if args.dry_run else "queued"
+    print(f"{result['in_sync'] + result['restamped']} in sync ({result['restamped']} restamped), "
+          f"{len(result['missing'])} missing and {len(result['changed'])} changed {action}, "
+          f"{len(result['unreadable'])} unreadable in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_backups(args):
+    from backup_queue import BackupQueue
+    queue = BackupQueue()
+    if args.action == "drain":
+        queue.drain(args.timeout, retry=True)
+    stats = queue.stats()
+    if args.action == "drain":
+        print(f"{stats['written']} written, {stats['failures']} failed attempts")
+    print(f"{stats['depth']} queued ({stats['bytes']} bytes), oldest {stats['lag']:.1f}s, "
+          f"{stats['retrying']} retrying")
+    for tracking_dir, kind, filename, attempts, error in queue.errors():
+        print(f"{tracking_dir}\t{kind}/{filename}\t{attempts} attempts\t{error}")
+    queue.close()
+
+
+def finish_backups(wait):
+    # Saves only queue their backups. With --wait-backups they get up to
+    # BACKUP_TIMEOUT to land before exiting; whatever is left stays queued
+    # for the next drain.
+    from backup_queue import default_queue
+    queue = default_queue(create=False)
+    if queue is None:
+        return
+    if wait:
+        queue.drain(BACKUP_TIMEOUT)
+    queue.close()
+    stats = queue.stats()
+    if stats["depth"]:
+        error = f" (last error: {stats['last_error']})" if stats["last_error"] else ""
+        print(f"warning: {stats['depth']} backups are still queued and will be written by the "
+              f"next drain{error}", file=sys.stderr)
+
+
+def cmd_workspace(args):
+    # The workspace is the list of project folders in the config, shared
+    # with the app
+    from workspace import Workspace, load_workspace_roots, save_workspace_roots
+    roots = load_workspace_roots()
+    if args.action in ("add", "remove"):
+        for path in args.args:
+            root = os.path.abspath(path)
+            if args.action == "add":
+                if not os.path.isdir(root):
+                    raise ValueError(f"Not a folder: {path}")
+                if root not in roots:
+                    roots.append(root)
+            elif root in roots:
+                roots.remove(root)
+        save_workspace_roots(roots)
+    if args.action in ("list", "add", "remove"):
+        for root in roots:
+            print(root)
+        return
+    workspace = Workspace(roots, max_workers=args.jobs)
+    try:
+        start = time.perf_counter()
+        for root, result in workspace.refresh():
+            elapsed = time.perf_counter() - start
+            if isinstance(result, Exception):
+                print(f"error: {root}: {str(result)}", file=sys.stderr)
+            elif args.action == "scan":
+                changed, removed = result
+                print(f"{root}\t{len(changed)} changed, {len(removed)} removed\t{elapsed:.2f}s")
+        if args.action == "search":
+            for root, f, kind, title, reference, version, start, end in workspace.search(" ".join(args.args)):
+                version = f" (v{version})" if version else ""
+                print(f"{root}\t{f}\t{kind}\t{title}{version}")
+    finally:
+        workspace.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Experiment Tracking Suite command line interface")
+    parser.add_argument("--tracking-dir", help="backup directory (defaults to the app's configured one)")
+    parser.add_argument("--no-backup", action="store_true", help="do not write tracking-directory backups")
+    parser.add_argument("--wait-backups", action="store_true",
+                        help=f"wait up to {BACKUP_TIMEOUT}s for queued backups before exiting")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("create-project", help="create a project in a project folder")
+    p.add_argument("folder")
+    p.add_argument("--title", required=True)
+    p.add_argument("--description", default="")
+    p.add_argument("--users", default="", help="comma-separated team members")
+    p.add_argument("--association", default="")
+    p.add_argument("--start", help="YYYY-MM-DD, defaults to today")
+    p.add_argument("--end", help="YYYY-MM-DD, defaults to today")
+    p.set_defaults(func=cmd_create_project, refresh=None)
+
+    p = sub.add_parser("save-experiment", help="save a new experiment version")
+    p.add_argument("folder")
+    p.add_argument("--project", required=True, help="project file name or title")
+    p.add_argument("--title", required=True)
+    p.add_argument("--description", default="")
+    p.add_argument("--version", help="explicit version; bumped automatically when omitted")
+    p.add_argument("--bump", choices=["patch", "minor", "major"], default="patch")
+    p.add_argument("--files", nargs="*", default=[], help="files or folders to attach")
+    p.add_argument("--files-from", help="file with one path per line")
+    p.add_argument("--exclude", help="comma-separated glob patterns skipped in folders")
+    p.add_argument("--fingerprints", action="store_true", help="record size, mtime and content hash")
+    p.add_argument("--format", choices=FORMATS, default=FORMAT_INDENTED)
+    p.add_argument("--start", help="YYYY-MM-DD, defaults to today")
+    p.add_argument("--end", help="YYYY-MM-DD, defaults to today")
+    p.set_defaults(func=cmd_save_experiment, refresh="versions")
+
+    p = sub.add_parser("next-version", help="print the next version of an experiment")
+    p.add_argument("folder")
+    p.add_argument("--project", required=True, help="project file name or title")
+    p.add_argument("--title", required=True)
+    p.add_argument("--bump", choices=["patch", "minor", "major"], default="patch")
+    p.set_defaults(func=cmd_next_version, refresh="versions")
+
+    p = sub.add_parser("list", help="list projects, or the experiments of one project")
+    p.add_argument("folder")
+    p.add_argument("--project", help="project file name or title")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_list, refresh="index")
+
+    p = sub.add_parser("search", help="full-text search over projects and experiments")
+    p.add_argument("folder")
+    p.add_argument("text", nargs="?", default="", help="words to match, as prefixes")
+    p.add_argument("--field", choices=SEARCH_FIELDS, help="only match in this field")
+    p.add_argument("--kind", choices=["project", "experiment"])
+    p.add_argument("--from", dest="date_from", help="YYYY-MM-DD, overlapping date range start")
+    p.add_argument("--to", dest="date_to", help="YYYY-MM-DD, overlapping date range end")
+    p.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_search, refresh="index")
+
+    p = sub.add_parser("diff", help="compare two experiment files")
+    p.add_argument("folder")
+    p.add_argument("old", help="older experiment file name")
+    p.add_argument("new", help="newer experiment file name")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_diff, refresh=None)
+
+    p = sub.add_parser("log-metrics", help="append scalar metrics to an experiment")
+    p.add_argument("folder")
+    p.add_argument("experiment", help="experiment file name")
+    p.add_argument("metrics", nargs="*", help="name=value pairs logged at one step")
+    p.add_argument("--step", type=int, help="defaults to one past each metric's last step")
+    p.add_argument("--csv", help="import step,name,value[,timestamp] rows")
+    p.set_defaults(func=cmd_log_metrics, refresh=None)
+
+    p = sub.add_parser("metrics", help="list or query the metrics of experiments")
+    p.add_argument("folder")
+    p.add_argument("experiments", nargs="+", help="experiment file names")
+    p.add_argument("--name", help="metric to query; lists the metrics when omitted")
+    p.add_argument("--from", dest="step_from", type=int, help="first step")
+    p.add_argument("--to", dest="step_to", type=int, help="stop before this step")
+    p.add_argument("--buckets", type=int, default=1000, help="downsample to at most this many points")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_metrics, refresh=None)
+
+    p = sub.add_parser("export", help="write all projects and experiments to a JSONL or Parquet catalogue")
+    p.add_argument("folder")
+    p.add_argument("output", help="*.jsonl, *.jsonl.gz or *.parquet")
+    p.add_argument("--format", choices=["jsonl", "parquet"], help="defaults to the output's extension")
+    p.add_argument("--jobs", type=int, help="parser processes (defaults to the number of CPUs)")
+    p.set_defaults(func=cmd_export, refresh="index")
+
+    p = sub.add_parser("import", help="register the projects and experiments of a catalogue in one batch")
+    p.add_argument("folder")
+    p.add_argument("input", help="*.jsonl, *.jsonl.gz or *.parquet")
+    p.add_argument("--format", choices=["jsonl", "parquet"], help="defaults to the input's extension")
+    p.add_argument("--document-format", choices=FORMATS, default=FORMAT_INDENTED,
+                   help="format of the written experiment files")
+    p.add_argument("--no-fsync", action="store_true", help="do not sync each file to disk (faster)")
+    p.add_argument("--jobs", type=int, default=8, help="writer threads")
+    p.set_defaults(func=cmd_import, refresh="index")
+
+    p = sub.add_parser("reconcile", help="queue backups of files whose tracking-directory copy is missing or stale")
+    p.add_argument("folder")
+    p.add_argument("--dry-run", action="store_true", help="only report what would be queued")
+    p.add_argument("--jobs", type=int, default=8, help="files compared at the same time")
+    p.set_defaults(func=cmd_reconcile, refresh="index")
+
+    p = sub.add_parser("backups", help="show or drain the queue of backups waiting to be written")
+    p.add_argument("action", choices=["status", "drain"])
+    p.add_argument("--timeout", type=float, default=BACKUP_TIMEOUT, help="seconds to wait when draining")
+    p.set_defaults(func=cmd_backups, folderless=True)
+
+    p = sub.add_parser("workspace", help="manage and scan the project folders of the workspace")
+    p.add_argument("action", choices=["list", "add", "remove", "scan", "search"])
+    p.add_argument("args", nargs="*", help="folders to add or remove, or words to search for")
+    p.add_argument("--jobs", type=int, default=8, help="folders scanned at the same time")
+    p.set_defaults(func=cmd_workspace, folderless=True)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "folderless", False):
+        try:
+            args.func(args)
+        except (ValueError, OSError) as e:
+            print(f"error: {str(e)}", file=sys.stderr)
+            return 1
+        return 0
+    try:
+        folder = open_folder(args)
+    except OSError as e:
+        print(f"error: {str(e)}", file=sys.stderr)
+        return 1
+    try:
+        args.func(folder, args)
+        finish_backups(args.wait_backups)
+    except (KeyError, ValueError, OSError, RuntimeError) as e:
+        message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+        print(f"error: {message}", file=sys.stderr)
+        return 1
+    finally:
+        folder.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import os
+from file_table import experiment_tree
+
+# Structural diff between two experiment documents. The merge walk compares
+# both file_structure trees folder by folder and skips every subtree that is
+# identical in both versions. Identical subtrees are detected with dict
+# equality, which runs in C on the strings' cached hashes; hashing each
+# folder with a digest first costs more in Python than the walk it saves.
+
+FIELDS = ["title", "description", "version", "dates.start", "dates.end"]
+
+
+def field_value(exp_data, name):
+    value = exp_data
+    for key in name.split('.'):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def content_token(fingerprint):
+    # What identifies a file's content: its recorded hash, else size and mtime
+    if not isinstance(fingerprint, dict):
+        return None
+    if fingerprint.get('hash'):
+        return fingerprint['hash']
+    return (fingerprint.get('size'), fingerprint.get('mtime'))
+
+
+def subtree_leaves(node, out):
+    if not isinstance(node, dict):
+        out.append(node)
+        return
+    stack = [node]
+    while stack:
+        folder = stack.pop()
+        for value in folder.values():
+            if isinstance(value, dict):
+                stack.append(value)
+            else:
+                out.append(value)
+
+
+def diff_trees(old_tree, new_tree):
+    # Returns (added, removed) lists of stored paths
+    added = []
+    removed = []
+    stack = [(old_tree, new_tree)]
+    while stack:
+        old_folder, new_folder = stack.pop()
+        if old_folder == new_folder:
+            continue
+        for name, old_value in old_folder.items():
+            if name not in new_folder:
+                subtree_leaves(old_value, removed)
+                continue
+            new_value = new_folder[name]
+            old_is_dir = isinstance(old_value, dict)
+            if old_is_dir and isinstance(new_value, dict):
+                stack.append((old_value, new_value))
+            elif old_is_dir or isinstance(new_value, dict) or old_value != new_value:
+                subtree_leaves(old_value, removed)
+                subtree_leaves(new_value, added)
+        for name, new_value in new_folder.items():
+            if name not in old_folder:
+                subtree_leaves(new_value, added)
+    return added, removed
+
+
+def changed_files(old_fingerprints, new_fingerprints):
+    # Files fingerprinted in both versions whose content differs; entries
+    # that differ only in mtime keep the same content hash
+    if old_fingerprints == new_fingerprints:
+        return []
+    changed = []
+    for path, fingerprint in new_fingerprints.items():
+        old = old_fingerprints.get(path)
+        if old is not None and old != fingerprint and content_token(old) != content_token(fingerprint):
+            changed.append(path)
+    return changed
+
+
+def same_file(old, new):
+    # Whether two fingerprints of files with the same name agree: by hash
+    # when both have one, else by size; None when either is missing
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return None
+    if old.get('hash') and new.get('hash'):
+        return old['hash'] == new['hash']
+    return old.get('size') is not None and old.get('size') == new.get('size')
+
+
+def match_moves(added, removed, old_fingerprints, new_fingerprints):
+    # Pairs removed and added files with the same content hash, then files
+    # with the same name that is unique on both sides. Name pairs count as
+    # moved when their fingerprints agree; without fingerprints to tell,
+    # they are only possibly moved.
+    moved = []
+    possibly_moved = []
+    by_hash = {}
+    for path in removed:
+        token = content_token(old_fingerprints.get(path))
+        if token is not None:
+            by_hash.setdefault(token, []).append(path)
+    matched_old = set()
+    matched_new = set()
+    for path in added:
+        candidates = by_hash.get(content_token(new_fingerprints.get(path)))
+        if candidates:
+            old_path = candidates.pop()
+            moved.append((old_path, path))
+            matched_old.add(old_path)
+            matched_new.add(path)
+
+    def unique_names(paths, matched):
+        names = {}
+        for path in paths:
+            if path not in matched:
+                names.setdefault(os.path.basename(path), []).append(path)
+        return {name: p[0] for name, p in names.items() if len(p) == 1}
+
+    old_names = unique_names(removed, matched_old)
+    for name, path in unique_names(added, matched_new).items():
+        old_path = old_names.get(name)
+        if old_path is None:
+            continue
+        same = same_file(old_fingerprints.get(old_path), new_fingerprints.get(path))
+        if same is False:
+            continue
+        (moved if same else possibly_moved).append((old_path, path))
+        matched_old.add(old_path)
+        matched_new.add(path)
+
+    added = [p for p in added if p not in matched_new]
+    removed = [p for p in removed if p not in matched_old]
+    return added, removed, moved, possibly_moved
+
+
+def diff_experiments(old_data, new_data):
+    # Compares two experiment documents as loaded from disk. Returns a dict
+    # with the changed metadata fields as (name, old, new) and sorted lists
+    # of added, removed and changed paths and of (old, new) moved and
+    # possibly moved pairs.
+    old_exp = old_data['experiment']
+    new_exp = new_data['experiment']
+    fields = []
+    for name in FIELDS:
+        old_value = field_value(old_exp, name)
+        new_value = field_value(new_exp, name)
+        if old_value != new_value:
+            fields.append((name, old_value, new_value))
+    if old_data.get('project_reference') != new_data.get('project_reference'):
+        fields.append(("project_reference", old_data.get('project_reference'),
+                       new_data.get('project_reference')))
+
+    old_fingerprints = old_exp.get('file_fingerprints') or {}
+    new_fingerprints = new_exp.get('file_fingerprints') or {}
+    added, removed = diff_trees(experiment_tree(old_exp), experiment_tree(new_exp))
+    changed = changed_files(old_fingerprints, new_fingerprints)
+    added, removed, moved, possibly_moved = match_moves(added, removed, old_fingerprints, new_fingerprints)
+    return {
+        "fields": fields,
+        "added": sorted(added),
+        "removed": sorted(removed),
+        "moved": sorted(moved),
+        "possibly_moved": sorted(possibly_moved),
+        "changed": sorted(changed),
+    }
@@ -0,0 +1,53 @@
+import os
+import re
+from fnmatch import translate
+
+DEFAULT_EXCLUDE = ".git, __pycache__, .ipynb_checkpoints"
+
+
+def parse_patterns(text):
+    return [p.strip() for p in text.split(',') if p.strip()]
+
+
+def compile_patterns(patterns):
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile('|'.join(f"(?:{translate(p)})" for p in patterns), flags)
+
+
+def walk_files(folder, include=(), exclude=(), cancelled=None):
+    # Iterative os.scandir walk yielding absolute file paths. Exclude patterns
+    # prune whole directories as soon as they are seen; both include and
+    # exclude patterns are matched against the entry name and its path
+    # relative to `folder`.
+    include_re = compile_patterns(include)
+    exclude_re = compile_patterns(exclude)
+    stack = [(folder, "")]
+    while stack:
+        if cancelled is not None and cancelled.is_set():
+            return
+        current, rel_dir = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        subdirs = []
+        with it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if exclude_re and (exclude_re.match(entry.name) or exclude_re.match(rel_path)):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Like os.walk, symlinked directories are not followed
+                    if not entry.is_symlink():
+                        subdirs.append((entry.path, rel_path))
+                    continue
+                if include_re and not (include_re.match(entry.name) or include_re.match(rel_path)):
+                    continue
+                yield entry.path
+        stack.extend(reversed(subdirs))
@@ -0,0 +1,103 @@
+import os
+from path_store import split_path
+
+# Compact alternative to the nested file_structure of an experiment. Paths
+# are grouped by directory: each directory is stored once, followed by the
+# number of files in it, and the file names of all directories are joined
+# into one string. Names are separated by "/", which no file name can
+# contain, or by NUL if a name somehow does. Decoding is a single split plus
+# one string concatenation per file, with no per-file dicts, and the
+# document is a fraction of the size of file_structure, which stores every
+# path twice.
+#
+#   "file_table": {"encoding": "dir-table-v1", "separator": "/",
+#                  "dirs": ["data/", "data/train/"], "counts": [1, 2],
+#                  "names": "readme.txt/a.csv/b.csv"}
+
+ENCODING = "dir-table-v1"
+
+
+def encode_paths(paths):
+    groups = {}
+    for path in paths:
+        directory, name = split_path(path)
+        groups.setdefault(directory, []).append(name)
+    names = [name for group in groups.values() for name in group]
+    separator = "/" if not any("/" in name for name in names) else "\0"
+    return {
+        "encoding": ENCODING,
+        "separator": separator,
+        "dirs": list(groups),
+        "counts": [len(group) for group in groups.values()],
+        "names": separator.join(names),
+    }
+
+
+def table_groups(table):
+    # Checks the encoding up front, so callers fail before the first path
+    if table.get("encoding") != ENCODING:
+        raise ValueError(f"Unsupported file table encoding: {table.get('encoding')}")
+    names = table["names"].split(table["separator"]) if table["counts"] else []
+    groups = []
+    start = 0
+    for directory, count in zip(table["dirs"], table["counts"]):
+        groups.append((directory, names[start:start + count]))
+        start += count
+    return groups
+
+
+def iter_table_paths(table):
+    groups = table_groups(table)
+    return (path for directory, names in groups for path in map(directory.__add__, names))
+
+
+def decode_paths(table):
+    paths = []
+    for directory, names in table_groups(table):
+        paths.extend(map(directory.__add__, names))
+    return paths
+
+
+def table_hierarchy(table):
+    # Same tree as build_hierarchy(decode_paths(table)), built per directory
+    hierarchy = {}
+    for directory, names in table_groups(table):
+        folder = hierarchy
+        for part in directory.split(os.sep)[:-1]:
+            folder = folder.setdefault(part, {})
+        folder.update(zip(names, map(directory.__add__, names)))
+    return hierarchy
+
+
+def iter_hierarchy_paths(file_structure):
+    # Depth-first, in stored order, with an explicit stack so deep trees
+    # cannot hit the recursion limit
+    stack = [("", iter(file_structure.items()))]
+    while stack:
+        current_path, items = stack[-1]
+        for name, value in items:
+            if isinstance(value, dict):
+                stack.append((os.path.join(current_path, name), iter(value.items())))
+                break
+            yield os.path.join(current_path, name)
+        else:
+            stack.pop()
+
+
+def iter_experiment_paths(exp_data):
+    # Attached paths of an experiment in either encoding
+    if 'file_table' in exp_data:
+        return iter_table_paths(exp_data['file_table'])
+    return iter_hierarchy_paths(exp_data.get('file_structure') or {})
+
+
+def experiment_paths(exp_data):
+    if 'file_table' in exp_data:
+        return decode_paths(exp_data['file_table'])
+    return list(iter_experiment_paths(exp_data))
+
+
+def experiment_tree(exp_data):
+    if 'file_table' in exp_data:
+        return table_hierarchy(exp_data['file_table'])
+    return exp_data.get('file_structure') or {}
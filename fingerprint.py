@@ -0,0 +1,128 @@
+import os
+import mmap
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_FILE = os.path.expanduser("~/.experiment_tracker_fingerprints.sqlite")
+HASH_NAME = "blake2b"
+MMAP_THRESHOLD = 1 << 20
+CHUNK_SIZE = 8 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (dev, inode)
+);
+"""
+
+
+def hash_file(path):
+    # hashlib releases the GIL for large updates, so this scales across threads
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, CHUNK_SIZE):
+                        digest.update(view[offset:offset + CHUNK_SIZE])
+                finally:
+                    view.release()
+        elif size:
+            digest.update(f.read())
+    return f"{HASH_NAME}:{digest.hexdigest()}"
+
+
+def stat_file(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+class FingerprintCache:
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        try:
+            self.conn = sqlite3.connect(path, timeout=10)
+            self.conn.executescript(SCHEMA)
+        except sqlite3.Error:
+            self.conn = sqlite3.connect(":memory:")
+            self.conn.executescript(SCHEMA)
+
+    def get(self, st):
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, hash FROM fingerprints WHERE dev = ? AND inode = ?",
+            (st.st_dev, st.st_ino)
+        ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        return None
+
+    def put_many(self, entries):
+        # entries: iterable of (stat_result, hash)
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                    [(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, h) for st, h in entries]
+                )
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        self.conn.close()
+
+
+def compute_fingerprints(paths, base_folder, cache=None, workers=None, progress=None):
+    # Returns {path: {"size", "mtime", "hash"}} for the given relative or
+    # absolute paths. Files whose (inode, size, mtime) match the cache are
+    # not read again; missing or unreadable files are left out.
+    # progress(done, total) may return True to cancel.
+    paths = list(paths)
+    abs_paths = [os.path.join(base_folder, p) for p in paths]
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+    fingerprints = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stats = list(pool.map(stat_file, abs_paths))
+
+        pending = []
+        for path, abs_path, st in zip(paths, abs_paths, stats):
+            if st is None:
+                continue
+            cached = cache.get(st) if cache else None
+            if cached:
+                fingerprints[path] = {"size": st.st_size, "mtime": st.st_mtime, "hash": cached}
+            else:
+                pending.append((path, abs_path, st))
+
+        total = len(pending)
+        futures = [(path, st, pool.submit(hash_file, abs_path)) for path, abs_path, st in pending]
+        hashed = []
+        cancelled = False
+        for done, (path, st, future) in enumerate(futures, 1):
+            try:
+                file_hash = future.result()
+            except OSError:
+                file_hash = None
+            if file_hash:
+                fingerprints[path] = {"size": st.st_size, "mtime": st.st_mtime, "hash": file_hash}
+                hashed.append((st, file_hash))
+            if progress and progress(done, total):
+                cancelled = True
+                for _, _, remaining in futures:
+                    remaining.cancel()
+                break
+    # Keep whatever was hashed, even when cancelled, so a retry is cheaper
+    if cache and hashed:
+        cache.put_many(hashed)
+    if cancelled:
+        return None
+    # In the order of `paths`, whichever of them came from the cache
+    return {path: fingerprints[path] for path in paths if path in fingerprints}
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+# Opt-in timing of the app's expensive operations. Each operation is a span
+# recording its duration plus an optional item count and byte size; spans
+# go into a ring buffer and, if a log file is set, one JSON line each. When
+# recording is off, span() returns a shared no-op object, so instrumented
+# code pays one attribute check.
+#
+#   with recorder.span("json_load") as span:
+#       raw = f.read()
+#       span.bytes = len(raw)
+
+TRACE_ENV = "EXPERIMENT_TRACKER_TRACE"
+RING_SIZE = 10000
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ('recorder', 'name', 'count', 'bytes', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.count = None
+        self.bytes = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.name, time.perf_counter() - self.start, self.count, self.bytes,
+                             error=exc_type.__name__ if exc_type else None)
+        return False
+
+
+class Recorder:
+    def __init__(self, size=RING_SIZE):
+        self.enabled = False
+        self.events = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.log_path = None
+        self._log = None
+        self._profiler = None
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name, seconds, count=None, nbytes=None, error=None):
+        event = {
+            "time": round(time.time(), 6),
+            "op": name,
+            "ms": round(seconds * 1000, 3),
+            "thread": threading.current_thread().name,
+        }
+        if count is not None:
+            event["count"] = count
+        if nbytes is not None:
+            event["bytes"] = nbytes
+        if error is not None:
+            event["error"] = error
+        with self.lock:
+            self.events.append(event)
+            if self._log is not None:
+                self._log.write(json.dumps(event) + "\n")
+                self._log.flush()
+
+    def enable(self, log_path=None):
+        with self.lock:
+            if log_path != self.log_path:
+                if self._log is not None:
+                    self._log.close()
+                self._log = open(log_path, 'a') if log_path else None
+                self.log_path = log_path
+            self.enabled = True
+
+    def disable(self):
+        with self.lock:
+            self.enabled = False
+            if self._log is not None:
+                self._log.close()
+            self._log = None
+            self.log_path = None
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+
+    def recent(self, limit=None):
+        with self.lock:
+            events = list(self.events)
+        return events[-limit:] if limit else events
+
+    def summary(self):
+        # {op: {calls, total_ms, max_ms, count, bytes, errors}} over the ring buffer
+        totals = {}
+        for event in self.recent():
+            entry = totals.setdefault(event["op"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                    "count": 0, "bytes": 0, "errors": 0})
+            entry["calls"] += 1
+            entry["total_ms"] += event["ms"]
+            entry["max_ms"] = max(entry["max_ms"], event["ms"])
+            entry["count"] += event.get("count", 0)
+            entry["bytes"] += event.get("bytes", 0)
+            entry["errors"] += "error" in event
+        return totals
+
+    # On-demand profiles. cProfile only sees the thread that started it (the
+    # GUI thread); tracemalloc covers all threads.
+
+    def profiling(self):
+        return self._profiler is not None
+
+    def start_profile(self):
+        import cProfile
+        import tracemalloc
+        if self._profiler is not None:
+            return
+        self._profiler = cProfile.Profile()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._profiler.enable()
+
+    def stop_profile(self, folder):
+        # Writes <stamp>.prof (pstats) and <stamp>-memory.txt (top
+        # allocation sites) to folder; returns their paths
+        import tracemalloc
+        if self._profiler is None:
+            return []
+        self._profiler.disable()
+        profiler, self._profiler = self._profiler, None
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        os.makedirs(folder, exist_ok=True)
+        prof_path = os.path.join(folder, f"profile-{stamp}.prof")
+        profiler.dump_stats(prof_path)
+        memory_path = os.path.join(folder, f"profile-{stamp}-memory.txt")
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(memory_path, 'w') as f:
+            f.write(f"current {current} bytes, peak {peak} bytes\n\n")
+            for stat in snapshot.statistics('lineno')[:50]:
+                f.write(f"{stat}\n")
+        return [prof_path, memory_path]
+
+
+recorder = Recorder()
+
+if os.environ.get(TRACE_ENV):
+    recorder.enable(os.environ[TRACE_ENV])
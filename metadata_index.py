@@ -0,0 +1,435 @@
+import os
+import re
+import sqlite3
+import threading
+from storage import read_document
+from versioning import parse_version
+from file_table import iter_experiment_paths
+
+INDEX_FILENAME = ".experiment_index.sqlite"
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    kind TEXT,
+    title TEXT,
+    project_reference TEXT,
+    version TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    version_key TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_project ON files(kind, project_reference);
+CREATE INDEX IF NOT EXISTS files_by_experiment
+    ON files(project_reference, kind, title, version_key, start_date, end_date, filename);
+"""
+
+# Full-text index over the searchable fields, keyed by the rowid of the
+# file's row in `files`. Experiments carry their project's usernames and
+# association so a single query can combine project and experiment fields.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+    title, description, usernames, association, paths,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+"""
+
+HISTORY_ORDERS = ["version", "start", "end", "file"]
+HISTORY_PAGE = 200
+
+SEARCH_FIELDS = ["title", "description", "usernames", "association", "paths"]
+SEARCH_LIMIT = 200
+
+
+def document_fields(data):
+    # Index fields of a project or experiment document; None for JSON files
+    # that are neither
+    try:
+        if 'project' in data:
+            project = data['project']
+            dates = project.get('dates') or {}
+            return {
+                "kind": "project", "title": project['title'], "project_reference": None,
+                "version": None, "start": dates.get('start'), "end": dates.get('end'),
+                "description": project.get('description') or "",
+                "usernames": ", ".join(project.get('usernames') or []),
+                "association": project.get('association') or "",
+                "paths": "",
+            }
+        if 'experiment' in data:
+            exp_data = data['experiment']
+            dates = exp_data.get('dates') or {}
+            return {
+                "kind": "experiment", "title": exp_data['title'],
+                "project_reference": data.get('project_reference'),
+                "version": exp_data['version'], "start": dates.get('start'), "end": dates.get('end'),
+                "description": exp_data.get('description') or "",
+                "usernames": "", "association": "",
+                "paths": "\n".join(iter_experiment_paths(exp_data)),
+            }
+    except Exception:
+        pass
+    return None
+
+
+def read_metadata(path):
+    try:
+        return document_fields(read_document(path))
+    except Exception:
+        return None
+
+
+def version_key(version):
+    # Zero-padded so versions sort numerically as text ("1.10.0" after "1.9.0")
+    try:
+        return "%09d.%09d.%09d" % parse_version(version)
+    except Exception:
+        return version
+
+
+def match_expression(text, field=None):
+    # Every word of `text` must match as a prefix, in `field` or any field
+    terms = [t for t in re.split(r"[\W_]+", text) if t]
+    if not terms:
+        return None
+    expression = " ".join('"' + t + '"*' for t in terms)
+    if field:
+        expression = f"{field} : ({expression})"
+    return expression
+
+
+class MetadataIndex:
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILENAME)
+        # One connection is shared by the GUI thread and the workspace pool;
+        # every use holds the lock, and a staged batch holds it from begin()
+        # until commit() or rollback()
+        self.lock = threading.RLock()
+        self.conn = self._connect()
+
+    def _connect(self):
+        # Not tied to the opening thread, so a folder can be opened and
+        # refreshed in the background and then used from the GUI thread
+        try:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS files")
+                conn.execute("DROP TABLE IF EXISTS search")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(SCHEMA)
+        except sqlite3.Error:
+            # Read-only or otherwise unusable folder: keep the index in memory
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            conn.executescript(SCHEMA)
+        try:
+            conn.executescript(SEARCH_SCHEMA)
+            self.searchable = True
+        except sqlite3.Error:
+            # SQLite built without FTS5
+            self.searchable = False
+        return conn
+
+    def scan(self):
+        entries = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries[entry.name] = (st.st_mtime_ns, st.st_size)
+        return entries
+
+    def refresh(self):
+        # Incrementally validate the index against the folder; only files whose
+        # (mtime, size) changed are opened and parsed again. Returns the names
+        # of the changed and removed files.
+        on_disk = self.scan()
+        with self.lock:
+            known = {name: (mtime, size) for name, mtime, size in
+                     self.conn.execute("SELECT filename, mtime_ns, size FROM files")}
+
+        removed = [name for name in known if name not in on_disk]
+        changed = []
+        for name, stamp in on_disk.items():
+            if known.get(name) != stamp:
+                changed.append((name, stamp, read_metadata(os.path.join(self.folder, name))))
+
+        if removed or changed:
+            try:
+                with self.lock, self.conn:
+                    for name in removed:
+                        self._delete(name)
+                    # Projects first, so their experiments pick up the new
+                    # usernames and association
+                    changed.sort(key=lambda c: not (c[2] and c[2]["kind"] == "project"))
+                    for name, stamp, fields in changed:
+                        self._store(name, stamp, fields)
+            except sqlite3.Error:
+                pass
+        return [c[0] for c in changed], removed
+
+    def index_document(self, filename, data):
+        # Indexes a document that was just written, without reading it back
+        try:
+            st = os.stat(os.path.join(self.folder, filename))
+            with self.lock, self.conn:
+                self._store(filename, (st.st_mtime_ns, st.st_size), document_fields(data))
+        except (OSError, sqlite3.Error):
+            pass
+
+    # Bulk imports stage rows in one open transaction and commit it once all
+    # documents are in place. Errors are ignored as in index_document: files
+    # missing from the index are picked up by the next refresh.
+
+    def begin(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN")
+        except sqlite3.Error:
+            pass
+
+    def stage_document(self, filename, stamp, data):
+        with self.lock:
+            try:
+                self._store(filename, stamp, document_fields(data))
+            except sqlite3.Error:
+                pass
+
+    def unstage_document(self, filename):
+        with self.lock:
+            try:
+                self._delete(filename)
+            except sqlite3.Error:
+                pass
+
+    def commit(self):
+        try:
+            self.conn.commit()
+        except sqlite3.Error:
+            self._rollback()
+        finally:
+            self.lock.release()
+
+    def rollback(self):
+        try:
+            self._rollback()
+        finally:
+            self.lock.release()
+
+    def _rollback(self):
+        try:
+            self.conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _delete(self, filename):
+        row = self.conn.execute("SELECT rowid FROM files WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute("DELETE FROM files WHERE rowid = ?", row)
+        if self.searchable:
+            self.conn.execute("DELETE FROM search WHERE rowid = ?", row)
+
+    def _store(self, filename, stamp, fields):
+        self._delete(filename)
+        fields = fields or {"kind": None, "title": None, "project_reference": None,
+                            "version": None, "start": None, "end": None}
+        rowid = self.conn.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, stamp[0], stamp[1], fields["kind"], fields["title"],
+             fields["project_reference"], fields["version"], fields["start"], fields["end"],
+             version_key(fields["version"]))
+        ).lastrowid
+        if not self.searchable or fields["kind"] is None:
+            return
+        if fields["kind"] == "experiment":
+            inherited = self.conn.execute(
+                "SELECT s.usernames, s.association FROM files f JOIN search s ON s.rowid = f.rowid "
+                "WHERE f.filename = ? AND f.kind = 'project'", (fields["project_reference"],)
+            ).fetchone()
+            if inherited:
+                fields = dict(fields, usernames=inherited[0], association=inherited[1])
+        self.conn.execute(
+            "INSERT INTO search (rowid, title, description, usernames, association, paths) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (rowid, fields["title"], fields["description"], fields["usernames"],
+             fields["association"], fields["paths"]))
+        if fields["kind"] == "project":
+            self.conn.execute(
+                "UPDATE search SET usernames = ?, association = ? WHERE rowid IN "
+                "(SELECT rowid FROM files WHERE kind = 'experiment' AND project_reference = ?)",
+                (fields["usernames"], fields["association"], filename))
+
+    def search(self, text="", field=None, kind=None, date_from=None, date_to=None,
+               limit=SEARCH_LIMIT):
+        # Rows of (filename, kind, title, project_reference, version, start, end),
+        # most recently indexed first: unlike ranking by relevance, rowid order
+        # lets FTS5 stop after `limit` hits. Dates are ISO strings; a document
+        # matches a date range when its own start..end range overlaps it.
+        where = []
+        params = []
+        expression = match_expression(text, field)
+        if expression:
+            if not self.searchable:
+                raise RuntimeError("Full-text search needs SQLite with FTS5")
+            source = "search JOIN files f ON f.rowid = search.rowid"
+            where.append("search MATCH ?")
+            params.append(expression)
+            order = "search.rowid DESC"
+        else:
+            source = "files f"
+            where.append("f.kind IS NOT NULL")
+            order = "f.rowid DESC"
+        if kind:
+            where.append("f.kind = ?")
+            params.append(kind)
+        if date_from:
+            where.append("f.end_date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("f.start_date <= ?")
+            params.append(date_to)
+        params.append(limit)
+        with self.lock:
+            return self.conn.execute(
+                "SELECT f.filename, f.kind, f.title, f.project_reference, f.version, "
+                f"f.start_date, f.end_date FROM {source} WHERE {' AND '.join(where)} "
+                f"ORDER BY {order} LIMIT ?", params
+            ).fetchall()
+
+    def filenames(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT filename FROM files")]
+
+    def stamps(self):
+        # (filename, kind, mtime_ns, size) of the projects and experiments
+        with self.lock:
+            return self.conn.execute(
+                "SELECT filename, kind, mtime_ns, size FROM files WHERE kind IS NOT NULL ORDER BY filename"
+            ).fetchall()
+
+    def documents(self):
+        # Project files, then experiment files, by name
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT filename FROM files WHERE kind IS NOT NULL ORDER BY kind DESC, filename")]
+
+    def __contains__(self, filename):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM files WHERE filename = ?", (filename,)
+            ).fetchone() is not None
+
+    def entries(self, filenames):
+        # (filename, kind, title, project_reference, version) for known files
+        with self.lock:
+            rows = []
+            for name in filenames:
+                row = self.conn.execute(
+                    "SELECT filename, kind, title, project_reference, version FROM files "
+                    "WHERE filename = ?", (name,)
+                ).fetchone()
+                if row:
+                    rows.append(row)
+            return rows
+
+    def mtimes(self, filenames):
+        # {filename: mtime_ns} for known files
+        with self.lock:
+            mtimes = {}
+            for name in filenames:
+                row = self.conn.execute("SELECT mtime_ns FROM files WHERE filename = ?", (name,)).fetchone()
+                if row:
+                    mtimes[name] = row[0]
+            return mtimes
+
+    def projects(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT title, filename FROM files WHERE kind = 'project' ORDER BY filename"
+            ).fetchall()
+
+    def experiments(self, project_file):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT title, version, filename FROM files "
+                "WHERE kind = 'experiment' AND project_reference = ? AND filename != ? "
+                "ORDER BY filename",
+                (project_file, project_file)
+            ).fetchall()
+
+    def header(self, filename):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rowid, title, version, start_date, end_date FROM files "
+                "WHERE filename = ? AND kind = 'experiment'", (filename,)
+            ).fetchone()
+            if row is None:
+                return None
+            description = None
+            if self.searchable:
+                found = self.conn.execute("SELECT description FROM search WHERE rowid = ?",
+                                          (row[0],)).fetchone()
+                description = found[0] if found else None
+            if description is None:
+                return None
+            return {"title": row[1], "version": row[2], "description": description,
+                    "dates": {"start": row[3], "end": row[4]}}
+
+    # Experiment history of a project, grouped by title and read in pages.
+    # `order` is one of HISTORY_ORDERS; groups are ordered by their title,
+    # or by their latest date.
+
+    def experiment_groups(self, project_file, order="version", descending=False,
+                          offset=0, limit=HISTORY_PAGE):
+        # (title, count, latest_version, latest_start, latest_end)
+        group_order = {"version": "title", "start": "MAX(start_date)", "end": "MAX(end_date)",
+                       "file": "title"}[order]
+        direction = "DESC" if descending else "ASC"
+        with self.lock:
+            return self.conn.execute(
+                "SELECT title, COUNT(*), MAX(version_key), MAX(start_date), MAX(end_date) FROM files "
+                "WHERE kind = 'experiment' AND project_reference = ? AND filename != ? "
+                f"GROUP BY title ORDER BY {group_order} {direction}, title LIMIT ? OFFSET ?",
+                (project_file, project_file, limit, offset)
+            ).fetchall()
+
+    def experiment_versions(self, project_file, title, order="version", descending=False,
+                            offset=0, limit=HISTORY_PAGE):
+        # (filename, version, start, end) of one experiment title
+        version_order = {"version": "version_key", "start": "start_date", "end": "end_date",
+                         "file": "filename"}[order]
+        direction = "DESC" if descending else "ASC"
+        with self.lock:
+            return self.conn.execute(
+                "SELECT filename, version, start_date, end_date FROM files "
+                "WHERE kind = 'experiment' AND project_reference = ? AND title = ? AND filename != ? "
+                f"ORDER BY {version_order} {direction}, filename {direction} LIMIT ? OFFSET ?",
+                (project_file, title, project_file, limit, offset)
+            ).fetchall()
+
+    def latest_experiment(self, project_file, title):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT filename FROM files "
+                "WHERE kind = 'experiment' AND project_reference = ? AND title = ? AND filename != ? "
+                "ORDER BY version_key DESC, filename DESC LIMIT 1",
+                (project_file, title, project_file)
+            ).fetchone()
+            return row[0] if row else None
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import mmap
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from storage import write_atomic
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Scalar metrics (step, name, value, timestamp) recorded by training jobs,
+# kept next to the experiment file:
+#
+#   Proj_Exp_v1.0.0.json
+#   Proj_Exp_v1.0.0.metrics/manifest.json   metric name -> column file id
+#   Proj_Exp_v1.0.0.metrics/m0.step         int64 steps of the first metric
+#   Proj_Exp_v1.0.0.metrics/m0.value        float64 values
+#   Proj_Exp_v1.0.0.metrics/m0.time         float64 Unix timestamps
+#
+# Columns are little-endian arrays that are only ever appended to, so a
+# series is one contiguous read and a step range is a binary search on the
+# memory-mapped step column. A write interrupted half way leaves columns of
+# different lengths; readers use the shortest and writers truncate to it.
+# A writer holds an exclusive lock on writer.lock for its lifetime, which
+# the OS releases if the process dies.
+# NumPy is optional: with it, reads return arrays backed by the mapped file
+# and downsampling is vectorised.
+
+FORMAT = "metrics-v1"
+MANIFEST = "manifest.json"
+LOCK_FILE = "writer.lock"
+COLUMNS = (("step", 'q'), ("value", 'd'), ("time", 'd'))
+ITEM_SIZE = 8
+SWAP = sys.byteorder != 'little'
+
+
+def metrics_dir(experiment_path):
+    return os.path.splitext(experiment_path)[0] + ".metrics"
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"format": FORMAT, "metrics": {}}
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"Unsupported metrics format: {manifest.get('format')}")
+    return manifest
+
+
+def column_path(directory, file_id, column):
+    return os.path.join(directory, f"{file_id}.{column}")
+
+
+def stored_length(directory, file_id):
+    # Points fully written to all columns
+    lengths = []
+    for column, _ in COLUMNS:
+        try:
+            lengths.append(os.path.getsize(column_path(directory, file_id, column)) // ITEM_SIZE)
+        except FileNotFoundError:
+            return 0
+    return min(lengths)
+
+
+def downsample(steps, values, buckets=1000):
+    # Splits a series into `buckets` runs of (almost) equal length and
+    # returns the first step and the mean, min and max value of each run.
+    # Series of at most `buckets` points come back unchanged.
+    if buckets < 1:
+        raise ValueError("buckets must be at least 1")
+    n = len(values)
+    if np is not None:
+        steps = np.asarray(steps)
+        values = np.asarray(values, dtype=np.float64)
+        if n <= buckets:
+            return {"step": steps.copy(), "mean": values.copy(), "min": values.copy(), "max": values.copy()}
+        edges = np.arange(buckets, dtype=np.int64) * n // buckets
+        counts = np.diff(np.append(edges, n))
+        return {
+            "step": steps[edges],
+            "mean": np.add.reduceat(values, edges) / counts,
+            "min": np.minimum.reduceat(values, edges),
+            "max": np.maximum.reduceat(values, edges),
+        }
+    if n <= buckets:
+        return {"step": list(steps), "mean": list(values), "min": list(values), "max": list(values)}
+    edges = [i * n // buckets for i in range(buckets)] + [n]
+    result = {"step": [], "mean": [], "min": [], "max": []}
+    for start, stop in zip(edges, edges[1:]):
+        chunk = values[start:stop]
+        result["step"].append(steps[start])
+        result["mean"].append(sum(chunk) / (stop - start))
+        result["min"].append(min(chunk))
+        result["max"].append(max(chunk))
+    return result
+
+
+class MetricsWriter:
+    # Appends metrics to one experiment. Points are buffered and written in
+    # batches once `buffer_size` points are pending or `flush_interval`
+    # seconds have passed; `durable` also fsyncs every batch. Only one
+    # writer per experiment at a time: a second one raises RuntimeError.
+    def __init__(self, experiment_path, buffer_size=65536, flush_interval=1.0, durable=False):
+        self.directory = metrics_dir(experiment_path)
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock_file = self._acquire()
+        try:
+            self.manifest = load_manifest(self.directory)
+        except BaseException:
+            self._release()
+            raise
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.durable = durable
+        self.pending = {}
+        self.pending_count = 0
+        self.last_step = {}
+        self.manifest_changed = False
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        for entry in self.manifest["metrics"].values():
+            self._truncate(entry["file"])
+
+    def _acquire(self):
+        f = open(os.path.join(self.directory, LOCK_FILE), 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            raise RuntimeError(f"Metrics of {self.directory} are being written by another writer")
+        return f
+
+    def _release(self):
+        if self.lock_file is not None:
+            # Closing the file drops the lock
+            self.lock_file.close()
+            self.lock_file = None
+
+    def _truncate(self, file_id):
+        self._truncate_to(file_id, stored_length(self.directory, file_id) * ITEM_SIZE)
+
+    def _start(self, name):
+        entry = self.manifest["metrics"].get(name)
+        if entry is None:
+            entry = {"file": f"m{len(self.manifest['metrics'])}", "sorted": True}
+            self.manifest["metrics"][name] = entry
+            self.manifest_changed = True
+        if name not in self.last_step:
+            self.last_step[name] = None
+            length = stored_length(self.directory, entry["file"])
+            if length:
+                with open(column_path(self.directory, entry["file"], "step"), 'rb') as f:
+                    f.seek((length - 1) * ITEM_SIZE)
+                    last = array('q', f.read(ITEM_SIZE))
+                if SWAP:
+                    last.byteswap()
+                self.last_step[name] = last[0]
+        columns = tuple(array(code) for _, code in COLUMNS)
+        self.pending[name] = columns
+        return columns
+
+    def log(self, name, value, step=None, timestamp=None):
+        # `step` defaults to one past the metric's last step
+        with self.lock:
+            columns = self.pending.get(name)
+            if columns is None:
+                columns = self._start(name)
+            last = self.last_step[name]
+            if step is None:
+                step = 0 if last is None else last + 1
+            elif last is not None and step < last and self.manifest["metrics"][name]["sorted"]:
+                self.manifest["metrics"][name]["sorted"] = False
+                self.manifest_changed = True
+            self.last_step[name] = step
+            columns[0].append(step)
+            columns[1].append(value)
+            columns[2].append(time.time() if timestamp is None else timestamp)
+            self.pending_count += 1
+            if (self.pending_count >= self.buffer_size or
+                    time.monotonic() - self.last_flush >= self.flush_interval):
+                self._flush()
+
+    def log_many(self, metrics, step=None, timestamp=None):
+        # Several metrics of one step, e.g. {"loss": 0.3, "accuracy": 0.9}
+        if timestamp is None:
+            timestamp = time.time()
+        for name, value in metrics.items():
+            self.log(name, value, step, timestamp)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        # The manifest goes first, so readers never see columns without a name
+        if self.manifest_changed:
+            write_atomic(os.path.join(self.directory, MANIFEST), json.dumps(self.manifest).encode('utf-8'))
+            self.manifest_changed = False
+        pending = list(self.pending.items())
+        self.pending = {}
+        self.pending_count = 0
+        self.last_flush = time.monotonic()
+        for done, (name, columns) in enumerate(pending):
+            file_id = self.manifest["metrics"][name]["file"]
+            length = stored_length(self.directory, file_id) * ITEM_SIZE
+            try:
+                for (column, code), values in zip(COLUMNS, columns):
+                    if SWAP:
+                        values = array(code, values)
+                        values.byteswap()
+                    with open(column_path(self.directory, file_id, column), 'ab') as f:
+                        values.tofile(f)
+                        if self.durable:
+                            f.flush()
+                            os.fsync(f.fileno())
+            except BaseException:
+                # Cut the metric back to where it was and keep it and the
+                # unwritten ones pending, so a retry appends nothing twice
+                self._truncate_to(file_id, length)
+                for name, columns in pending[done:]:
+                    self.pending[name] = columns
+                    self.pending_count += len(columns[0])
+                raise
+
+    def _truncate_to(self, file_id, length):
+        for column, _ in COLUMNS:
+            path = column_path(self.directory, file_id, column)
+            try:
+                if os.path.getsize(path) > length:
+                    os.truncate(path, length)
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class MetricsLog:
+    # Read access to the metrics of one experiment; sees what a writer has
+    # flushed up to the moment a series is read
+    def __init__(self, experiment_path):
+        self.directory = metrics_dir(experiment_path)
+        self.manifest = load_manifest(self.directory)
+
+    def names(self):
+        return sorted(self.manifest["metrics"])
+
+    def count(self, name):
+        return stored_length(self.directory, self._entry(name)["file"])
+
+    def _entry(self, name):
+        try:
+            return self.manifest["metrics"][name]
+        except KeyError:
+            raise KeyError(f"Unknown metric: {name}")
+
+    def _map(self, file_id, length):
+        maps = []
+        for column, _ in COLUMNS:
+            with open(column_path(self.directory, file_id, column), 'rb') as f:
+                maps.append(mmap.mmap(f.fileno(), length * ITEM_SIZE, access=mmap.ACCESS_READ))
+        return maps
+
+    def read(self, name, start=None, stop=None):
+        # Points with start <= step < stop, as {"step", "value", "time"}
+        # columns: NumPy arrays if available, else array.array
+        entry = self._entry(name)
+        length = stored_length(self.directory, entry["file"])
+        if length == 0:
+            return self._columns([b""] * len(COLUMNS))
+        maps = self._map(entry["file"], length)
+        if start is None and stop is None:
+            return self._columns(maps)
+        if not entry["sorted"]:
+            return self._filter(self._columns(maps), start, stop)
+        if np is not None:
+            steps = np.frombuffer(maps[0], dtype='<i8')
+            lo = 0 if start is None else int(np.searchsorted(steps, start))
+            hi = length if stop is None else int(np.searchsorted(steps, stop))
+        else:
+            steps = memoryview(maps[0]).cast('q') if not SWAP else self._columns(maps[:1])["step"]
+            lo = 0 if start is None else bisect_left(steps, start)
+            hi = length if stop is None else bisect_left(steps, stop)
+        return self._columns([memoryview(m)[lo * ITEM_SIZE:hi * ITEM_SIZE] for m in maps])
+
+    def _columns(self, buffers):
+        result = {}
+        for (column, code), buffer in zip(COLUMNS, buffers):
+            if np is not None:
+                result[column] = np.frombuffer(buffer, dtype='<i8' if code == 'q' else '<f8')
+            else:
+                values = array(code)
+                values.frombytes(buffer)
+                if SWAP:
+                    values.byteswap()
+                result[column] = values
+        return result
+
+    def _filter(self, columns, start, stop):
+        # Steps went backwards at some point (e.g. a resumed run), so the
+        # range has to be found by a scan
+        steps = columns["step"]
+        if np is not None:
+            mask = np.ones(len(steps), dtype=bool)
+            if start is not None:
+                mask &= steps >= start
+            if stop is not None:
+                mask &= steps < stop
+            return {column: values[mask] for column, values in columns.items()}
+        keep = [i for i, step in enumerate(steps)
+                if (start is None or step >= start) and (stop is None or step < stop)]
+        return {column: array(code, [columns[column][i] for i in keep]) for column, code in COLUMNS}
+
+    def downsample(self, name, buckets=1000, start=None, stop=None):
+        data = self.read(name, start, stop)
+        return downsample(data["step"], data["value"], buckets)
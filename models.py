@@ -0,0 +1,395 @@
+import os
+from PyQt5.QtCore import QAbstractListModel, QAbstractItemModel, QModelIndex, Qt
+from path_store import PathStore
+from metadata_index import HISTORY_ORDERS, HISTORY_PAGE
+from instrumentation import recorder
+
+
+class PathListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = PathStore()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        return self.store[index.row()]
+
+    def __contains__(self, path):
+        return path in self.store
+
+    def paths(self):
+        return iter(self.store)
+
+    def add_paths(self, paths):
+        with recorder.span("list_populate") as span:
+            new_paths = [p for p in dict.fromkeys(paths) if p not in self.store]
+            span.count = len(new_paths)
+            if not new_paths:
+                return 0
+            first = len(self.store)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_paths) - 1)
+            self.store.extend(new_paths)
+            self.endInsertRows()
+            return len(new_paths)
+
+    def remove_if(self, predicate):
+        self.beginResetModel()
+        removed = self.store.filter(lambda path: not predicate(path))
+        self.endResetModel()
+        return removed
+
+    def remove_prefixes(self, prefixes):
+        self.beginResetModel()
+        removed = self.store.remove_prefixes(prefixes)
+        self.endResetModel()
+        return removed
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.endResetModel()
+
+
+def count_leaves(hierarchy):
+    # Leaf counts for every folder dict of a build_hierarchy() tree, keyed by
+    # id(), computed with one iterative post-order walk
+    counts = {}
+    stack = [(hierarchy, False)]
+    while stack:
+        folder, visited = stack.pop()
+        if visited:
+            counts[id(folder)] = sum(counts[id(v)] if isinstance(v, dict) else 1
+                                     for v in folder.values())
+            continue
+        stack.append((folder, True))
+        stack.extend((v, False) for v in folder.values() if isinstance(v, dict))
+    return counts
+
+
+class HierarchyNode:
+    __slots__ = ('name', 'path', 'value', 'parent', 'row', 'children', 'leaves', 'checked')
+
+    def __init__(self, name, path, value, parent, row, leaves, checked):
+        self.name = name
+        self.path = path
+        self.value = value
+        self.parent = parent
+        self.row = row
+        self.children = None
+        self.leaves = leaves
+        self.checked = checked
+
+    def is_folder(self):
+        return isinstance(self.value, dict)
+
+
+class RemoveTreeModel(QAbstractItemModel):
+    # Checkable view over a build_hierarchy() tree. Child nodes are only
+    # created when their parent is expanded, and each node tracks how many of
+    # its leaves are checked, so tristate changes touch the ancestors and the
+    # already expanded descendants only.
+    def __init__(self, hierarchy, parent=None):
+        super().__init__(parent)
+        self.leaf_counts = count_leaves(hierarchy)
+        self.root = HierarchyNode("", "", hierarchy, None, 0, self.leaf_counts[id(hierarchy)], 0)
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if node.children is None or not 0 <= row < len(node.children) or column != 0:
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return len(node.children) if node.children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return "Select files/folders to remove"
+        return None
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return node.is_folder() and bool(node.value)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node.is_folder() and node.children is None and bool(node.value)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if not self.canFetchMore(parent):
+            return
+        children = []
+        full = node.checked == node.leaves
+        for row, (name, value) in enumerate(node.value.items()):
+            if isinstance(value, dict):
+                leaves = self.leaf_counts[id(value)]
+                path = f"{node.path}{os.sep}{name}" if node is not self.root else name
+            else:
+                leaves = 1
+                path = value
+            children.append(HierarchyNode(name, path, value, node, row, leaves,
+                                          leaves if full else 0))
+        self.beginInsertRows(parent, 0, len(children) - 1)
+        node.children = children
+        self.endInsertRows()
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.name or os.sep
+        if role == Qt.ToolTipRole:
+            return node.path
+        if role == Qt.CheckStateRole:
+            if node.checked == 0:
+                return Qt.Unchecked
+            if node.checked == node.leaves:
+                return Qt.Checked
+            return Qt.PartiallyChecked
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        node = index.internalPointer()
+        target = node.leaves if value == Qt.Checked else 0
+        delta = target - node.checked
+        if not delta:
+            return False
+        node.checked = target
+        self._set_descendants(node, index)
+        ancestor, ancestor_index = node.parent, index.parent()
+        while ancestor is not None:
+            ancestor.checked += delta
+            if ancestor is not self.root:
+                self.dataChanged.emit(ancestor_index, ancestor_index, [Qt.CheckStateRole])
+            ancestor, ancestor_index = ancestor.parent, ancestor_index.parent()
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def _set_descendants(self, node, index):
+        # Only nodes that have already been created need updating; children
+        # created later inherit the state of their parent in fetchMore()
+        stack = [(node, index)]
+        while stack:
+            current, current_index = stack.pop()
+            if not current.children:
+                continue
+            full = current.checked == current.leaves
+            for child in current.children:
+                child.checked = child.leaves if full else 0
+                stack.append((child, self.index(child.row, 0, current_index)))
+            self.dataChanged.emit(self.index(0, 0, current_index),
+                                  self.index(len(current.children) - 1, 0, current_index),
+                                  [Qt.CheckStateRole])
+
+    def selected_paths(self):
+        # Fully checked nodes are reported once, without their descendants
+        paths = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.checked == 0:
+                continue
+            if node.checked == node.leaves and node is not self.root:
+                paths.append(node.path)
+            elif node.children:
+                stack.extend(node.children)
+        return paths
+
+
+class HistoryGroup:
+    __slots__ = ('title', 'count', 'version', 'start', 'end', 'row', 'versions')
+
+    def __init__(self, title, count, version, start, end, row):
+        self.title = title
+        self.count = count
+        self.version = version
+        self.start = start
+        self.end = end
+        self.row = row
+        self.versions = []
+
+
+class ExperimentHistoryModel(QAbstractItemModel):
+    # Experiments of one project grouped by title, read from the metadata
+    # index a page at a time as the view scrolls or a group is expanded.
+    # Group rows have no internal pointer; version rows point at their group.
+    COLUMNS = ["Experiment", "Start", "End", "File"]
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.metadata = index
+        self.project_file = None
+        self.groups = []
+        self.exhausted = True
+        self.order = HISTORY_ORDERS[0]
+        self.descending = False
+
+    def set_index(self, index):
+        self.metadata = index
+        self.set_project(None)
+
+    def set_project(self, project_file):
+        self.beginResetModel()
+        self.project_file = project_file
+        self.groups = []
+        self.exhausted = project_file is None or self.metadata is None
+        self.endResetModel()
+
+    def reload(self):
+        self.set_project(self.project_file)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not 0 <= column < len(self.COLUMNS):
+            return QModelIndex()
+        if not parent.isValid():
+            if 0 <= row < len(self.groups):
+                return self.createIndex(row, column)
+            return QModelIndex()
+        if parent.internalPointer() is not None:
+            return QModelIndex()
+        group = self.groups[parent.row()]
+        if 0 <= row < len(group.versions):
+            return self.createIndex(row, column, group)
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or index.internalPointer() is None:
+            return QModelIndex()
+        return self.createIndex(index.internalPointer().row, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.groups)
+        if parent.internalPointer() is None and parent.column() == 0:
+            return len(self.groups[parent.row()].versions)
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self.groups) or not self.exhausted
+        return parent.internalPointer() is None and parent.column() == 0
+
+    def canFetchMore(self, parent):
+        if not parent.isValid():
+            return not self.exhausted
+        if parent.internalPointer() is not None:
+            return False
+        group = self.groups[parent.row()]
+        return len(group.versions) < group.count
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        if not parent.isValid():
+            rows = self.metadata.experiment_groups(self.project_file, self.order, self.descending,
+                                                   len(self.groups))
+            if len(rows) < HISTORY_PAGE:
+                self.exhausted = True
+            if not rows:
+                return
+            first = len(self.groups)
+            self.beginInsertRows(parent, first, first + len(rows) - 1)
+            self.groups.extend(HistoryGroup(*row, first + i) for i, row in enumerate(rows))
+            self.endInsertRows()
+            return
+        group = self.groups[parent.row()]
+        rows = self.metadata.experiment_versions(self.project_file, group.title, self.order,
+                                                 self.descending, len(group.versions))
+        if not rows:
+            # The index changed under us; stop asking for more
+            group.count = len(group.versions)
+            return
+        first = len(group.versions)
+        self.beginInsertRows(parent, first, first + len(rows) - 1)
+        group.versions.extend(rows)
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        group = index.internalPointer()
+        column = index.column()
+        if group is None:
+            group = self.groups[index.row()]
+            if column == 0:
+                return f"{group.title} ({group.count})"
+            return [None, group.start, group.end, None][column]
+        filename, version, start, end = group.versions[index.row()]
+        return [f"v{version}", start, end, filename][column]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.order = HISTORY_ORDERS[column]
+        self.descending = order == Qt.DescendingOrder
+        self.reload()
+
+    def filename(self, index):
+        # The experiment file of a version row; a group row stands for its
+        # latest version
+        if not index.isValid():
+            return None
+        group = index.internalPointer()
+        if group is None:
+            return self.metadata.latest_experiment(self.project_file, self.groups[index.row()].title)
+        return group.versions[index.row()][0]
+
+    def title_index(self, title):
+        # Fetches group pages until the title's row is loaded
+        while True:
+            for group in self.groups:
+                if group.title == title:
+                    return self.createIndex(group.row, 0)
+            if self.exhausted:
+                return QModelIndex()
+            self.fetchMore(QModelIndex())
+
+    def find(self, title, filename):
+        # Index of an experiment file, loading the pages needed to reach it
+        parent = self.title_index(title)
+        if not parent.isValid():
+            return QModelIndex()
+        group = self.groups[parent.row()]
+        while True:
+            for row, version in enumerate(group.versions):
+                if version[0] == filename:
+                    return self.createIndex(row, 0, group)
+            if not self.canFetchMore(parent):
+                return QModelIndex()
+            self.fetchMore(parent)
@@ -0,0 +1,148 @@
+import os
+from array import array
+
+TERMINAL = None
+
+
+def split_path(path):
+    # Splits into (directory including its trailing separator, name) so that
+    # directory + name always reconstructs the original path
+    i = path.rfind(os.sep) + 1
+    return path[:i], path[i:]
+
+
+class PathTrie:
+    # Prefix trie over path components. A path is covered when it equals one
+    # of the added paths or lies underneath one of them.
+    def __init__(self, paths=()):
+        self.root = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        node = self.root
+        for part in path.split(os.sep):
+            if TERMINAL in node:
+                return
+            node = node.setdefault(part, {})
+        node.clear()
+        node[TERMINAL] = True
+
+    def lookup(self, directory):
+        # `directory` carries its trailing separator, as stored by PathStore.
+        # Returns True if the directory itself is covered, otherwise the trie
+        # node for it (None when nothing underneath it was added).
+        node = self.root
+        if TERMINAL in node:
+            return True
+        if not directory:
+            return node
+        for part in directory[:-1].split(os.sep):
+            node = node.get(part)
+            if node is None:
+                return None
+            if TERMINAL in node:
+                return True
+        return node
+
+    def __contains__(self, path):
+        directory, name = split_path(path)
+        node = self.lookup(directory)
+        if node is True:
+            return True
+        child = node.get(name) if node else None
+        return child is not None and TERMINAL in child
+
+
+class PathStore:
+    # Ordered, de-duplicated collection of paths. Each row stores an interned
+    # directory id plus the file name, so shared directory prefixes are kept
+    # once no matter how many files they hold. Membership is answered from
+    # per-directory name sets that are kept up to date on every change.
+    def __init__(self, paths=()):
+        self.clear()
+        self.extend(paths)
+
+    def clear(self):
+        self.dirs = []
+        self.dir_ids = {}
+        self.dir_of = array('i')
+        self.names = []
+        self.members = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, row):
+        return self.dirs[self.dir_of[row]] + self.names[row]
+
+    def __iter__(self):
+        dirs = self.dirs
+        for dir_id, name in zip(self.dir_of, self.names):
+            yield dirs[dir_id] + name
+
+    def __contains__(self, path):
+        directory, name = split_path(path)
+        dir_id = self.dir_ids.get(directory)
+        return dir_id is not None and name in self.members[dir_id]
+
+    def _dir_id(self, directory):
+        dir_id = self.dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(directory)
+            self.dir_ids[directory] = dir_id
+            self.members[dir_id] = set()
+        return dir_id
+
+    def add(self, path):
+        directory, name = split_path(path)
+        dir_id = self._dir_id(directory)
+        names = self.members[dir_id]
+        if name in names:
+            return False
+        names.add(name)
+        self.dir_of.append(dir_id)
+        self.names.append(name)
+        return True
+
+    def extend(self, paths):
+        before = len(self.names)
+        for path in paths:
+            self.add(path)
+        return len(self.names) - before
+
+    def _retain(self, keep):
+        # Single pass that keeps the rows for which keep(dir_id, name) is true
+        old_dirs, old_dir_of, old_names = self.dirs, self.dir_of, self.names
+        self.clear()
+        for dir_id, name in zip(old_dir_of, old_names):
+            if keep(dir_id, name):
+                new_id = self._dir_id(old_dirs[dir_id])
+                self.members[new_id].add(name)
+                self.dir_of.append(new_id)
+                self.names.append(name)
+        return len(old_names) - len(self.names)
+
+    def filter(self, keep):
+        dirs = self.dirs
+        return self._retain(lambda dir_id, name: keep(dirs[dir_id] + name))
+
+    def remove_prefixes(self, prefixes):
+        # Removes every path equal to or underneath one of `prefixes`. Each
+        # interned directory is resolved against the trie once, so the cost
+        # is linear in the number of rows regardless of how many prefixes
+        # are given.
+        trie = PathTrie(prefixes)
+        dir_nodes = [trie.lookup(directory) for directory in self.dirs]
+
+        def keep(dir_id, name):
+            node = dir_nodes[dir_id]
+            if node is None:
+                return True
+            if node is True:
+                return False
+            child = node.get(name)
+            return child is None or TERMINAL not in child
+
+        return self._retain(keep)
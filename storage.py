@@ -0,0 +1,97 @@
+import os
+import gzip
+import json
+from instrumentation import recorder
+
+FORMAT_INDENTED = "indented"
+FORMAT_COMPACT = "compact"
+FORMAT_GZIP = "gzip"
+# Compact JSON / gzip with the file tree stored as a file_table
+FORMAT_TABLE = "table"
+FORMAT_TABLE_GZIP = "table-gzip"
+FORMATS = [FORMAT_INDENTED, FORMAT_COMPACT, FORMAT_GZIP, FORMAT_TABLE, FORMAT_TABLE_GZIP]
+TABLE_FORMATS = [FORMAT_TABLE, FORMAT_TABLE_GZIP]
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def encode_document(data, fmt=FORMAT_INDENTED):
+    with recorder.span("json_dump") as span:
+        raw = _encode(data, fmt)
+        span.bytes = len(raw)
+    return raw
+
+
+def _encode(data, fmt):
+    if fmt == FORMAT_INDENTED:
+        return json.dumps(data, indent=4).encode('utf-8')
+    encoded = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if fmt in (FORMAT_GZIP, FORMAT_TABLE_GZIP):
+        # mtime=0 keeps identical documents byte-identical
+        return gzip.compress(encoded, compresslevel=6, mtime=0)
+    return encoded
+
+
+def decode_document(raw):
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
+
+def read_document(path):
+    # Reads any of the supported formats; the file name is always *.json
+    with recorder.span("json_load") as span:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        span.bytes = len(raw)
+        return decode_document(raw)
+
+
+def temp_path(path):
+    # Hidden, unique name next to path, for files that are renamed into place
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.urandom(4).hex()}.tmp")
+
+
+def open_temp(tmp_path):
+    # os.open honours the umask like a plain open(), unlike mkstemp's 0600
+    return os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+
+
+def write_temp(path, raw, durable=True):
+    # Writes raw to a new temporary file next to path and returns its name;
+    # the caller renames it into place or removes it
+    tmp_path = temp_path(path)
+    fd = open_temp(tmp_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return tmp_path
+
+
+def write_atomic(path, raw):
+    # Write to a temporary file in the same directory and rename it into
+    # place, so readers never observe a partially written document
+    tmp_path = temp_path(path)
+    fd = open_temp(tmp_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
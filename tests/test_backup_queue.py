@@ -0,0 +1,87 @@
+import os
+import time
+from backup_queue import BackupQueue, LEASE_SECONDS, MAX_BACKOFF
+from backup_store import BackupStore
+
+
+def manual_queue(path, **options):
+    # Batches are claimed and replicated by the test instead of the worker
+    queue = BackupQueue(path, **options)
+    queue.start = lambda: None
+    return queue
+
+
+def document(title):
+    return {"project": {"title": title}}
+
+
+def test_failed_backups_back_off_and_retry(tmp_path):
+    tracking_dir = str(tmp_path / "tracking")
+    with open(tracking_dir, "w") as f:
+        f.write("not a folder")
+    reports = []
+    queue = manual_queue(str(tmp_path / "queue.sqlite"), on_error=reports.append)
+    queue.put(tracking_dir, "Projects", "Alpha.json", document("Alpha"))
+
+    delays = []
+    for attempt in range(3):
+        batch = queue._claim()
+        assert len(batch) == 1
+        start = time.time()
+        queue._replicate(batch)
+        # Not handed out again before its backoff
+        assert queue._claim() == []
+        next_attempt, lease = queue.conn.execute("SELECT next_attempt, lease FROM queue").fetchone()
+        assert lease == 0
+        delays.append(next_attempt - start)
+        queue.conn.execute("UPDATE queue SET next_attempt = 0")
+        queue.conn.commit()
+    assert [round(delay) for delay in delays] == [1, 2, 4]
+    assert len(reports) == 1
+    assert queue.errors()[0][:4] == (tracking_dir, "Projects", "Alpha.json", 3)
+
+    queue.conn.execute("UPDATE queue SET attempts = 30")
+    queue.conn.commit()
+    start = time.time()
+    queue._replicate(queue._claim())
+    next_attempt = queue.conn.execute("SELECT next_attempt FROM queue").fetchone()[0]
+    assert next_attempt - start <= MAX_BACKOFF + 1
+
+    os.remove(tracking_dir)
+    os.makedirs(tracking_dir)
+    queue.conn.execute("UPDATE queue SET next_attempt = 0")
+    queue.conn.commit()
+    queue._replicate(queue._claim())
+    assert queue.stats()["depth"] == 0
+    assert BackupStore(tracking_dir).get("Projects", "Alpha.json") == document("Alpha")
+    queue.close()
+
+
+def test_expired_leases_are_claimed_by_another_process(tmp_path):
+    tracking_dir = str(tmp_path / "tracking")
+    os.makedirs(tracking_dir)
+    path = str(tmp_path / "queue.sqlite")
+    crashed = manual_queue(path)
+    crashed.put(tracking_dir, "Projects", "Alpha.json", document("Alpha v1"))
+    crashed.put(tracking_dir, "Projects", "Beta.json", document("Beta"))
+    leased = crashed._claim()
+    assert len(leased) == 2
+    # A newer copy of a leased file waits for the leased one
+    crashed.put(tracking_dir, "Projects", "Alpha.json", document("Alpha v2"))
+
+    other = manual_queue(path)
+    assert other._claim() == []
+    lease = other.conn.execute("SELECT MAX(lease) FROM queue").fetchone()[0]
+    assert lease - time.time() <= LEASE_SECONDS
+
+    # The first process died without writing anything; its leases run out
+    other.conn.execute("UPDATE queue SET lease = ? WHERE lease > 0", (time.time() - 1,))
+    other.conn.commit()
+    batch = other._claim()
+    assert sorted((row[3], row[0]) for row in batch) == sorted((row[3], row[0]) for row in leased)
+    other._replicate(batch)
+    other._replicate(other._claim())
+    assert other.stats()["depth"] == 0
+    assert BackupStore(tracking_dir).get("Projects", "Alpha.json") == document("Alpha v2")
+    crashed.close()
+    other.close()
@@ -0,0 +1,106 @@
+import os
+import json
+from backup_store import BackupStore, GROUPS, REF, document_checksum
+from tracker_core import experiment_document, file_tree
+from storage import FORMAT_TABLE
+
+
+def table_experiment(paths, version):
+    return experiment_document("Proj.json", "exp", *file_tree(paths, FORMAT_TABLE), version=version,
+                               start="2024-01-01", end="2024-01-01")
+
+
+def group_refs(store, filename):
+    with open(os.path.join(store.manifests_dir, "Experiments", filename), 'r') as f:
+        root = store.get_object(json.load(f)["root"])
+    return {payload[REF] for _, payload in root["experiment"]["file_table"][GROUPS]
+            if isinstance(payload, dict)}
+
+
+def object_count(store):
+    return sum(len(files) for _, _, files in os.walk(store.objects_dir))
+
+
+def test_table_resave_only_writes_changed_directory(tmp_path):
+    store = BackupStore(str(tmp_path))
+    paths = [f"data/run{d:02d}/sample_{d:02d}_{f:04d}.csv" for d in range(10) for f in range(200)]
+    first = table_experiment(paths, "1.0.0")
+    store.put("Experiments", "v1.json", first)
+    objects = object_count(store)
+
+    paths[5 * 200 + 7] = "data/run05/renamed.csv"
+    second = table_experiment(paths, "1.0.1")
+    store.put("Experiments", "v2.json", second)
+
+    old, new = group_refs(store, "v1.json"), group_refs(store, "v2.json")
+    assert len(old) == 10
+    assert len(new - old) == 1
+    # The changed directory plus the new root document
+    assert object_count(store) == objects + 2
+    assert document_checksum(store.get("Experiments", "v2.json")) == document_checksum(second)
+    assert document_checksum(store.get("Experiments", "v1.json")) == document_checksum(first)
+
+
+def test_fingerprints_restore_in_order(tmp_path):
+    store = BackupStore(str(tmp_path))
+    fingerprints = {f"{d}/f{f}.bin": {"size": f, "mtime": 1.0, "hash": f"blake2b:{d}{f}"}
+                    for d in ("b", "a", "b/c") for f in range(100)}
+    fingerprints["a/last.bin"] = {"size": 0, "mtime": 0.0, "hash": "blake2b:0"}
+    data = experiment_document("Proj.json", "exp", *file_tree(list(fingerprints)), version="1.0.0",
+                               fingerprints=fingerprints)
+    store.put("Experiments", "v1.json", data)
+    restored = store.get("Experiments", "v1.json")
+    assert list(restored["experiment"]["file_fingerprints"]) == list(fingerprints)
+    assert document_checksum(restored) == document_checksum(data)
+    assert store.gc() == (0, 0)
+
+
+def age(path, seconds=2 * 3600):
+    past = os.stat(path).st_mtime - seconds
+    os.utime(path, (past, past))
+
+
+def run_gc_during_save(store, data):
+    # gc computes its live set, then a save reusing unreferenced objects
+    # finishes before gc starts deleting
+    reachable = store.reachable
+
+    def reachable_then_save():
+        live = reachable()
+        store.put("Experiments", "v2.json", data)
+        return live
+
+    store.reachable = reachable_then_save
+    try:
+        store.gc()
+    finally:
+        store.reachable = reachable
+
+
+def old_experiment(store):
+    paths = [f"data/run{d:02d}/sample_{d:02d}_{f:04d}.csv" for d in range(5) for f in range(200)]
+    data = experiment_document("Proj.json", "exp", *file_tree(paths), version="1.0.0",
+                               start="2024-01-01", end="2024-01-01")
+    store.put("Experiments", "v1.json", data)
+    os.remove(os.path.join(store.manifests_dir, "Experiments", "v1.json"))
+    return data
+
+
+def test_gc_keeps_loose_objects_reused_by_a_save(tmp_path):
+    store = BackupStore(str(tmp_path))
+    data = old_experiment(store)
+    for _, path in store._loose_objects():
+        age(path)
+    run_gc_during_save(store, data)
+    assert document_checksum(store.get("Experiments", "v2.json")) == document_checksum(data)
+
+
+def test_gc_keeps_packed_objects_reused_by_a_save(tmp_path):
+    store = BackupStore(str(tmp_path))
+    data = old_experiment(store)
+    store.pack()
+    for name in os.listdir(store.packs_dir):
+        age(os.path.join(store.packs_dir, name))
+    run_gc_during_save(store, data)
+    store = BackupStore(str(tmp_path))
+    assert document_checksum(store.get("Experiments", "v2.json")) == document_checksum(data)
@@ -0,0 +1,96 @@
+import json
+import os
+import pytest
+from catalogue import export_catalogue, import_catalogue
+from tracker_core import ProjectFolder
+
+
+def make_source(base):
+    os.makedirs(base)
+    folder = ProjectFolder(base, backup=lambda *args: None)
+    project = folder.create_project("Alpha", description="First", usernames=["ana", "bo"],
+                                    association="Lab", start="2024-01-01", end="2024-06-30")
+    for i in range(3):
+        folder.save_experiment(project, "Run", [os.path.join("data", f"part{i}", "x.csv"), "notes.txt"],
+                               description=f"take {i}", start="2024-02-01", end="2024-02-02",
+                               fingerprints={"notes.txt": {"size": i, "mtime": 1.5, "hash": "ab"}})
+    other = folder.create_project("Beta")
+    folder.save_experiment(other, "Empty")
+    return folder
+
+
+def records(path):
+    with open(path) as f:
+        return sorted((json.loads(line) for line in f), key=lambda record: record["file"])
+
+
+def json_files(base):
+    return sorted(name for name in os.listdir(base) if not name.startswith("."))
+
+
+@pytest.mark.parametrize("name", ["catalogue.jsonl", "catalogue.jsonl.gz"])
+def test_export_import_round_trip(tmp_path, name):
+    source = make_source(str(tmp_path / "source"))
+    path = str(tmp_path / name)
+    count, failed = export_catalogue(source, path, jobs=1)
+    assert (count, failed) == (6, [])
+
+    os.makedirs(tmp_path / "target")
+    target = ProjectFolder(str(tmp_path / "target"), backup=lambda *args: None)
+    imported, skipped = import_catalogue(target, path, durable=False)
+    assert sorted(imported) == sorted(source.documents()) and skipped == []
+    assert json_files(tmp_path / "target") == sorted(source.documents())
+    assert sorted(target.documents()) == sorted(source.documents())
+
+    # A second import skips everything
+    imported_again, skipped = import_catalogue(target, path, durable=False)
+    assert imported_again == [] and sorted(skipped) == sorted(imported)
+
+    if name.endswith(".jsonl"):
+        again = str(tmp_path / "again.jsonl")
+        export_catalogue(target, again, jobs=1)
+        assert records(again) == records(path)
+    source.close()
+    target.close()
+
+
+def test_failed_import_leaves_the_folder_as_it_was(tmp_path, monkeypatch):
+    source = make_source(str(tmp_path / "source"))
+    path = str(tmp_path / "catalogue.jsonl")
+    export_catalogue(source, path, jobs=1)
+    os.makedirs(tmp_path / "target")
+    target = ProjectFolder(str(tmp_path / "target"), backup=lambda *args: None)
+    target.create_project("Existing")
+
+    place = ProjectFolder._place
+    placed = []
+
+    def failing_place(self, filename, tmp_path):
+        if len(placed) == 3:
+            raise OSError("disk full")
+        placed.append(filename)
+        return place(self, filename, tmp_path)
+
+    monkeypatch.setattr(ProjectFolder, "_place", failing_place)
+    with pytest.raises(OSError):
+        import_catalogue(target, path, durable=False, workers=1)
+    assert json_files(tmp_path / "target") == ["Existing.json"]
+    assert target.documents() == ["Existing.json"]
+    # The index is usable again
+    target.refresh()
+    assert [title for title, f in target.projects()] == ["Existing"]
+    source.close()
+    target.close()
+
+
+def test_invalid_record_rolls_back(tmp_path):
+    path = str(tmp_path / "catalogue.jsonl")
+    with open(path, "w") as f:
+        f.write(json.dumps({"file": "Alpha.json", "kind": "project", "title": "Alpha"}) + "\n")
+        f.write(json.dumps({"file": "Alpha_Run_v1.0.0.json", "kind": "experiment", "title": "Run"}) + "\n")
+    target = ProjectFolder(str(tmp_path), backup=lambda *args: None)
+    with pytest.raises(ValueError):
+        import_catalogue(target, path, durable=False)
+    assert json_files(tmp_path) == ["catalogue.jsonl"]
+    assert target.documents() == []
+    target.close()
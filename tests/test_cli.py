@@ -0,0 +1,20 @@
+import os
+import cli
+from tracker_core import ProjectFolder
+
+
+def test_next_version_without_index_refresh(tmp_path, capsys):
+    base = str(tmp_path)
+    folder = ProjectFolder(base, backup=lambda *args: None)
+    project = folder.create_project("Alpha")
+    folder.save_experiment(project, "Run")
+    folder.close()
+    # A version saved by another tool that never touched the index
+    with open(os.path.join(base, "Alpha_Run_v1.0.1.json"), "w") as f:
+        f.write("{}")
+
+    for name in (project, "Alpha"):
+        assert cli.main(["--no-backup", "next-version", base, "--project", name, "--title", "Run"]) == 0
+        assert capsys.readouterr().out == "1.0.2\n"
+    assert cli.main(["--no-backup", "next-version", base, "--project", "Beta", "--title", "Run"]) == 1
+    assert "Unknown project: Beta" in capsys.readouterr().err
@@ -0,0 +1,22 @@
+from experiment_diff import match_moves
+
+
+def test_name_pairs_need_agreeing_fingerprints():
+    removed = ["a/data.csv", "a/notes.txt", "a/model.bin", "a/log.txt"]
+    added = ["b/data.csv", "b/notes.txt", "b/model.bin", "b/log.txt"]
+    old = {"a/data.csv": {"size": 10, "mtime": 1.0}, "a/model.bin": {"size": 5, "hash": "x"},
+           "a/log.txt": {"size": 3, "mtime": 1.0}}
+    new = {"b/data.csv": {"size": 10, "mtime": 2.0}, "b/model.bin": {"size": 5, "hash": "y"},
+           "b/log.txt": {"size": 4, "mtime": 2.0}}
+    added, removed, moved, possibly_moved = match_moves(added, removed, old, new)
+    assert moved == [("a/data.csv", "b/data.csv")]
+    assert possibly_moved == [("a/notes.txt", "b/notes.txt")]
+    assert sorted(added) == ["b/log.txt", "b/model.bin"]
+    assert sorted(removed) == ["a/log.txt", "a/model.bin"]
+
+
+def test_matching_hashes_are_moved():
+    fingerprint = {"size": 1, "hash": "h"}
+    added, removed, moved, possibly_moved = match_moves(
+        ["new/x.txt"], ["old/y.txt"], {"old/y.txt": fingerprint}, {"new/x.txt": fingerprint})
+    assert (added, removed, moved, possibly_moved) == ([], [], [("old/y.txt", "new/x.txt")], [])
@@ -0,0 +1,40 @@
+import os
+from file_table import encode_paths, decode_paths, iter_experiment_paths, table_hierarchy, iter_hierarchy_paths
+from storage import FORMAT_TABLE, FORMAT_TABLE_GZIP
+from tracker_core import ProjectFolder
+
+
+def round_trip(paths):
+    return list(iter_experiment_paths({"file_table": encode_paths(paths)}))
+
+
+def test_empty_list():
+    table = encode_paths([])
+    assert round_trip([]) == []
+    assert decode_paths(table) == []
+    assert table_hierarchy(table) == {}
+
+
+def test_flat_and_deep_paths():
+    deep = os.path.join(*[f"level{i}" for i in range(40)], "leaf.bin")
+    paths = ["top.txt", os.path.join("a", "x.txt"), os.path.join("a", "y.txt"), deep,
+             os.path.join("a", "b", "z.txt")]
+    assert sorted(round_trip(paths)) == sorted(paths)
+    assert sorted(iter_hierarchy_paths(table_hierarchy(encode_paths(paths)))) == sorted(paths)
+
+
+def test_paths_are_grouped_by_directory():
+    paths = [os.path.join("a", "1"), os.path.join("b", "2"), os.path.join("a", "3")]
+    assert round_trip(paths) == [os.path.join("a", "1"), os.path.join("a", "3"), os.path.join("b", "2")]
+
+
+def test_saved_table_documents_round_trip(tmp_path):
+    folder = ProjectFolder(str(tmp_path), backup=lambda *args: None)
+    project = folder.create_project("Alpha")
+    paths = [os.path.join("data", f"part{i}", f"file{j}.csv") for i in range(3) for j in range(4)]
+    for fmt in (FORMAT_TABLE, FORMAT_TABLE_GZIP):
+        filename = folder.save_experiment(project, f"Run {fmt}", paths, fmt=fmt)
+        exp_data = folder.load_experiment(filename)["experiment"]
+        assert "file_table" in exp_data
+        assert list(iter_experiment_paths(exp_data)) == paths
+    folder.close()
@@ -0,0 +1,17 @@
+import os
+from fingerprint import FingerprintCache, compute_fingerprints
+
+
+def test_cached_and_hashed_fingerprints_keep_path_order(tmp_path):
+    base = str(tmp_path)
+    names = [f"f{i}.txt" for i in range(6)]
+    for name in names:
+        with open(os.path.join(base, name), "w") as f:
+            f.write(name)
+    cache = FingerprintCache(os.path.join(base, "cache.sqlite"))
+    # Cache every other file, so cached and newly hashed entries interleave
+    compute_fingerprints(names[1::2], base, cache)
+    fingerprints = compute_fingerprints(names, base, cache)
+    cache.close()
+    assert list(fingerprints) == names
+    assert fingerprints == compute_fingerprints(names, base)
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+from metadata_index import MetadataIndex
+
+
+def write(folder, filename, data):
+    path = os.path.join(folder, filename)
+    with open(path, "w") as f:
+        json.dump(data, f)
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def project(title):
+    return {"project": {"title": title, "description": "", "usernames": [], "association": "",
+                        "dates": {"start": "2024-01-01", "end": "2024-12-31"}}}
+
+
+def test_other_threads_cannot_commit_a_staged_batch(tmp_path):
+    folder = str(tmp_path)
+    index = MetadataIndex(folder)
+    index.begin()
+    index.stage_document("Staged.json", (1, 1), project("Staged"))
+    write(folder, "Saved.json", project("Saved"))
+    saver = threading.Thread(target=index.index_document, args=("Saved.json", project("Saved")))
+    saver.start()
+    saver.join(0.2)
+    assert saver.is_alive()
+    index.rollback()
+    saver.join()
+    assert sorted(index.filenames()) == ["Saved.json"]
+    index.close()
+
+
+def test_concurrent_refresh_and_reads(tmp_path):
+    folder = str(tmp_path)
+    index = MetadataIndex(folder)
+    for i in range(50):
+        write(folder, f"P{i}.json", project(f"P{i}"))
+    errors = []
+
+    def read():
+        try:
+            for _ in range(200):
+                index.projects()
+                index.search(kind="project")
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    index.refresh()
+    for reader in readers:
+        reader.join()
+    assert not errors
+    assert len(index.projects()) == 50
+    index.close()
+
+
+def test_search_with_fields_and_date_filters(tmp_path):
+    from tracker_core import ProjectFolder
+    folder = ProjectFolder(str(tmp_path), backup=lambda *args: None)
+    project = folder.create_project("Alpha", description="Spectroscopy", usernames=["marie"],
+                                    association="Physics", start="2024-01-01", end="2024-12-31")
+    spring = folder.save_experiment(project, "Calibration", ["raw/laser_scan.csv"], description="Laser warmup",
+                                    start="2024-03-01", end="2024-03-31")
+    autumn = folder.save_experiment(project, "Baseline", ["raw/dark.csv"], description="Dark frames",
+                                    start="2024-10-01", end="2024-10-15")
+    if not folder.index.searchable:
+        folder.close()
+        return
+
+    def files(*args, **kwargs):
+        return [row[0] for row in folder.search(*args, **kwargs)]
+
+    assert files("las") == [spring]
+    assert files("laser", field="paths") == [spring]
+    assert files("laser", field="title") == []
+    # Experiments inherit the project's team members
+    assert sorted(files("marie")) == sorted([project, spring, autumn])
+    assert files("marie", kind="project") == [project]
+    # Date ranges match when they overlap
+    assert files(kind="experiment", date_from="2024-09-01") == [autumn]
+    assert files(kind="experiment", date_to="2024-03-15") == [spring]
+    assert files(kind="experiment", date_from="2024-04-01", date_to="2024-09-30") == []
+    assert files("marie", date_from="2024-03-31", date_to="2024-10-01") == [autumn, spring, project]
+    assert files("dark frames", date_to="2024-06-30") == []
+    folder.close()
@@ -0,0 +1,46 @@
+import builtins
+import pytest
+import metrics_log
+from metrics_log import MetricsWriter, MetricsLog, downsample
+
+
+def test_second_writer_is_refused(tmp_path):
+    path = str(tmp_path / "P_E_v1.0.0.json")
+    with MetricsWriter(path) as writer:
+        writer.log("loss", 1.0)
+        with pytest.raises(RuntimeError):
+            MetricsWriter(path)
+    with MetricsWriter(path) as writer:
+        writer.log("accuracy", 0.5)
+    log = MetricsLog(path)
+    assert log.names() == ["accuracy", "loss"]
+    assert log.manifest["metrics"]["loss"]["file"] != log.manifest["metrics"]["accuracy"]["file"]
+
+
+def test_failed_flush_is_not_appended_twice(tmp_path, monkeypatch):
+    path = str(tmp_path / "P_E_v1.0.0.json")
+    writer = MetricsWriter(path, flush_interval=3600)
+    for step in range(3):
+        writer.log_many({"loss": step * 1.0, "accuracy": step / 10}, step=step)
+    calls = []
+
+    def failing_open(file, mode='r', *args, **kwargs):
+        if mode == 'ab':
+            calls.append(file)
+            if len(calls) == 5:
+                raise OSError("disk full")
+        return builtins.open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(metrics_log, "open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        writer.flush()
+    monkeypatch.undo()
+    writer.close()
+    log = MetricsLog(path)
+    for name in ("loss", "accuracy"):
+        assert list(log.read(name)["step"]) == [0, 1, 2]
+
+
+def test_downsample_needs_a_bucket():
+    with pytest.raises(ValueError):
+        downsample([0, 1], [1.0, 2.0], buckets=0)
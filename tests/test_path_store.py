@@ -0,0 +1,58 @@
+import os
+from path_store import PathStore
+
+
+def p(*parts):
+    return os.path.join(*parts)
+
+
+def test_keeps_order_and_drops_duplicates():
+    paths = [p("a", "x.txt"), p("b", "y.txt"), p("a", "z.txt"), "top.txt", p("a", "x.txt")]
+    store = PathStore(paths)
+    assert list(store) == paths[:4]
+    assert [store[row] for row in range(len(store))] == paths[:4]
+    assert p("a", "z.txt") in store
+    assert p("a", "y.txt") not in store
+    assert not store.add("top.txt")
+    assert store.extend([p("b", "y.txt"), p("c", "w.txt")]) == 1
+    assert len(store) == 5
+
+
+def test_filter_keeps_membership_consistent():
+    store = PathStore([p("a", "x.txt"), p("a", "y.csv"), p("b", "z.txt")])
+    assert store.filter(lambda path: path.endswith(".txt")) == 1
+    assert list(store) == [p("a", "x.txt"), p("b", "z.txt")]
+    assert p("a", "y.csv") not in store
+    assert store.add(p("a", "y.csv"))
+
+
+def naive_remove(paths, selected):
+    return [path for path in paths
+            if not any(path == sp or path.startswith(sp + os.sep) for sp in selected)]
+
+
+def test_remove_prefixes_matches_naive_loop():
+    import random
+    rng = random.Random(7)
+    paths = [p(f"d{rng.randrange(4)}", f"s{rng.randrange(4)}", f"f{i}.txt") for i in range(400)]
+    paths += [p("d1", "s1"), "d2", p("d10", "f.txt"), p("d1x", "f.txt")]
+    for _ in range(20):
+        store = PathStore(paths)
+        kept = list(store)
+        selected = rng.sample(kept, 5) + [p("d1"), p("d3", "s2")][:rng.randrange(3)]
+        removed = store.remove_prefixes(selected)
+        expected = naive_remove(kept, selected)
+        assert list(store) == expected
+        assert removed == len(kept) - len(expected)
+        assert all(path in store for path in expected)
+
+
+def test_remove_prefixes_edge_cases():
+    paths = [p("a", "b"), p("a", "b", "c.txt"), p("a", "bc", "d.txt"), "a"]
+    store = PathStore(paths)
+    assert store.remove_prefixes([]) == 0
+    # A file and a folder of the same name, and a sibling sharing a prefix
+    assert store.remove_prefixes([p("a", "b")]) == 2
+    assert list(store) == [p("a", "bc", "d.txt"), "a"]
+    assert store.remove_prefixes(["a"]) == 2
+    assert len(store) == 0
@@ -0,0 +1,37 @@
+import os
+import time
+from tracker_core import ProjectFolder, STALE_RESERVATION_SECONDS, reservation_path, reserve_file
+
+
+def test_saves_leave_no_reservations(tmp_path):
+    folder = ProjectFolder(str(tmp_path), backup=lambda *args: None)
+    project = folder.create_project("Alpha")
+    folder.save_experiment(project, "Run")
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".reserved")]
+    folder.close()
+
+
+def test_live_reservation_moves_save_to_next_version(tmp_path):
+    folder = ProjectFolder(str(tmp_path), backup=lambda *args: None)
+    project = folder.create_project("Alpha")
+    assert reserve_file(str(tmp_path), "Alpha_Run_v1.0.0.json")
+    assert folder.save_experiment(project, "Run") == "Alpha_Run_v1.0.1.json"
+    folder.close()
+
+
+def test_dead_writer_reservation_is_invisible_and_reclaimed(tmp_path):
+    base = str(tmp_path)
+    folder = ProjectFolder(base, backup=lambda *args: None)
+    project = folder.create_project("Alpha")
+    folder.close()
+    # A writer died between reserving and writing the file
+    assert reserve_file(base, "Alpha_Run_v1.0.0.json")
+    old = time.time() - STALE_RESERVATION_SECONDS - 60
+    os.utime(reservation_path(base, "Alpha_Run_v1.0.0.json"), (old, old))
+
+    folder = ProjectFolder(base, backup=lambda *args: None)
+    folder.refresh()
+    assert "Alpha_Run_v1.0.0.json" not in folder.version_table.files
+    assert folder.save_experiment(project, "Run") == "Alpha_Run_v1.0.0.json"
+    assert not os.path.exists(reservation_path(base, "Alpha_Run_v1.0.0.json"))
+    folder.close()
@@ -0,0 +1,39 @@
+from versioning import VersionTable
+
+
+def test_next_version_per_experiment():
+    table = VersionTable(["Alpha_Run_v1.0.0.json", "Alpha_Run_v1.2.0.json", "Alpha_Run_v1.1.5.json",
+                          "Alpha_Other_v3.0.0.json", "Alpha.json", "notes.txt"])
+    assert table.next_version("Alpha", "Run", "patch") == "1.2.1"
+    assert table.next_version("Alpha", "Run", "minor") == "1.3.0"
+    assert table.next_version("Alpha", "Run", "major") == "2.0.0"
+    assert table.next_version("Alpha", "Other", "patch") == "3.0.1"
+    assert table.next_version("Alpha", "New", "patch") == "1.0.0"
+
+
+def test_titles_containing_v():
+    # Only the last _v<major>.<minor>.<patch> is the version
+    table = VersionTable(["Alpha_v2_Run_v1_v1.0.3.json", "Alpha_Run_v1_v9.0.0.json"])
+    assert table.next_version("Alpha_v2", "Run_v1", "patch") == "1.0.4"
+    assert table.next_version("Alpha", "Run_v1", "patch") == "9.0.1"
+    assert table.next_version("Alpha", "Run", "patch") == "1.0.0"
+
+
+def test_discard_keeps_versions_with_duplicates():
+    table = VersionTable(["A_B_v1.0.0.json", "A_B_v1.0.1.json", "A_B_v1.0.1(1).json"])
+    table.discard("A_B_v1.0.1.json")
+    assert table.next_version("A", "B", "patch") == "1.0.2"
+    table.discard("A_B_v1.0.1(1).json")
+    assert table.next_version("A", "B", "patch") == "1.0.1"
+    table.discard("A_B_v1.0.0.json")
+    table.discard("A_B_v1.0.0.json")
+    assert table.versions == {}
+    assert table.next_version("A", "B", "patch") == "1.0.0"
+
+
+def test_update_matches_rebuild():
+    table = VersionTable(["A_B_v1.0.0.json", "A_B_v1.0.1.json"])
+    table.update(["A_B_v1.1.0.json", "A_C_v2.0.0.json"], ["A_B_v1.0.1.json"])
+    rebuilt = VersionTable(["A_B_v1.0.0.json", "A_B_v1.1.0.json", "A_C_v2.0.0.json"])
+    assert table.versions == rebuilt.versions
+    assert table.files == rebuilt.files
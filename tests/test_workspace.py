@@ -0,0 +1,23 @@
+import os
+from workspace import Workspace
+
+
+def test_search_merges_roots_by_recency(tmp_path):
+    old_root, new_root = str(tmp_path / "old"), str(tmp_path / "new")
+    workspace = Workspace([old_root, new_root], backup=lambda *args: None)
+    for root in workspace.roots:
+        os.makedirs(root)
+        workspace.refresh_async(root).result()
+    for i in range(3):
+        path = os.path.join(old_root, workspace.folder(old_root).create_project(f"Old {i}"))
+        os.utime(path, (1000 + i, 1000 + i))
+    path = os.path.join(new_root, workspace.folder(new_root).create_project("New"))
+    os.utime(path, (5000, 5000))
+    for result in workspace.refresh():
+        pass
+
+    rows = workspace.search(limit=2)
+    assert [row[0] for row in rows] == [new_root, old_root]
+    assert rows[0][3] == "New"
+    assert rows[1][3] == "Old 2"
+    workspace.close()
@@ -0,0 +1,501 @@
+import os
+import json
+import time
+from datetime import date
+from metadata_index import MetadataIndex, SEARCH_LIMIT
+from versioning import VersionTable
+from storage import FORMAT_INDENTED, TABLE_FORMATS, encode_document, read_document, write_atomic, write_temp
+from file_table import encode_paths, iter_hierarchy_paths
+from instrumentation import recorder
+
+# GUI-free core shared by app.py and cli.py. Keep the imports here light:
+# no PyQt, and optional features are imported where they are used.
+
+CONFIG_FILE = os.path.expanduser("~/.experiment_tracker_config.json")
+IMPORT_CHUNK = 256
+
+
+def load_config():
+    try:
+        with open(CONFIG_FILE, 'r') as f:
+            config = json.load(f)
+        return config if isinstance(config, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def update_config(**values):
+    config = load_config()
+    config.update(values)
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=4)
+    return config
+
+
+def load_tracking_dir():
+    tracking_dir = load_config().get('tracking_dir')
+    if tracking_dir and os.path.isdir(tracking_dir):
+        return tracking_dir
+    return None
+
+
+def sanitize_filename(name):
+    return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name)
+
+
+def build_hierarchy(file_paths):
+    hierarchy = {}
+    for path in file_paths:
+        parts = path.split(os.sep)
+        current_level = hierarchy
+        for part in parts[:-1]:
+            if part not in current_level:
+                current_level[part] = {}
+            current_level = current_level[part]
+        filename = parts[-1]
+        current_level[filename] = path
+    return hierarchy
+
+
+def hierarchy_paths(file_structure):
+    return list(iter_hierarchy_paths(file_structure))
+
+
+def record_path(path, base_folder):
+    # Paths on the project folder's drive are stored relative to it
+    base_drive = os.path.splitdrive(base_folder)[0].upper()
+    if os.path.splitdrive(path)[0].upper() == base_drive:
+        return os.path.relpath(path, base_folder)
+    return os.path.abspath(path)
+
+
+# A writer that dies mid-save leaves its reservation behind; one this old
+# can no longer belong to a live writer
+STALE_RESERVATION_SECONDS = 24 * 3600
+
+
+def reservation_path(folder, filename):
+    # Hidden and not *.json, so scans and the version table never see it
+    return os.path.join(folder, f".{filename}.reserved")
+
+
+def reserve_file(folder, filename):
+    # Atomically creates a hidden placeholder so concurrent writers can never
+    # pick the same name; False if the name is already taken. The caller
+    # drops the placeholder with release_file once the file is in place.
+    path = reservation_path(folder, filename)
+    for attempt in range(2):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            if attempt or not _stale_reservation(path):
+                return False
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        os.close(fd)
+        if os.path.exists(os.path.join(folder, filename)):
+            release_file(folder, filename)
+            return False
+        return True
+    return False
+
+
+def release_file(folder, filename):
+    try:
+        os.remove(reservation_path(folder, filename))
+    except FileNotFoundError:
+        pass
+
+
+def _stale_reservation(path):
+    try:
+        return time.time() - os.stat(path).st_mtime > STALE_RESERVATION_SECONDS
+    except FileNotFoundError:
+        return True
+
+
+def today():
+    return date.today().isoformat()
+
+
+def project_document(title, description="", usernames=(), association="", start=None, end=None):
+    return {
+        "project": {
+            "title": title,
+            "description": description,
+            "usernames": list(usernames),
+            "association": association,
+            "dates": {
+                "start": start or today(),
+                "end": end or today()
+            }
+        }
+    }
+
+
+def file_tree(file_paths, fmt=FORMAT_INDENTED):
+    # Either the nested file_structure or the compact file_table
+    if fmt in TABLE_FORMATS:
+        return "file_table", encode_paths(file_paths)
+    return "file_structure", build_hierarchy(file_paths)
+
+
+def experiment_document(project_file, title, tree_key, tree, description="", version=None,
+                        start=None, end=None, fingerprints=None):
+    experiment_data = {
+        "project_reference": project_file,
+        "experiment": {
+            "title": title,
+            "description": description,
+            "version": version,
+            tree_key: tree,
+            "dates": {
+                "start": start or today(),
+                "end": end or today()
+            }
+        }
+    }
+    if fingerprints not in (None, False):
+        experiment_data["experiment"]["file_fingerprints"] = fingerprints
+    return experiment_data
+
+
+class ProjectFolder:
+    # Projects and experiments stored in one project folder. `backup` is
+    # called as backup(kind, filename, data, source) after every save, with
+    # the size and mtime of the saved file as source; by default documents
+    # are queued for the tracking directory's backup store.
+    def __init__(self, base_folder, tracking_dir=None, backup=None):
+        self.base_folder = base_folder
+        self.tracking_dir = tracking_dir
+        self.backup = backup or self._backup_to_queue
+        self.index = MetadataIndex(base_folder)
+        self.version_table = VersionTable(self.index.filenames())
+        self.project_titles = {}
+        self._indexed = []
+
+    def close(self):
+        self.index.close()
+
+    def refresh(self):
+        with recorder.span("index_refresh") as span:
+            changed, removed = self.index.refresh()
+            span.count = len(changed) + len(removed)
+        # Files saved here were indexed on save; report them as changed once
+        saved = [name for name in self._indexed if name not in removed]
+        changed = saved + [name for name in changed if name not in saved]
+        self._indexed = []
+        self.version_table.update(changed, removed)
+        for name in removed:
+            self.project_titles.pop(name, None)
+        for name, kind, title, _, _ in self.index.entries(changed):
+            if kind == 'project':
+                self.project_titles[name] = title
+            else:
+                self.project_titles.pop(name, None)
+        return changed, removed
+
+    def refresh_versions(self):
+        # Rebuilds only the version table, from one listing of the folder,
+        # for callers that need the used versions but not the index
+        self.version_table.rebuild(self.index.scan())
+
+    def entries(self, filenames):
+        return self.index.entries(filenames)
+
+    def documents(self):
+        return self.index.documents()
+
+    def stamps(self):
+        return self.index.stamps()
+
+    def projects(self):
+        projects = self.index.projects()
+        self.project_titles = {f: title for title, f in projects}
+        return projects
+
+    def experiments(self, project_file):
+        return self.index.experiments(project_file)
+
+    def search(self, text="", field=None, kind=None, date_from=None, date_to=None,
+               limit=SEARCH_LIMIT):
+        return self.index.search(text, field, kind, date_from, date_to, limit)
+
+    def project_title(self, project_file):
+        title = self.project_titles.get(project_file)
+        if title is None:
+            title = read_document(os.path.join(self.base_folder, project_file))['project']['title']
+            self.project_titles[project_file] = title
+        return title
+
+    def find_project(self, name):
+        # Accepts a project file name or a project title
+        projects = self.projects()
+        for title, f in projects:
+            if name == f:
+                return f
+        for title, f in projects:
+            if name == title:
+                return f
+        raise KeyError(f"Unknown project: {name}")
+
+    def next_version(self, project_file, experiment_title, version_type='patch'):
+        safe_project = sanitize_filename(self.project_title(project_file))
+        safe_experiment = sanitize_filename(experiment_title.strip())
+        if not safe_experiment:
+            return None
+        return self.version_table.next_version(safe_project, safe_experiment, version_type.lower())
+
+    def create_project(self, title, description="", usernames=(), association="",
+                       start=None, end=None):
+        title = title.strip()
+        if not title:
+            raise ValueError("Project title is required!")
+        safe_title = sanitize_filename(title)
+
+        def candidates():
+            yield f"{safe_title}.json"
+            counter = 1
+            while True:
+                yield f"{safe_title}_v{counter}.json"
+                counter += 1
+
+        filename = self._reserve(candidates(), known=self.index)
+        metadata = project_document(title, description, usernames, association, start, end)
+        self._write_reserved(filename, encode_document(metadata))
+        self._index_saved(filename, metadata)
+        self.project_titles[filename] = title
+        if self.tracking_dir:
+            self.backup("Projects", filename, metadata, self._source(filename))
+        return filename
+
+    def save_experiment(self, project_file, title, file_paths=(), description="", version=None,
+                        version_type='patch', start=None, end=None, fingerprints=None,
+                        fmt=FORMAT_INDENTED):
+        # `fingerprints` is either a precomputed {path: fingerprint} mapping
+        # or True to compute it here
+        title = title.strip()
+        if not title:
+            raise ValueError("Experiment title is required!")
+        project_title = self.project_title(project_file)
+        file_paths = list(file_paths)
+        if fingerprints is True:
+            from fingerprint import FingerprintCache, compute_fingerprints
+            cache = FingerprintCache()
+            try:
+                fingerprints = compute_fingerprints(file_paths, self.base_folder, cache)
+            finally:
+                cache.close()
+        tree_key, tree = file_tree(file_paths, fmt)
+
+        # Reserve a unique filename
+        safe_project = sanitize_filename(project_title)
+        safe_experiment = sanitize_filename(title)
+        if version:
+            # Explicit versions keep their number; duplicates get a counter
+            def candidates():
+                base_name = f"{safe_project}_{safe_experiment}_v{version}"
+                yield f"{base_name}.json"
+                counter = 1
+                while True:
+                    yield f"{base_name}({counter}).json"
+                    counter += 1
+
+            experiment_filename = self._reserve(candidates(), known=self.version_table.files)
+        else:
+            # Automatic versions move on to the next free version when another
+            # writer got there first
+            while True:
+                version = self.version_table.next_version(safe_project, safe_experiment,
+                                                          version_type.lower())
+                experiment_filename = f"{safe_project}_{safe_experiment}_v{version}.json"
+                if reserve_file(self.base_folder, experiment_filename):
+                    break
+                self.version_table.add(experiment_filename)
+
+        experiment_data = experiment_document(project_file, title, tree_key, tree, description,
+                                              version, start, end, fingerprints)
+        self._write_reserved(experiment_filename, encode_document(experiment_data, fmt))
+        self._index_saved(experiment_filename, experiment_data)
+        self.version_table.add(experiment_filename)
+        if self.tracking_dir:
+            self.backup("Experiments", experiment_filename, experiment_data, self._source(experiment_filename))
+        return experiment_filename
+
+    def import_documents(self, documents, fmt=FORMAT_INDENTED, durable=True, workers=8):
+        # Registers many (filename, data) documents as one batch. Each chunk
+        # is written to temporary files on a thread pool and indexed in an
+        # open transaction; only once every document is written are they
+        # renamed into place and the index committed, so a failure part way
+        # leaves the folder as it was. File system calls run on the pool,
+        # which hides most of their latency on network shares. Existing names
+        # are skipped. Returns the imported and the skipped file names.
+        from concurrent.futures import ThreadPoolExecutor
+        staged = []
+        skipped = []
+        seen = set()
+        placed = set()
+        self.index.begin()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import") as pool:
+                chunk = []
+                for filename, data in documents:
+                    if os.path.basename(filename) != filename or not filename.endswith('.json') \
+                            or filename.startswith('.'):
+                        raise ValueError(f"Invalid file name: {filename!r}")
+                    if filename in seen or filename in self.index or \
+                            os.path.exists(os.path.join(self.base_folder, filename)):
+                        skipped.append(filename)
+                        continue
+                    seen.add(filename)
+                    chunk.append((filename, data))
+                    if len(chunk) >= IMPORT_CHUNK:
+                        self._stage(pool, chunk, fmt, durable, staged)
+                        chunk = []
+                if chunk:
+                    self._stage(pool, chunk, fmt, durable, staged)
+                futures = [pool.submit(self._place, filename, tmp_path)
+                           for filename, tmp_path, kind, title in staged]
+                error = None
+                for (filename, tmp_path, kind, title), future in zip(staged, futures):
+                    try:
+                        if future.result():
+                            placed.add(filename)
+                            continue
+                    except BaseException as e:
+                        error = error or e
+                        continue
+                    # Another writer took the name in the meantime
+                    os.remove(tmp_path)
+                    self.index.unstage_document(filename)
+                    skipped.append(filename)
+                if error is not None:
+                    raise error
+        except BaseException:
+            self.index.rollback()
+            for filename, tmp_path, kind, title in staged:
+                paths = [tmp_path]
+                if filename in placed:
+                    paths.append(os.path.join(self.base_folder, filename))
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            raise
+        self.index.commit()
+
+        imported = []
+        for filename, tmp_path, kind, title in staged:
+            if filename not in placed:
+                continue
+            imported.append(filename)
+            if kind == "Projects":
+                self.project_titles[filename] = title
+            else:
+                self.version_table.add(filename)
+        self._indexed.extend(imported)
+        if self.tracking_dir:
+            # Read back rather than kept, so memory does not grow with the batch
+            backups = ((kind, filename, read_document(os.path.join(self.base_folder, filename)),
+                        self._source(filename))
+                       for filename, tmp_path, kind, title in staged if filename in placed)
+            if self.backup == self._backup_to_queue:
+                from backup_queue import default_queue
+                default_queue().put_many(self.tracking_dir, backups)
+            else:
+                for backup in backups:
+                    self.backup(*backup)
+        return imported, skipped
+
+    def _place(self, filename, tmp_path):
+        path = os.path.join(self.base_folder, filename)
+        if not reserve_file(self.base_folder, filename):
+            return False
+        try:
+            os.replace(tmp_path, path)
+        finally:
+            release_file(self.base_folder, filename)
+        return True
+
+    def _stage(self, pool, chunk, fmt, durable, staged):
+        def write(item):
+            filename, data = item
+            tmp_path = write_temp(os.path.join(self.base_folder, filename), encode_document(data, fmt), durable)
+            st = os.stat(tmp_path)
+            return tmp_path, (st.st_mtime_ns, st.st_size)
+
+        futures = [pool.submit(write, item) for item in chunk]
+        error = None
+        for (filename, data), future in zip(chunk, futures):
+            try:
+                tmp_path, stamp = future.result()
+            except BaseException as e:
+                error = error or e
+                continue
+            # Renaming keeps the size and mtime, so the stamp stays valid
+            self.index.stage_document(filename, stamp, data)
+            if 'project' in data:
+                staged.append((filename, tmp_path, "Projects", data['project'].get('title')))
+            else:
+                staged.append((filename, tmp_path, "Experiments", None))
+        if error is not None:
+            raise error
+
+    def _reserve(self, candidates, known=()):
+        # Names already known to exist are skipped without touching the disk
+        for filename in candidates:
+            if filename not in known and reserve_file(self.base_folder, filename):
+                return filename
+
+    def _write_reserved(self, filename, raw):
+        path = os.path.join(self.base_folder, filename)
+        try:
+            write_atomic(path, raw)
+        finally:
+            release_file(self.base_folder, filename)
+
+    def _index_saved(self, filename, data):
+        self.index.index_document(filename, data)
+        self._indexed.append(filename)
+
+    def experiment_header(self, experiment_file):
+        # Title, description and version from the metadata index, without
+        # opening the file; None if the index does not know it
+        return self.index.header(experiment_file)
+
+    def load_experiment(self, experiment_file):
+        return read_document(os.path.join(self.base_folder, experiment_file))
+
+    def diff_experiments(self, old_file, new_file):
+        from experiment_diff import diff_experiments
+        return diff_experiments(self.load_experiment(old_file), self.load_experiment(new_file))
+
+    def metrics(self, experiment_file):
+        from metrics_log import MetricsLog
+        return MetricsLog(self._experiment_path(experiment_file))
+
+    def metrics_writer(self, experiment_file, **options):
+        # Appends metrics to an experiment; options go to MetricsWriter
+        from metrics_log import MetricsWriter
+        return MetricsWriter(self._experiment_path(experiment_file), **options)
+
+    def _experiment_path(self, experiment_file):
+        path = os.path.join(self.base_folder, experiment_file)
+        if not os.path.isfile(path):
+            raise KeyError(f"Unknown experiment: {experiment_file}")
+        return path
+
+    def _source(self, filename):
+        try:
+            st = os.stat(os.path.join(self.base_folder, filename))
+        except OSError:
+            return None
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def _backup_to_queue(self, kind, filename, data, source=None):
+        from backup_queue import default_queue
+        default_queue().put(self.tracking_dir, kind, filename, data, source)
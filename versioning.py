@@ -0,0 +1,92 @@
+import re
+from bisect import insort
+
+VERSION_FILENAME = re.compile(r'^(?P<base>.+)_v(?P<version>\d+\.\d+\.\d+)(?:\(\d+\))?\.json$')
+
+
+def parse_version(version):
+    parts = tuple(map(int, version.split('.')))
+    if len(parts) != 3:
+        raise ValueError(f"Invalid version: {version}")
+    return parts
+
+
+def format_version(version):
+    return f"{version[0]}.{version[1]}.{version[2]}"
+
+
+def bump_version(latest, version_type):
+    if latest is None:
+        return (1, 0, 0)
+    if version_type == 'major':
+        return (latest[0] + 1, 0, 0)
+    if version_type == 'minor':
+        return (latest[0], latest[1] + 1, 0)
+    return (latest[0], latest[1], latest[2] + 1)
+
+
+def split_version_filename(fname):
+    match = VERSION_FILENAME.match(fname)
+    if not match:
+        return None
+    return match.group('base'), parse_version(match.group('version'))
+
+
+class VersionTable:
+    # Maps "<safe_project>_<safe_experiment>" to the sorted list of versions
+    # found in the project folder, so version lookups never touch the disk.
+    def __init__(self, filenames=()):
+        self.versions = {}
+        self.counts = {}
+        self.files = {}
+        self.rebuild(filenames)
+
+    def rebuild(self, filenames):
+        self.versions = {}
+        self.counts = {}
+        self.files = {}
+        for fname in filenames:
+            self.add(fname)
+
+    def add(self, fname):
+        if fname in self.files:
+            return
+        parsed = split_version_filename(fname)
+        if parsed is None:
+            return
+        self.files[fname] = parsed
+        # Duplicates such as "..._v1.0.0(1).json" share a version entry
+        count = self.counts.get(parsed, 0)
+        self.counts[parsed] = count + 1
+        if not count:
+            base, version = parsed
+            insort(self.versions.setdefault(base, []), version)
+
+    def discard(self, fname):
+        parsed = self.files.pop(fname, None)
+        if parsed is None:
+            return
+        self.counts[parsed] -= 1
+        if not self.counts[parsed]:
+            del self.counts[parsed]
+            base, version = parsed
+            versions = self.versions[base]
+            versions.remove(version)
+            if not versions:
+                del self.versions[base]
+
+    def update(self, changed, removed):
+        for fname in removed:
+            self.discard(fname)
+        for fname in changed:
+            self.add(fname)
+
+    def get(self, safe_project, safe_experiment):
+        return self.versions.get(f"{safe_project}_{safe_experiment}", [])
+
+    def latest(self, safe_project, safe_experiment):
+        versions = self.get(safe_project, safe_experiment)
+        return versions[-1] if versions else None
+
+    def next_version(self, safe_project, safe_experiment, version_type):
+        return format_version(bump_version(self.latest(safe_project, safe_experiment), version_type))
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from PyQt5.QtCore import QObject, QThread, QTimer, QFileSystemWatcher, pyqtSignal
+from instrumentation import recorder
+
+
+class DirectoryScanThread(QThread):
+    batch_ready = pyqtSignal(list)
+    progress = pyqtSignal(int)
+    scan_finished = pyqtSignal(int, bool)
+
+    def __init__(self, folders, base_folder, include=(), exclude=(),
+                 batch_size=2000, batch_interval=0.1, parent=None):
+        super().__init__(parent)
+        self.folders = folders
+        self.base_folder = base_folder
+        self.include = include
+        self.exclude = exclude
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        with recorder.span("folder_scan") as span:
+            span.count = self._scan()
+
+    def _scan(self):
+        from file_scan import walk_files
+        base_drive = os.path.splitdrive(self.base_folder)[0].upper()
+        count = 0
+        batch = []
+        last_emit = time.monotonic()
+        for folder in self.folders:
+            same_drive = os.path.splitdrive(folder)[0].upper() == base_drive
+            for abs_path in walk_files(folder, self.include, self.exclude, self._cancelled):
+                if same_drive:
+                    batch.append(os.path.relpath(abs_path, self.base_folder))
+                else:
+                    batch.append(os.path.abspath(abs_path))
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now - last_emit >= self.batch_interval:
+                    count += len(batch)
+                    self.batch_ready.emit(batch)
+                    self.progress.emit(count)
+                    batch = []
+                    last_emit = now
+            if self.is_cancelled():
+                break
+        if batch and not self.is_cancelled():
+            count += len(batch)
+            self.batch_ready.emit(batch)
+            self.progress.emit(count)
+        self.scan_finished.emit(count, self.is_cancelled())
+        return count
+
+
+class ExperimentLoadThread(QThread):
+    # Parses an experiment file off the GUI thread and streams its file
+    # tree in batches, with the same batch/progress/finish signals as
+    # DirectoryScanThread. header_ready carries the experiment fields other
+    # than the file tree and fingerprints, plus 'has_fingerprints'.
+    header_ready = pyqtSignal(dict)
+    batch_ready = pyqtSignal(list)
+    progress = pyqtSignal(int)
+    scan_finished = pyqtSignal(int, bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, batch_size=5000, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.batch_size = batch_size
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        with recorder.span("experiment_load") as span:
+            span.count = self._load()
+
+    def _load(self):
+        from storage import read_document
+        from file_table import iter_experiment_paths
+        try:
+            exp_data = read_document(self.path)['experiment']
+            paths = iter_experiment_paths(exp_data)
+        except Exception as e:
+            if not self.is_cancelled():
+                self.failed.emit(str(e))
+            self.scan_finished.emit(0, True)
+            return 0
+        if self.is_cancelled():
+            self.scan_finished.emit(0, True)
+            return 0
+        header = {k: v for k, v in exp_data.items()
+                  if k not in ('file_structure', 'file_table', 'file_fingerprints')}
+        header['has_fingerprints'] = 'file_fingerprints' in exp_data
+        del exp_data
+        self.header_ready.emit(header)
+
+        count = 0
+        batch = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) >= self.batch_size:
+                if self.is_cancelled():
+                    break
+                count += len(batch)
+                self.batch_ready.emit(batch)
+                self.progress.emit(count)
+                batch = []
+        if batch and not self.is_cancelled():
+            count += len(batch)
+            self.batch_ready.emit(batch)
+            self.progress.emit(count)
+        self.scan_finished.emit(count, self.is_cancelled())
+        return count
+
+
+class FolderWatcher(QObject):
+    # Coalesces bursts of directory change notifications into at most one
+    # `changed` signal per interval
+    changed = pyqtSignal()
+
+    def __init__(self, interval=300, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._schedule)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.changed)
+        self.events = 0
+
+    def watch(self, folder):
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if folder:
+            self.watcher.addPath(folder)
+
+    def _schedule(self, path):
+        self.events += 1
+        if not self.timer.isActive():
+            self.timer.start()
+
+
+class RefreshScheduler(QObject):
+    # Views register a refresh handler once; requests only mark them dirty.
+    # All dirty views are refreshed together in one pass on the next turn of
+    # the event loop, in registration order, so a view marked dirty by an
+    # earlier handler is refreshed in the same pass. `requests` counts the
+    # requests per view and `runs` how often each handler actually ran.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.handlers = {}
+        self.dirty = set()
+        self.requests = {}
+        self.runs = {}
+        self.passes = 0
+        self.stopped = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.flush)
+
+    def register(self, view, handler):
+        self.handlers[view] = handler
+        self.requests.setdefault(view, 0)
+        self.runs.setdefault(view, 0)
+
+    def schedule(self, *views):
+        if self.stopped:
+            return
+        for view in views:
+            self.requests[view] += 1
+            self.dirty.add(view)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        # Runs the pending pass now; callers that need the views up to date
+        # immediately use this instead of waiting for the event loop
+        self.timer.stop()
+        if not self.dirty:
+            return
+        self.passes += 1
+        with recorder.span("refresh_pass") as span:
+            refreshed = []
+            for view, handler in self.handlers.items():
+                if view in self.dirty:
+                    self.dirty.discard(view)
+                    self.runs[view] += 1
+                    refreshed.append(view)
+                    handler()
+            span.count = len(refreshed)
+
+    def stop(self):
+        # Drops pending refreshes and ignores new requests, e.g. on close
+        self.stopped = True
+        self.timer.stop()
+        self.dirty.clear()
+
+    def counters(self):
+        return {"passes": self.passes, "requests": dict(self.requests), "runs": dict(self.runs)}
+
+    def reset_counters(self):
+        self.passes = 0
+        self.requests = dict.fromkeys(self.handlers, 0)
+        self.runs = dict.fromkeys(self.handlers, 0)
@@ -0,0 +1,196 @@
+import os
+import threading
+from tracker_core import ProjectFolder, load_config, update_config
+from metadata_index import SEARCH_LIMIT
+
+# Several project folders ("roots") used side by side, e.g. one per NFS
+# mount. Every root keeps its own ProjectFolder, metadata index and lock, and
+# roots are opened and refreshed on a bounded thread pool, so a slow mount
+# only delays its own results. Catalogue reads skip roots that are still
+# being scanned instead of waiting for them.
+
+MAX_WORKERS = 8
+
+
+def load_workspace_roots():
+    roots = load_config().get('workspace_roots')
+    if not isinstance(roots, list):
+        return []
+    return [root for root in roots if isinstance(root, str)]
+
+
+def save_workspace_roots(roots):
+    update_config(workspace_roots=list(roots))
+
+
+class Workspace:
+    def __init__(self, roots=(), tracking_dir=None, backup=None, max_workers=MAX_WORKERS):
+        self.tracking_dir = tracking_dir
+        self.backup = backup
+        self.max_workers = max_workers
+        self.pool = None
+        self.roots = []
+        self.folders = {}
+        self.locks = {}
+        self.pending = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+        for root in roots:
+            self.add_root(root)
+
+    def add_root(self, root):
+        root = os.path.abspath(root)
+        with self.lock:
+            if root not in self.locks:
+                self.roots.append(root)
+                self.locks[root] = threading.Lock()
+        return root
+
+    def remove_root(self, root):
+        with self.lock:
+            if root not in self.locks:
+                return
+            self.roots.remove(root)
+            lock = self.locks.pop(root)
+            folder = self.folders.pop(root, None)
+            self.errors.pop(root, None)
+        # A root that is being scanned is closed when its scan finishes
+        if folder is not None and lock.acquire(blocking=False):
+            try:
+                folder.close()
+            finally:
+                lock.release()
+
+    def set_tracking_dir(self, tracking_dir):
+        self.tracking_dir = tracking_dir
+        with self.lock:
+            for folder in self.folders.values():
+                folder.tracking_dir = tracking_dir
+
+    def folder(self, root):
+        # The open ProjectFolder of a root, or None before its first scan
+        return self.folders.get(root)
+
+    def busy(self, root):
+        return root in self.pending
+
+    def status(self):
+        # {root: (state, detail)}: ("scanning", None), ("failed", exception),
+        # ("ready", number of projects) or ("not scanned", None)
+        counts = {root: len(folder.projects()) for root, folder in self._available()}
+        status = {}
+        with self.lock:
+            for root in self.roots:
+                if root in self.pending:
+                    status[root] = ("scanning", None)
+                elif root in self.errors:
+                    status[root] = ("failed", self.errors[root])
+                elif root in counts:
+                    status[root] = ("ready", counts[root])
+                else:
+                    status[root] = ("not scanned", None)
+        return status
+
+    def refresh_async(self, root):
+        # Opens the root if needed and refreshes its index on the pool.
+        # Returns a future for (changed, removed); a refresh already running
+        # for the root is shared instead of queueing another one.
+        with self.lock:
+            if root not in self.locks:
+                raise KeyError(f"Not a workspace folder: {root}")
+            future = self.pending.get(root)
+            if future is not None:
+                return future
+            if self.pool is None:
+                # Created on the first refresh, keeping concurrent.futures
+                # out of startup
+                from concurrent.futures import ThreadPoolExecutor
+                self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="workspace")
+            future = self.pool.submit(self._refresh, root)
+            self.pending[root] = future
+        future.add_done_callback(lambda f: self._finished(root, f))
+        return future
+
+    def refresh(self, roots=None, exclude=()):
+        # Refreshes roots concurrently and yields (root, (changed, removed))
+        # or (root, exception) as each one completes
+        from concurrent.futures import as_completed
+        futures = {self.refresh_async(root): root
+                   for root in (self.roots if roots is None else roots) if root not in exclude}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+    def refresh_now(self, root):
+        # Refreshes a root on the calling thread, after any refresh of it
+        # that is already running
+        if root not in self.locks:
+            raise KeyError(f"Not a workspace folder: {root}")
+        return self._refresh(root)
+
+    def _refresh(self, root):
+        with self.locks[root]:
+            folder = self.folders.get(root)
+            if folder is None:
+                folder = ProjectFolder(root, self.tracking_dir, backup=self.backup)
+            result = folder.refresh()
+        with self.lock:
+            if root in self.locks:
+                # set_tracking_dir may have run while the folder was opening
+                folder.tracking_dir = self.tracking_dir
+                self.folders[root] = folder
+                self.errors.pop(root, None)
+                return result
+        # Removed from the workspace while it was being scanned
+        folder.close()
+        return result
+
+    def _finished(self, root, future):
+        with self.lock:
+            if self.pending.get(root) is future:
+                del self.pending[root]
+            if root in self.locks and not future.cancelled() and future.exception() is not None:
+                self.errors[root] = future.exception()
+
+    def _available(self):
+        # (root, folder) of the open roots that are not being scanned; each
+        # root stays locked while the caller uses it
+        with self.lock:
+            items = [(root, self.folders.get(root), self.locks[root]) for root in self.roots]
+        for root, folder, lock in items:
+            if folder is not None and lock.acquire(blocking=False):
+                try:
+                    yield root, folder
+                finally:
+                    lock.release()
+
+    def projects(self):
+        # Merged catalogue: (title, root, project file), by title
+        rows = [(title, root, f) for root, folder in self._available() for title, f in folder.projects()]
+        return sorted(rows, key=lambda row: (row[0].lower(), row[1], row[2]))
+
+    def experiments(self, root, project_file):
+        return self.folders[root].experiments(project_file)
+
+    def search(self, text="", field=None, kind=None, date_from=None, date_to=None, limit=SEARCH_LIMIT):
+        # Search rows of every available root, prefixed with the root, most
+        # recently modified first. Rowids only order the rows of one index,
+        # so the most recent matches of each root are merged by file mtime.
+        rows = []
+        for root, folder in self._available():
+            found = folder.search(text, field, kind, date_from, date_to, limit)
+            mtimes = folder.index.mtimes([row[0] for row in found])
+            rows.extend((mtimes.get(row[0], 0), (root,) + row) for row in found)
+        rows.sort(key=lambda item: item[0], reverse=True)
+        return [row for _, row in rows[:limit]]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            folders = list(self.folders.values())
+            self.folders = {}
+        for folder in folders:
+            folder.close()